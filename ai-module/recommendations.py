@@ -225,7 +225,12 @@ def generate_rule_based_recommendations(items: List[Dict[str, Any]]) -> Dict[str
     recommendations = []
     
     for item in items[:5]:
-        recommended_qty = item.get('reorder_point', 10) * 3
+        reorder_point = item.get('reorder_point', 10)
+        if item.get('reorder_quantity'):
+            # Forecast-driven policy: order back up to reorder point plus one order cycle
+            recommended_qty = max(reorder_point - item.get('quantity', 0), 0) + item['reorder_quantity']
+        else:
+            recommended_qty = reorder_point * 3
         recommendations.append({
             "sku": item.get('sku', 'UNKNOWN'),
             "product_name": item.get('product_name', 'Unknown Product'),
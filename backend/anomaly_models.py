@@ -0,0 +1,99 @@
+"""
+Persisted demand anomaly detectors.
+One GroupedDemandDetector is kept per warehouse scope and refit once it is
+older than DETECTOR_REFIT_DAYS; in between, new days are only scored
+against the stored model.
+"""
+
+import os
+import sys
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../ml-pipelines'))
+
+from sales_data import load_daily_demand_matrix, refresh_daily_sales_rollup
+
+# Days of history a detector is fitted on
+DETECTOR_WINDOW_DAYS = int(os.getenv("DETECTOR_WINDOW_DAYS", "90"))
+
+# Age after which a stored detector is refit before it is used
+DETECTOR_REFIT_DAYS = int(os.getenv("DETECTOR_REFIT_DAYS", "7"))
+
+# Trailing days needed to seed the 7-day rolling features of a scored day
+ROLLING_SEED_DAYS = 6
+
+def detector_name(warehouse_id: Optional[int] = None) -> str:
+    return f"demand__{warehouse_id or 'all'}"
+
+def refit_demand_detector(
+    db: Session,
+    warehouse_id: Optional[int] = None,
+    days: int = DETECTOR_WINDOW_DAYS
+) -> Tuple[Any, List[Dict[str, Any]]]:
+    """
+    Fit and store a detector on the last `days` of demand.
+
+    Returns:
+        (detector, anomalies found in the fitting window)
+    """
+    from anomaly_detection.isolation_forest import GroupedDemandDetector
+    from anomaly_detection.detector_store import save_detector
+
+    refresh_daily_sales_rollup(db)
+    end = datetime.utcnow().date()
+    demand = load_daily_demand_matrix(db, end - timedelta(days=days - 1), end, warehouse_id=warehouse_id)
+
+    detector = GroupedDemandDetector()
+    anomalies = detector.fit(demand["matrix"], demand["dates"], demand["keys"])
+    if detector.forest is not None:
+        save_detector(detector_name(warehouse_id), detector)
+    return detector, anomalies
+
+def get_demand_detector(warehouse_id: Optional[int] = None):
+    """Stored detector for the scope if it is younger than DETECTOR_REFIT_DAYS, else None"""
+    from anomaly_detection.detector_store import load_detector
+
+    detector = load_detector(detector_name(warehouse_id))
+    if detector is None or detector.fitted_at is None:
+        return None
+    if datetime.utcnow() - detector.fitted_at > timedelta(days=DETECTOR_REFIT_DAYS):
+        return None
+    return detector
+
+def score_demand(
+    db: Session,
+    start: date,
+    warehouse_id: Optional[int] = None,
+    skus: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Score days from `start` through today against the stored detector,
+    refitting first if it is missing or stale.
+
+    Args:
+        db: Database session
+        start: First day to report anomalies for
+        warehouse_id: Detector scope
+        skus: Restrict scoring to these SKUs
+
+    Returns:
+        List of detected anomalies with sku and warehouse_id
+    """
+    detector = get_demand_detector(warehouse_id)
+    if detector is None:
+        detector, _ = refit_demand_detector(db, warehouse_id)
+        if detector.forest is None:
+            return []
+    else:
+        refresh_daily_sales_rollup(db)
+
+    end = datetime.utcnow().date()
+    demand = load_daily_demand_matrix(
+        db, start - timedelta(days=ROLLING_SEED_DAYS), end, warehouse_id=warehouse_id, skus=skus
+    )
+    if not demand["keys"]:
+        return []
+    return detector.score(demand["matrix"], demand["dates"], demand["keys"], start=start)
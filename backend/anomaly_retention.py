@@ -0,0 +1,187 @@
+"""
+Anomaly table partition maintenance and retention.
+On Postgres the anomalies table is range-partitioned by month on
+window_start; partitions are created ahead of time on a daily schedule,
+taking over any rows that landed in the default partition, resolved anomalies older
+than the retention period are archived to gzipped JSON lines files and
+deleted, and old partitions left empty are dropped.
+"""
+
+import os
+import gzip
+import json
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import select, delete, func, text, tuple_
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Anomaly
+
+logger = logging.getLogger(__name__)
+
+# Resolved anomalies last detected longer ago than this are archived
+RETENTION_DAYS = int(os.getenv("ANOMALY_RETENTION_DAYS", "180"))
+
+# Monthly partitions kept ready beyond the current month
+PARTITION_MONTHS_AHEAD = 2
+
+PARTITION_CHECK_INTERVAL_HOURS = int(os.getenv("ANOMALY_PARTITION_CHECK_INTERVAL_HOURS", "24"))
+
+ARCHIVE_DIR = os.getenv(
+    "ANOMALY_ARCHIVE_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "data", "anomaly_archive")
+)
+
+ARCHIVE_BATCH_SIZE = 10000
+
+def _month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def _partition_name(month: date) -> str:
+    return f"anomalies_p{month:%Y%m}"
+
+def is_partitioned(db: Session) -> bool:
+    """Whether the anomalies table was created as a partitioned table"""
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'anomalies'"
+    )).first() is not None
+
+def ensure_anomaly_partitions(db: Session, months_ahead: int = PARTITION_MONTHS_AHEAD) -> List[str]:
+    """
+    Create the default partition and monthly partitions from the start of
+    the retention period through `months_ahead` months from now.
+
+    Rows of a new partition's month already in the default partition are
+    moved into it before it is attached, in one transaction.
+
+    Returns:
+        Names of the partitions created
+    """
+    if not is_partitioned(db):
+        return []
+
+    db.execute(text("CREATE TABLE IF NOT EXISTS anomalies_default PARTITION OF anomalies DEFAULT"))
+    db.commit()
+
+    today = datetime.utcnow().date()
+    month = _month_start(today - timedelta(days=RETENTION_DAYS))
+    last = _add_months(_month_start(today), months_ahead)
+
+    created = []
+    while month <= last:
+        name = _partition_name(month)
+        exists = db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+        if exists is None:
+            bounds = {"start": month, "end": _add_months(month, 1)}
+            try:
+                db.execute(text(f"CREATE TABLE {name} (LIKE anomalies INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+                db.execute(text(
+                    f"WITH moved AS (DELETE FROM anomalies_default "
+                    f"WHERE window_start >= :start AND window_start < :end RETURNING *) "
+                    f"INSERT INTO {name} SELECT * FROM moved"
+                ), bounds)
+                db.execute(text(
+                    f"ALTER TABLE anomalies ATTACH PARTITION {name} "
+                    f"FOR VALUES FROM ('{bounds['start'].isoformat()}') TO ('{bounds['end'].isoformat()}')"
+                ))
+                db.commit()
+                created.append(name)
+            except Exception as e:
+                # Retried on the next scheduled run
+                db.rollback()
+                logger.warning("Could not create partition %s: %s", name, e)
+        month = _add_months(month, 1)
+
+    return created
+
+def _ensure_in_background():
+    db = SessionLocal()
+    try:
+        ensure_anomaly_partitions(db)
+    except Exception as e:
+        logger.warning("Anomaly partition maintenance failed: %s", e)
+    finally:
+        db.close()
+
+async def run_periodically():
+    """Create upcoming partitions every PARTITION_CHECK_INTERVAL_HOURS until cancelled"""
+    while True:
+        await asyncio.sleep(PARTITION_CHECK_INTERVAL_HOURS * 3600)
+        await asyncio.to_thread(_ensure_in_background)
+
+def _serialize(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: value.isoformat() if isinstance(value, (datetime, date)) else value
+        for key, value in row.items()
+    }
+
+def archive_resolved_anomalies(db: Session, retention_days: int = RETENTION_DAYS) -> Dict[str, Any]:
+    """
+    Move resolved anomalies last detected before the retention cutoff to cold storage.
+
+    Rows are streamed in batches to one gzipped JSON lines file, which is
+    closed before any row is deleted. Monthly partitions that end before
+    the cutoff and are left empty are dropped.
+
+    Returns:
+        Dict with 'archived' row count, archive 'file' (or None) and the
+        'dropped_partitions'
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    table = Anomaly.__table__
+    last_detected = func.coalesce(table.c.last_detected_at, table.c.detected_at)
+    old_resolved = (table.c.resolved.is_(True)) & (last_detected < cutoff)
+
+    keys: List[Tuple[int, datetime]] = []
+    path = None
+    last_id = 0
+
+    while True:
+        rows = db.execute(
+            select(table).where(old_resolved, table.c.id > last_id).order_by(table.c.id).limit(ARCHIVE_BATCH_SIZE)
+        ).mappings().all()
+        if not rows:
+            break
+
+        if path is None:
+            os.makedirs(ARCHIVE_DIR, exist_ok=True)
+            path = os.path.join(ARCHIVE_DIR, f"anomalies-{datetime.utcnow():%Y%m%d%H%M%S}.jsonl.gz")
+            archive = gzip.open(path, "wt", encoding="utf-8")
+        for row in rows:
+            archive.write(json.dumps(_serialize(dict(row))) + "\n")
+            keys.append((row["id"], row["window_start"]))
+        last_id = rows[-1]["id"]
+
+    if path is not None:
+        archive.close()
+
+    for i in range(0, len(keys), ARCHIVE_BATCH_SIZE):
+        batch = keys[i:i + ARCHIVE_BATCH_SIZE]
+        db.execute(delete(table).where(tuple_(table.c.id, table.c.window_start).in_(batch)))
+    db.commit()
+
+    dropped = []
+    if is_partitioned(db):
+        month = _add_months(_month_start(cutoff.date()), -1)
+        while True:
+            name = _partition_name(month)
+            if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is None:
+                break
+            if db.execute(text(f"SELECT 1 FROM {name} LIMIT 1")).first() is None:
+                db.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+            month = _add_months(month, -1)
+        db.commit()
+
+    return {"archived": len(keys), "file": path, "dropped_partitions": dropped}
@@ -0,0 +1,140 @@
+"""
+De-duplicated storage of detected anomalies.
+Each finding gets a fingerprint of its type, entity and subject (e.g. the
+SKU) plus the start of its time window; repeated detections in the same
+window update the existing row instead of inserting a new one. Batches are
+written with a single INSERT ... ON CONFLICT DO UPDATE.
+"""
+
+import os
+import hashlib
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from sqlalchemy import literal_column, case, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from models import Anomaly
+
+# Repeated findings within this many hours of each other share one row
+DEDUP_WINDOW_HOURS = int(os.getenv("ANOMALY_DEDUP_WINDOW_HOURS", "24"))
+
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+
+# Rows per INSERT ... ON CONFLICT statement, keeping very large batches within limits
+UPSERT_BATCH_SIZE = 5000
+
+def anomaly_fingerprint(anomaly_type: str, entity_type: str, entity_id: Any, subject: Any = None) -> str:
+    """Stable hash identifying the same finding across detection runs"""
+    key = "|".join(str(part) for part in (anomaly_type, entity_type, entity_id or 0, subject or ""))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def dedup_window_start(at: Union[datetime, date], hours: int = DEDUP_WINDOW_HOURS) -> datetime:
+    """Start of the fixed window containing `at`; dates map to their midnight"""
+    if not isinstance(at, datetime):
+        return datetime(at.year, at.month, at.day)
+    epoch = datetime(1970, 1, 1)
+    seconds = hours * 3600
+    return epoch + timedelta(seconds=int((at - epoch).total_seconds()) // seconds * seconds)
+
+def anomaly_record(
+    anomaly_type: str,
+    severity: str,
+    entity_type: str,
+    entity_id: Optional[int],
+    description: str,
+    metadata: Dict[str, Any],
+    subject: Any = None,
+    window: Union[datetime, date, None] = None,
+    detected_at: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Row values for upsert_anomalies.
+
+    Args:
+        subject: What the finding is about within the entity (e.g. SKU)
+        window: Day the finding refers to (e.g. the sales date of a demand
+            spike); defaults to the DEDUP_WINDOW_HOURS window of detected_at
+    """
+    detected_at = detected_at or datetime.utcnow()
+    return {
+        "anomaly_type": anomaly_type,
+        "severity": severity,
+        "entity_type": entity_type,
+        "entity_id": entity_id or 0,
+        "description": description,
+        "metadata": metadata,
+        "detected_at": detected_at,
+        "last_detected_at": detected_at,
+        "resolved": False,
+        "fingerprint": anomaly_fingerprint(anomaly_type, entity_type, entity_id, subject),
+        "window_start": dedup_window_start(window if window is not None else detected_at),
+        "occurrences": 1,
+    }
+
+def upsert_anomalies(db: Session, records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Insert new findings and refresh repeated ones in one statement per
+    UPSERT_BATCH_SIZE rows.
+
+    On conflict the stored row keeps its first detected_at, which the
+    anomaly feed pages on, gets the latest last_detected_at and its
+    occurrences count is incremented; severity, description and metadata
+    are replaced only when the new finding is at least as severe, so a
+    milder repeat never downgrades it. A resolved row is reopened, taking
+    the new finding as is and leaving its incident so it is correlated again.
+    Stored warehouse anomalies are then correlated into incidents (see
+    incidents.correlate_anomalies). The caller commits.
+
+    Returns:
+        Per stored row: id, fingerprint, window_start, whether it was newly
+        inserted and, if it joined an incident, incident_id and incident
+    """
+    from incidents import correlate_anomalies
+    
+    # One statement cannot update the same row twice; keep the most severe duplicate
+    unique: Dict[Any, Dict[str, Any]] = {}
+    for record in records:
+        key = (record["fingerprint"], record["window_start"])
+        current = unique.get(key)
+        if current is None or SEVERITY_RANK.get(record["severity"], 0) >= SEVERITY_RANK.get(current["severity"], 0):
+            unique[key] = record
+    if not unique:
+        return []
+
+    table = Anomaly.__table__
+    rows = list(unique.values())
+    stored = []
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        stmt = pg_insert(table).values(rows[i:i + UPSERT_BATCH_SIZE])
+        excluded = stmt.excluded
+        # SET expressions see the stored row as it was before this update
+        take_new = or_(
+            table.c.resolved.is_(True),
+            case(SEVERITY_RANK, value=excluded.severity, else_=0)
+            >= case(SEVERITY_RANK, value=table.c.severity, else_=0)
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.fingerprint, table.c.window_start],
+            set_={
+                "last_detected_at": excluded.last_detected_at,
+                "severity": case((take_new, excluded.severity), else_=table.c.severity),
+                "description": case((take_new, excluded.description), else_=table.c.description),
+                "metadata": case((take_new, excluded["metadata"]), else_=table.c["metadata"]),
+                "occurrences": table.c.occurrences + 1,
+                "resolved": False,
+                "resolved_at": None,
+                "incident_id": case((table.c.resolved.is_(True), None), else_=table.c.incident_id),
+            }
+        ).returning(
+            table.c.id,
+            table.c.fingerprint,
+            table.c.window_start,
+            # xmax is 0 only for rows this statement inserted
+            literal_column("(xmax = 0)").label("inserted")
+        )
+        stored.extend(dict(row._mapping) for row in db.execute(stmt))
+
+    correlate_anomalies(db, stored)
+    return stored
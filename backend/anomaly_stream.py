@@ -0,0 +1,212 @@
+"""
+Streaming anomaly detection wired to the ORM.
+Committed sales and inventory quantity changes are fed to the streaming
+detectors on a background worker, and days of series that stopped selling
+are closed on a schedule; anomalies are upserted into the Anomaly
+table and pushed to /ws clients as anomaly_alert messages, or as one
+incident_alert per opened or escalated incident for correlated ones.
+"""
+
+import os
+import sys
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../ml-pipelines'))
+
+from anomaly_detection.streaming import DemandStream, InventoryStream
+from database import SessionLocal
+from models import Inventory, SalesHistory
+from anomaly_store import anomaly_record, upsert_anomalies
+from incidents import incident_alert
+from realtime import manager
+from sales_data import load_daily_demand_matrix
+
+logger = logging.getLogger(__name__)
+
+STREAMING_ANOMALIES = os.getenv("STREAMING_ANOMALIES", "true").lower() == "true"
+
+# Days of rollup history used to warm up a series the first time it is seen
+SEED_DAYS = int(os.getenv("STREAM_SEED_DAYS", "60"))
+
+# How often series without sales get their finished days closed and scored
+IDLE_CHECK_INTERVAL_MINUTES = int(os.getenv("STREAM_IDLE_CHECK_INTERVAL_MINUTES", "60"))
+
+# Single worker so the detectors see events in commit order
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="anomaly-stream")
+
+def _seed_demand(key: Tuple[str, int], day: date):
+    sku, warehouse_id = key
+    db = SessionLocal()
+    try:
+        demand = load_daily_demand_matrix(
+            db, day - timedelta(days=SEED_DAYS), day - timedelta(days=1),
+            warehouse_id=warehouse_id, skus=[sku]
+        )
+    finally:
+        db.close()
+    for row, row_key in enumerate(demand["keys"]):
+        if tuple(row_key) == key:
+            values = demand["matrix"][row]
+            # Nothing before the series' first sale
+            started = values.nonzero()[0]
+            return values[started[0]:] if len(started) else None
+    return None
+
+demand_stream = DemandStream(seed=_seed_demand)
+inventory_stream = InventoryStream()
+
+def process_events(events: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Run committed events through the detectors, store and publish anomalies.
+
+    Returns:
+        The anomalies raised
+    """
+    anomalies = []
+    for kind, payload in events:
+        try:
+            if kind == "sale":
+                found = demand_stream.observe(**payload)
+                anomalies.extend(dict(a, entity_type="sales") for a in found)
+            else:
+                found = inventory_stream.observe(**payload)
+                anomalies.extend(dict(a, entity_type="inventory") for a in found)
+        except Exception as e:
+            logger.warning("Streaming anomaly detection failed for %s event: %s", kind, e)
+
+    _store_and_publish(anomalies)
+    return anomalies
+
+def close_idle_series() -> List[Dict[str, Any]]:
+    """
+    Close and score the finished days of demand series with no sale since,
+    keeping yesterday open for late sales.
+
+    Returns:
+        The anomalies raised
+    """
+    yesterday = datetime.utcnow().date() - timedelta(days=1)
+    anomalies = [dict(a, entity_type="sales") for a in demand_stream.close_idle(yesterday)]
+    _store_and_publish(anomalies)
+    return anomalies
+
+def _close_idle_in_background():
+    try:
+        close_idle_series()
+    except Exception as e:
+        logger.warning("Closing idle demand series failed: %s", e)
+
+async def run_periodically():
+    """Close idle series every IDLE_CHECK_INTERVAL_MINUTES until cancelled"""
+    while True:
+        await asyncio.sleep(IDLE_CHECK_INTERVAL_MINUTES * 60)
+        # On the detector worker, in order with the sale events
+        await asyncio.wrap_future(_executor.submit(_close_idle_in_background))
+
+def _store_and_publish(anomalies: List[Dict[str, Any]]):
+    """Upsert streaming anomalies and push their alerts to /ws clients"""
+    if not anomalies:
+        return
+
+    records = []
+    for anomaly in anomalies:
+        entity_type = anomaly.pop("entity_type")
+        description = anomaly.pop("description", None) or (
+            f"{anomaly['type']} for {anomaly['sku']}: {anomaly['quantity']} units on {anomaly['date']}"
+            f" (expected {anomaly['expected']})"
+        )
+        records.append(anomaly_record(
+            anomaly["type"],
+            anomaly["severity"],
+            entity_type,
+            anomaly.get("warehouse_id"),
+            description,
+            anomaly,
+            subject=anomaly["sku"],
+            window=date.fromisoformat(anomaly["date"]) if "date" in anomaly else None
+        ))
+
+    db = SessionLocal()
+    try:
+        stored = upsert_anomalies(db, records)
+        db.commit()
+    finally:
+        db.close()
+
+    # Anomalies correlated into an incident alert once per opened or escalated
+    # incident; the rest alert individually
+    by_key = {(r["fingerprint"], r["window_start"]): r for r in records}
+    alerts = []
+    incidents = {}
+    for row in stored:
+        if "incident" in row:
+            incidents[row["incident_id"]] = row["incident"]
+            continue
+        record = by_key[(row["fingerprint"], row["window_start"])]
+        alerts.append({
+            "type": "anomaly_alert",
+            "id": row["id"],
+            "new": row["inserted"],
+            "anomaly_type": record["anomaly_type"],
+            "severity": record["severity"],
+            "entity_type": record["entity_type"],
+            "entity_id": record["entity_id"],
+            "description": record["description"],
+            "detected_at": record["detected_at"].isoformat(),
+            "metadata": record["metadata"],
+        })
+    alerts.extend(filter(None, map(incident_alert, incidents.values())))
+
+    for alert in alerts:
+        manager.publish(alert)
+
+@event.listens_for(SalesHistory, "after_insert")
+def _stream_sale(mapper, connection, target):
+    if STREAMING_ANOMALIES:
+        Session.object_session(target).info.setdefault("anomaly_events", []).append(("sale", {
+            "sku": target.sku,
+            "warehouse_id": target.warehouse_id,
+            "sale_date": target.sale_date,
+            "quantity": target.quantity_sold,
+        }))
+
+def _inventory_event(target, old_quantity: Optional[int]):
+    Session.object_session(target).info.setdefault("anomaly_events", []).append(("inventory", {
+        "item_id": target.id,
+        "sku": target.sku,
+        "warehouse_id": target.warehouse_id,
+        "old_quantity": old_quantity,
+        "new_quantity": target.quantity or 0,
+        "reorder_point": target.reorder_point if target.reorder_point is not None else 10,
+    }))
+
+@event.listens_for(Inventory, "after_insert")
+def _stream_new_inventory(mapper, connection, target):
+    if STREAMING_ANOMALIES:
+        _inventory_event(target, None)
+
+@event.listens_for(Inventory, "after_update")
+def _stream_inventory_change(mapper, connection, target):
+    if not STREAMING_ANOMALIES:
+        return
+    history = inspect(target).attrs.quantity.history
+    if history.has_changes():
+        _inventory_event(target, history.deleted[0] if history.deleted else None)
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_events(session):
+    """Hand committed events to the detector worker"""
+    events = session.info.pop("anomaly_events", None)
+    if events:
+        _executor.submit(process_events, events)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_events(session):
+    session.info.pop("anomaly_events", None)
@@ -0,0 +1,145 @@
+"""
+Incremental delivery-delay detection on completed routes.
+Routes completed since the last watermark are scored against per-driver and
+per-vehicle baselines built from recent history; findings are upserted into
+the Anomaly table. Runs when a route is completed and on demand.
+"""
+
+import os
+import sys
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import select, func, extract, event, inspect
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../ml-pipelines'))
+
+from database import SessionLocal
+from models import Route, JobWatermark
+from anomaly_store import anomaly_record, upsert_anomalies
+
+logger = logging.getLogger(__name__)
+
+DELAY_JOB = "delivery_delay_scoring"
+
+# Completed routes used to build the driver/vehicle baselines
+BASELINE_DAYS = int(os.getenv("DELIVERY_BASELINE_DAYS", "90"))
+
+# Re-scan window behind the watermark for routes whose completion committed late;
+# scoring is an upsert, so the overlap is idempotent
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="delivery-delays")
+_job_lock = threading.Lock()
+
+def _completed_routes(db: Session, since: Optional[datetime] = None, until: Optional[datetime] = None) -> pd.DataFrame:
+    """Completed routes with their actual duration in minutes"""
+    actual = extract("epoch", Route.completed_at - Route.started_at) / 60.0
+    stmt = select(
+        Route.id.label("id"),
+        Route.driver_id.label("driver_id"),
+        Route.vehicle_id.label("vehicle_id"),
+        Route.estimated_duration.label("estimated_duration"),
+        actual.label("actual_duration"),
+        Route.completed_at.label("completed_at")
+    ).where(
+        Route.completed_at.isnot(None),
+        Route.started_at.isnot(None),
+        Route.estimated_duration > 0
+    )
+    if since is not None:
+        stmt = stmt.where(Route.completed_at > since)
+    if until is not None:
+        stmt = stmt.where(Route.completed_at <= until)
+
+    columns = ["id", "driver_id", "vehicle_id", "estimated_duration", "actual_duration", "completed_at"]
+    frame = pd.DataFrame.from_records(db.execute(stmt).all(), columns=columns)
+    frame[["estimated_duration", "actual_duration"]] = frame[["estimated_duration", "actual_duration"]].astype(float)
+    return frame
+
+def score_completed_routes(db: Session, full: bool = False) -> List[Dict[str, Any]]:
+    """
+    Score routes completed since the watermark and store delay anomalies.
+
+    Args:
+        db: Database session
+        full: Ignore the watermark and score every route in the baseline window
+
+    Returns:
+        Delay anomalies found in this run
+    """
+    from anomaly_detection.isolation_forest import delivery_delay_baselines, detect_delivery_delays
+
+    with _job_lock:
+        state = db.get(JobWatermark, DELAY_JOB)
+        high_water = db.execute(select(func.max(Route.completed_at))).scalar()
+        if high_water is None:
+            return []
+
+        baseline_start = high_water - timedelta(days=BASELINE_DAYS)
+        if full or state is None or state.watermark is None:
+            since = baseline_start
+        else:
+            since = state.watermark - WATERMARK_OVERLAP
+
+        routes = _completed_routes(db, since=since, until=high_water)
+        anomalies = []
+        if not routes.empty:
+            history = _completed_routes(db, since=baseline_start, until=high_water)
+            anomalies = detect_delivery_delays(
+                routes.drop(columns="completed_at").to_dict("records"),
+                delivery_delay_baselines(history)
+            )
+            completed = dict(zip(routes["id"], routes["completed_at"]))
+            upsert_anomalies(db, [
+                anomaly_record(
+                    "delivery_delay",
+                    anomaly["severity"],
+                    "route",
+                    anomaly["route_id"],
+                    f"Route {anomaly['route_id']} took {anomaly['actual_duration']:.0f} min, "
+                    f"{anomaly['excess_over_baseline_percentage']:.0f}% over the expected "
+                    f"{anomaly['expected_duration']:.0f} min for its driver and vehicle",
+                    anomaly,
+                    window=completed[anomaly["route_id"]].date()
+                )
+                for anomaly in anomalies
+            ])
+
+        if state is None:
+            db.add(JobWatermark(job_name=DELAY_JOB, watermark=high_water))
+        else:
+            state.watermark = high_water
+        db.commit()
+
+        return anomalies
+
+def _score_in_background():
+    db = SessionLocal()
+    try:
+        score_completed_routes(db)
+    except Exception as e:
+        # The watermark is not advanced; the next run re-scores these routes
+        logger.warning("Delivery delay scoring failed: %s", e)
+    finally:
+        db.close()
+
+@event.listens_for(Route, "after_update")
+def _track_completed_route(mapper, connection, target):
+    """Remember that a route was completed in the current transaction"""
+    if target.completed_at is not None and inspect(target).attrs.completed_at.history.has_changes():
+        Session.object_session(target).info["routes_completed"] = True
+
+@event.listens_for(Session, "after_commit")
+def _schedule_scoring(session):
+    if session.info.pop("routes_completed", False):
+        _executor.submit(_score_in_background)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_completed(session):
+    session.info.pop("routes_completed", None)
@@ -0,0 +1,170 @@
+"""
+Scheduled fleet anomaly detection.
+Loads usage and maintenance totals for every vehicle, GPS pings since the
+last run and each vehicle's latest activity in a few aggregate queries, runs
+the vectorized fleet detectors and upserts findings into the Anomaly table
+with entity_type "vehicle".
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+import pandas as pd
+from sqlalchemy import select, func, case
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../ml-pipelines'))
+
+from database import SessionLocal
+from models import Vehicle, MaintenanceLog, Route, LocationPing, JobWatermark
+from anomaly_store import anomaly_record, upsert_anomalies
+
+logger = logging.getLogger(__name__)
+
+GPS_JOB = "fleet_gps_scan"
+
+SCAN_INTERVAL_MINUTES = int(os.getenv("FLEET_SCAN_INTERVAL_MINUTES", "60"))
+
+# Pings before the watermark loaded as each driver's previous position
+GPS_LOOKBACK = timedelta(hours=6)
+
+# Pings scanned on the first run
+GPS_INITIAL_DAYS = 7
+
+_job_lock = threading.Lock()
+
+def _vehicle_frame(db: Session) -> pd.DataFrame:
+    """Per-vehicle usage, maintenance totals and latest route or GPS activity"""
+    maintenance = select(
+        MaintenanceLog.vehicle_id,
+        func.sum(MaintenanceLog.cost).label("maintenance_cost"),
+        func.sum(case((MaintenanceLog.maintenance_type.in_(["repair", "emergency"]), 1), else_=0)).label("repair_count")
+    ).group_by(MaintenanceLog.vehicle_id).subquery()
+    routes = select(
+        Route.vehicle_id,
+        func.max(func.coalesce(Route.completed_at, Route.started_at)).label("last_route")
+    ).group_by(Route.vehicle_id).subquery()
+    pings = select(
+        LocationPing.vehicle_id,
+        func.max(LocationPing.recorded_at).label("last_ping")
+    ).group_by(LocationPing.vehicle_id).subquery()
+
+    stmt = select(
+        Vehicle.id,
+        Vehicle.vehicle_type,
+        Vehicle.status,
+        Vehicle.total_distance,
+        Vehicle.total_hours,
+        maintenance.c.maintenance_cost,
+        maintenance.c.repair_count,
+        func.coalesce(
+            func.greatest(routes.c.last_route, pings.c.last_ping),
+            Vehicle.created_at
+        ).label("last_activity")
+    ).outerjoin(maintenance, maintenance.c.vehicle_id == Vehicle.id) \
+     .outerjoin(routes, routes.c.vehicle_id == Vehicle.id) \
+     .outerjoin(pings, pings.c.vehicle_id == Vehicle.id)
+
+    columns = ["id", "vehicle_type", "status", "total_distance", "total_hours",
+               "maintenance_cost", "repair_count", "last_activity"]
+    frame = pd.DataFrame.from_records(db.execute(stmt).all(), columns=columns)
+    frame["last_activity"] = pd.to_datetime(frame["last_activity"])
+    return frame
+
+def _ping_frame(db: Session, since: datetime, until: datetime) -> pd.DataFrame:
+    stmt = select(
+        LocationPing.id,
+        LocationPing.driver_id,
+        LocationPing.vehicle_id,
+        func.ST_Y(LocationPing.location).label("latitude"),
+        func.ST_X(LocationPing.location).label("longitude"),
+        LocationPing.recorded_at
+    ).where(LocationPing.recorded_at > since, LocationPing.recorded_at <= until)
+
+    columns = ["id", "driver_id", "vehicle_id", "latitude", "longitude", "recorded_at"]
+    frame = pd.DataFrame.from_records(db.execute(stmt).all(), columns=columns)
+    frame["recorded_at"] = pd.to_datetime(frame["recorded_at"])
+    return frame
+
+def scan_fleet(db: Session) -> List[Dict[str, Any]]:
+    """
+    Run the usage, GPS jump and idle checks over the whole fleet and store
+    the findings.
+
+    Usage and idle findings are de-duplicated per vehicle and day; GPS jumps
+    are scored for pings since the last scan.
+
+    Returns:
+        Fleet anomalies found in this run
+    """
+    from anomaly_detection.fleet import detect_usage_outliers, detect_gps_jumps, detect_idle_vehicles
+
+    with _job_lock:
+        now = datetime.utcnow()
+        vehicles = _vehicle_frame(db)
+        anomalies = detect_usage_outliers(vehicles) + detect_idle_vehicles(vehicles, now)
+
+        state = db.get(JobWatermark, GPS_JOB)
+        high_water = db.execute(select(func.max(LocationPing.recorded_at))).scalar()
+        if high_water is not None:
+            since = state.watermark if state is not None and state.watermark is not None \
+                else high_water - timedelta(days=GPS_INITIAL_DAYS)
+            pings = _ping_frame(db, since - GPS_LOOKBACK, high_water)
+            anomalies += detect_gps_jumps(pings, since=since)
+
+        descriptions = {
+            "vehicle_usage": lambda a: (
+                f"Vehicle {a['vehicle_id']} usage is unusual for a {a['vehicle_type']}: "
+                f"{', '.join(a['outlying_features']) or 'combined profile'} (score {a['score']})"
+            ),
+            "idle_vehicle": lambda a: (
+                f"Vehicle {a['vehicle_id']} ({a['status']}) has had no route or GPS activity "
+                f"for {a['idle_days']:.0f} days"
+            ),
+            "gps_jump": lambda a: (
+                f"Driver {a['driver_id']} moved {a['distance_km']:.1f} km in {a['elapsed_seconds']:.0f} s"
+            ),
+        }
+        upsert_anomalies(db, [
+            anomaly_record(
+                anomaly["type"],
+                anomaly["severity"],
+                "vehicle",
+                anomaly["vehicle_id"],
+                descriptions[anomaly["type"]](anomaly),
+                anomaly,
+                subject=anomaly.get("ping_id"),
+                window=datetime.fromisoformat(anomaly["recorded_at"]) if "recorded_at" in anomaly else None,
+                detected_at=now
+            )
+            for anomaly in anomalies
+        ])
+
+        if high_water is not None:
+            if state is None:
+                db.add(JobWatermark(job_name=GPS_JOB, watermark=high_water))
+            else:
+                state.watermark = high_water
+        db.commit()
+
+        return anomalies
+
+def _scan_in_background():
+    db = SessionLocal()
+    try:
+        scan_fleet(db)
+    except Exception as e:
+        logger.warning("Fleet anomaly scan failed: %s", e)
+    finally:
+        db.close()
+
+async def run_periodically():
+    """Scan the fleet every SCAN_INTERVAL_MINUTES until cancelled"""
+    while True:
+        await asyncio.to_thread(_scan_in_background)
+        await asyncio.sleep(SCAN_INTERVAL_MINUTES * 60)
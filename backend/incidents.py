@@ -0,0 +1,269 @@
+"""
+Incremental correlation of anomalies into incidents.
+Newly stored warehouse anomalies (demand and inventory) are grouped by
+warehouse, SKU category and INCIDENT_WINDOW_HOURS window of detection into
+one Incident row, whose summary and root-cause hint are refreshed from its
+members. Alerts are then raised per incident, only when it is opened or its
+severity escalates, instead of once per anomaly.
+"""
+
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import select, update, func, tuple_, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from models import Anomaly, Incident, Inventory
+from anomaly_store import SEVERITY_RANK, dedup_window_start
+
+# Anomalies of one warehouse and category detected within this window form one incident
+INCIDENT_WINDOW_HOURS = int(os.getenv("INCIDENT_WINDOW_HOURS", "24"))
+
+# Entity types whose entity_id is a warehouse
+WAREHOUSE_ENTITY_TYPES = ("sales", "inventory")
+
+# Distinct SKUs affected before a problem is treated as category-wide
+WIDESPREAD_SKUS = 3
+
+UNCATEGORIZED = "uncategorized"
+
+def root_cause_hint(type_counts: Dict[str, int], sku_count: int) -> str:
+    """Likely cause of an incident from the mix of its anomaly types"""
+    spikes = type_counts.get("demand_spike", 0)
+    drops = type_counts.get("demand_drop", 0)
+    shortages = type_counts.get("stockout", 0) + type_counts.get("low_stock", 0)
+    adjustments = type_counts.get("inventory_adjustment", 0)
+
+    if spikes and shortages:
+        return "Demand surge depleting stock: expedite replenishment and review forecasts for the category"
+    if shortages and sku_count >= WIDESPREAD_SKUS:
+        return "Replenishment failure across the category: check inbound shipments and the supplier"
+    if drops and sku_count >= WIDESPREAD_SKUS:
+        return "Category-wide sales drop: check for a warehouse disruption or a missing sales feed"
+    if adjustments and adjustments >= max(type_counts.values()):
+        return "Unusual stock adjustments: check for counting or recording errors"
+    if shortages:
+        return "Stock below reorder point: review reorder points and lead times"
+    if spikes:
+        return "Demand spike: check for promotions or one-off bulk orders"
+    if drops:
+        return "Demand drop: check product availability and listing"
+    return "Multiple related anomalies: investigate the warehouse"
+
+def _categories(db: Session, skus: Iterable[str]) -> Dict[Any, str]:
+    """Category per (sku, warehouse_id), with a per-SKU fallback under key sku"""
+    rows = db.execute(
+        select(Inventory.sku, Inventory.warehouse_id, Inventory.category)
+        .where(Inventory.sku.in_(set(skus)), Inventory.category.isnot(None))
+    ).all()
+    categories = {}
+    for sku, warehouse_id, category in rows:
+        categories[(sku, warehouse_id)] = category
+        categories.setdefault(sku, category)
+    return categories
+
+def correlate_anomalies(db: Session, stored: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """
+    Attach newly stored anomalies to their incidents and refresh those incidents.
+
+    Only anomalies not yet in an incident are attached, so re-detections
+    stay with the incident they first joined; reopened anomalies left their
+    incident in upsert_anomalies and are attached again. The caller commits.
+
+    Args:
+        stored: upsert_anomalies rows (id and window_start)
+
+    Returns:
+        Per touched incident id: its summary plus 'new' (opened or reopened
+        by this call) and 'escalated' (severity rose); stored rows that
+        joined an incident get its 'incident_id' and summary as 'incident'
+    """
+    if not stored:
+        return {}
+
+    table = Anomaly.__table__
+    keys = [(row["id"], row["window_start"]) for row in stored]
+    anomalies = db.execute(
+        select(table.c.id, table.c.window_start, table.c.entity_id, table.c.detected_at, table.c.metadata)
+        .where(
+            tuple_(table.c.id, table.c.window_start).in_(keys),
+            table.c.incident_id.is_(None),
+            table.c.entity_type.in_(WAREHOUSE_ENTITY_TYPES),
+            table.c.entity_id > 0
+        )
+    ).all()
+    anomalies = [a for a in anomalies if (a.metadata or {}).get("sku")]
+    if not anomalies:
+        return {}
+
+    categories = _categories(db, (a.metadata["sku"] for a in anomalies))
+    members: Dict[tuple, List[Any]] = {}
+    for anomaly in anomalies:
+        sku = anomaly.metadata["sku"]
+        category = categories.get((sku, anomaly.entity_id)) or categories.get(sku) or UNCATEGORIZED
+        window = dedup_window_start(anomaly.detected_at, INCIDENT_WINDOW_HOURS)
+        members.setdefault((anomaly.entity_id, category, window), []).append(anomaly)
+
+    now = datetime.utcnow()
+    incidents = Incident.__table__
+    stmt = pg_insert(incidents).values([
+        {
+            "warehouse_id": warehouse_id,
+            "category": category,
+            "window_start": window,
+            "anomaly_count": 0,
+            "sku_count": 0,
+            "resolved": False,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for warehouse_id, category, window in members
+    ])
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_incident_key",
+        set_={"updated_at": stmt.excluded.updated_at}
+    ).returning(
+        incidents.c.id,
+        incidents.c.warehouse_id,
+        incidents.c.category,
+        incidents.c.window_start,
+        incidents.c.severity,
+        incidents.c.resolved,
+        # xmax is 0 only for rows this statement inserted
+        literal_column("(xmax = 0)").label("inserted")
+    )
+    touched = {
+        (row.warehouse_id, row.category, row.window_start): row
+        for row in db.execute(stmt)
+    }
+
+    incident_of = {}
+    for key, rows in members.items():
+        incident_id = touched[key].id
+        db.execute(
+            update(table)
+            .where(tuple_(table.c.id, table.c.window_start).in_([(a.id, a.window_start) for a in rows]))
+            .values(incident_id=incident_id)
+        )
+        incident_of.update({(a.id, a.window_start): incident_id for a in rows})
+
+    # Refresh each touched incident from all of its members in grouped queries
+    incident_ids = [row.id for row in touched.values()]
+    member_rows = select(
+        table.c.incident_id,
+        func.coalesce(table.c.metadata["type"].as_string(), table.c.anomaly_type).label("anomaly_type"),
+        table.c.metadata["sku"].as_string().label("sku"),
+        table.c.severity,
+        table.c.detected_at,
+        func.coalesce(table.c.last_detected_at, table.c.detected_at).label("last_detected_at")
+    ).where(table.c.incident_id.in_(incident_ids)).subquery()
+    groups = db.execute(
+        select(
+            member_rows.c.incident_id,
+            member_rows.c.anomaly_type,
+            member_rows.c.severity,
+            func.count().label("count"),
+            func.min(member_rows.c.detected_at).label("first_detected_at"),
+            func.max(member_rows.c.last_detected_at).label("last_detected_at")
+        ).group_by(member_rows.c.incident_id, member_rows.c.anomaly_type, member_rows.c.severity)
+    ).all()
+    sku_counts = dict(db.execute(
+        select(member_rows.c.incident_id, func.count(func.distinct(member_rows.c.sku)))
+        .group_by(member_rows.c.incident_id)
+    ).all())
+
+    summaries: Dict[int, Dict[str, Any]] = {}
+    for row in touched.values():
+        summaries[row.id] = {
+            "id": row.id,
+            "warehouse_id": row.warehouse_id,
+            "category": row.category,
+            "window_start": row.window_start,
+            "types": Counter(),
+            "severity": None,
+            "first_detected_at": None,
+            "last_detected_at": None,
+            # A resolved incident that gains new members is reopened
+            "new": bool(row.inserted or row.resolved),
+            "previous_severity": None if row.inserted else row.severity,
+        }
+    for group in groups:
+        summary = summaries[group.incident_id]
+        summary["types"][group.anomaly_type] += group.count
+        if summary["severity"] is None or SEVERITY_RANK.get(group.severity, 0) > SEVERITY_RANK.get(summary["severity"], 0):
+            summary["severity"] = group.severity
+        summary["first_detected_at"] = min(filter(None, [summary["first_detected_at"], group.first_detected_at]))
+        summary["last_detected_at"] = max(filter(None, [summary["last_detected_at"], group.last_detected_at]))
+
+    result = {}
+    for incident_id, summary in summaries.items():
+        types = dict(summary.pop("types"))
+        previous = summary.pop("previous_severity")
+        summary.update(
+            anomaly_count=sum(types.values()),
+            sku_count=sku_counts.get(incident_id, 0),
+            anomaly_types=types,
+            root_cause=root_cause_hint(types, sku_counts.get(incident_id, 0)),
+        )
+        db.execute(
+            update(incidents).where(incidents.c.id == incident_id).values(
+                severity=summary["severity"],
+                anomaly_count=summary["anomaly_count"],
+                sku_count=summary["sku_count"],
+                anomaly_types=types,
+                root_cause=summary["root_cause"],
+                first_detected_at=summary["first_detected_at"],
+                last_detected_at=summary["last_detected_at"],
+                resolved=False,
+                resolved_at=None,
+                updated_at=now
+            )
+        )
+        summary["escalated"] = not summary["new"] and previous is not None and \
+            SEVERITY_RANK.get(summary["severity"], 0) > SEVERITY_RANK.get(previous, 0)
+        result[incident_id] = summary
+
+    for row in stored:
+        incident_id = incident_of.get((row["id"], row["window_start"]))
+        if incident_id is not None:
+            row["incident_id"] = incident_id
+            row["incident"] = result[incident_id]
+    return result
+
+def incident_alert(summary: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """WebSocket message for an incident that was opened or escalated, else None"""
+    if not (summary["new"] or summary["escalated"]):
+        return None
+    return {
+        "type": "incident_alert",
+        "id": summary["id"],
+        "new": summary["new"],
+        "warehouse_id": summary["warehouse_id"],
+        "category": summary["category"],
+        "severity": summary["severity"],
+        "anomaly_count": summary["anomaly_count"],
+        "sku_count": summary["sku_count"],
+        "anomaly_types": summary["anomaly_types"],
+        "root_cause": summary["root_cause"],
+        "last_detected_at": summary["last_detected_at"].isoformat(),
+    }
+
+def resolve_incident(db: Session, incident: Incident) -> int:
+    """
+    Resolve an incident and all of its open anomalies. The caller commits.
+
+    Returns:
+        Number of anomalies resolved
+    """
+    now = datetime.utcnow()
+    incident.resolved = True
+    incident.resolved_at = now
+    result = db.execute(
+        update(Anomaly.__table__)
+        .where(Anomaly.__table__.c.incident_id == incident.id, Anomaly.__table__.c.resolved.is_(False))
+        .values(resolved=True, resolved_at=now)
+    )
+    return result.rowcount
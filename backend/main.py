@@ -6,11 +6,19 @@ Integrates all routers and provides WebSocket support for real-time updates.
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import os
 from dotenv import load_dotenv
 
 # Import database initialization
-from database import init_db
+from database import init_db, SessionLocal
+import sales_data  # keeps the daily rollup and feature store current (refresh started in lifespan)
+import anomaly_retention  # creates upcoming anomaly partitions on a schedule (started in lifespan)
+from realtime import manager
+import model_training  # registers the retrain-on-ingest session hooks
+import anomaly_stream  # registers the streaming anomaly detection session hooks; idle series closed in lifespan
+import delivery_monitoring  # scores delivery delays when routes are completed
+import fleet_monitoring  # scans the fleet for usage, GPS and idle anomalies on a schedule (started in lifespan)
 
 # Import routers
 from routers import (
@@ -36,10 +44,33 @@ load_dotenv()
 async def lifespan(app: FastAPI):
     # Startup
     print("🚀 Starting Warefy Supply Chain Optimizer...")
+    manager.bind_loop(asyncio.get_running_loop())
     init_db()
     print("✅ Database initialized")
+    db = SessionLocal()
+    try:
+        sales_data.refresh_daily_sales_rollup(db)
+        print("✅ Daily sales rollup refreshed")
+        sales_data.refresh_feature_store(db)
+        print("✅ Feature store refreshed")
+        anomaly_retention.ensure_anomaly_partitions(db)
+        print("✅ Anomaly partitions ready")
+    finally:
+        db.close()
+    fleet_scan = asyncio.create_task(fleet_monitoring.run_periodically())
+    print("✅ Fleet anomaly scan scheduled")
+    partition_check = asyncio.create_task(anomaly_retention.run_periodically())
+    print("✅ Anomaly partition check scheduled")
+    feature_refresh = asyncio.create_task(sales_data.run_periodically())
+    print("✅ Feature store refresh scheduled")
+    idle_series_check = asyncio.create_task(anomaly_stream.run_periodically())
+    print("✅ Idle demand series check scheduled")
     yield
     # Shutdown
+    fleet_scan.cancel()
+    partition_check.cancel()
+    feature_refresh.cancel()
+    idle_series_check.cancel()
     print("👋 Shutting down Warefy...")
 
 # Create FastAPI app
@@ -57,6 +88,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -70,27 +102,6 @@ app.include_router(anomalies.router)
 app.include_router(vehicles.router)
 app.include_router(driver_router)
 
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                pass
-
-manager = ConnectionManager()
-
 # WebSocket endpoint for real-time updates
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -128,7 +139,7 @@ def health_check():
 def api_info():
     return {
         "features": [
-            "Demand Forecasting (Prophet, LSTM, XGBoost)",
+            "Demand Forecasting (Prophet, LSTM, XGBoost, Holt-Winters, Croston/TSB)",
             "Route Optimization (OR-Tools)",
             "Multi-Warehouse Inventory Management",
             "AI-Powered Recommendations (GPT-4)",
@@ -0,0 +1,216 @@
+"""
+Incremental retraining of per-SKU forecasting models.
+Stored models are updated with only the days added since they were last
+trained (warm-started Prophet, continued XGBoost boosting, fine-tuned LSTM)
+and fully refit every FULL_REFIT_EVERY updates to avoid drift.
+"""
+
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Dict, Any, Iterable, List, Optional, Set
+
+from sqlalchemy import event, select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../ml-pipelines'))
+
+from database import SessionLocal
+from models import SalesHistory, DailySalesRollup, ModelTrainingState
+from sales_data import get_daily_demand, refresh_daily_sales_rollup
+
+TRAINABLE_MODELS = ["prophet", "xgboost", "lstm"]
+
+# Incremental updates allowed before a model is refit from scratch
+FULL_REFIT_EVERY = int(os.getenv("MODEL_FULL_REFIT_EVERY", "10"))
+
+# Retrain the affected SKUs in the background whenever new sales are committed
+RETRAIN_ON_INGEST = os.getenv("RETRAIN_ON_INGEST", "false").lower() == "true"
+RETRAIN_MODEL_TYPES = [
+    m.strip() for m in os.getenv("RETRAIN_MODEL_TYPES", "xgboost").split(",") if m.strip()
+]
+
+# Single worker so ingest-triggered jobs never train the same model concurrently
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retrain")
+_pending_lock = threading.Lock()
+_pending_skus: Set[str] = set()
+
+def _history_through(historical_data) -> Optional[date]:
+    if len(historical_data) == 0:
+        return None
+    return historical_data["date"].max().date()
+
+def retrain_model(
+    db: Session,
+    sku: str,
+    model_type: str,
+    warehouse_id: Optional[int] = None,
+    force_full: bool = False
+) -> Dict[str, Any]:
+    """
+    Bring one stored model up to date with the sales history.
+
+    Args:
+        db: Database session
+        sku: Product SKU
+        model_type: prophet, xgboost or lstm
+        warehouse_id: Warehouse scope (None = all warehouses)
+        force_full: Refit from scratch even if a stored model exists
+
+    Returns:
+        Dict with 'status' (up_to_date, updated, refit, skipped) and 'trained_through'
+    """
+    from demand_forecasting.model_store import model_key, load_model, save_model
+
+    historical_data = get_daily_demand(db, sku, warehouse_id, include_covariates=True)
+    through = _history_through(historical_data)
+    if through is None:
+        return {"status": "skipped", "trained_through": None}
+
+    state = db.execute(
+        select(ModelTrainingState).where(
+            ModelTrainingState.sku == sku,
+            ModelTrainingState.warehouse_id == (warehouse_id or 0),
+            ModelTrainingState.model_type == model_type
+        )
+    ).scalar_one_or_none()
+
+    if not force_full and state is not None and state.trained_through is not None \
+            and state.trained_through >= through:
+        return {"status": "up_to_date", "trained_through": state.trained_through.isoformat()}
+
+    key = model_key(sku, warehouse_id)
+    previous_model, scaler = None, None
+    n_updates = state.n_updates if state is not None else 0
+    if not force_full and state is not None and n_updates < FULL_REFIT_EVERY:
+        previous_model, scaler, _ = load_model(model_type, key)
+
+    if model_type == "prophet":
+        from demand_forecasting.prophet_model import train_prophet_model
+        model = train_prophet_model(sku, historical_data, previous_model=previous_model)
+    elif model_type == "xgboost":
+        from demand_forecasting.xgboost_model import train_xgboost_model
+        model = train_xgboost_model(historical_data, previous_model=previous_model)
+    elif model_type == "lstm":
+        from demand_forecasting.lstm_model import train_lstm_model
+        model, scaler = train_lstm_model(historical_data, previous_model=previous_model, scaler=scaler)
+    else:
+        raise ValueError(f"Model type {model_type} does not support stored models")
+
+    if model is None:
+        return {"status": "skipped", "trained_through": None}
+
+    incremental = previous_model is not None
+    n_updates = n_updates + 1 if incremental else 0
+    save_model(
+        model_type, key, model,
+        {"trained_through": through.isoformat(), "n_updates": n_updates},
+        scaler=scaler
+    )
+
+    stmt = pg_insert(ModelTrainingState).values(
+        sku=sku,
+        warehouse_id=warehouse_id or 0,
+        model_type=model_type,
+        trained_through=through,
+        n_updates=n_updates,
+        updated_at=datetime.utcnow()
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_model_training_state",
+        set_={
+            "trained_through": stmt.excluded.trained_through,
+            "n_updates": stmt.excluded.n_updates,
+            "updated_at": stmt.excluded.updated_at
+        }
+    )
+    db.execute(stmt)
+    db.commit()
+
+    return {"status": "updated" if incremental else "refit", "trained_through": through.isoformat()}
+
+def find_stale_skus(db: Session, model_type: str) -> List[str]:
+    """SKUs whose all-warehouse model is missing or older than their latest rollup day"""
+    latest = select(
+        DailySalesRollup.sku,
+        func.max(DailySalesRollup.sale_day).label("last_day")
+    ).group_by(DailySalesRollup.sku).subquery()
+
+    stmt = select(latest.c.sku).outerjoin(
+        ModelTrainingState,
+        (ModelTrainingState.sku == latest.c.sku)
+        & (ModelTrainingState.warehouse_id == 0)
+        & (ModelTrainingState.model_type == model_type)
+    ).where(
+        (ModelTrainingState.trained_through.is_(None))
+        | (ModelTrainingState.trained_through < latest.c.last_day)
+    )
+    return list(db.execute(stmt).scalars())
+
+def run_incremental_retraining(
+    db: Session,
+    skus: Optional[Iterable[str]] = None,
+    model_types: Optional[List[str]] = None,
+    warehouse_id: Optional[int] = None,
+    force_full: bool = False
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Retrain stored models for the given SKUs (default: every stale SKU).
+
+    Returns:
+        Dict mapping "<model_type>:<sku>" to the retrain_model result or an error
+    """
+    refresh_daily_sales_rollup(db)
+    results = {}
+
+    for model_type in model_types or RETRAIN_MODEL_TYPES:
+        targets = list(skus) if skus is not None else find_stale_skus(db, model_type)
+        for sku in targets:
+            try:
+                results[f"{model_type}:{sku}"] = retrain_model(
+                    db, sku, model_type, warehouse_id=warehouse_id, force_full=force_full
+                )
+            except Exception as e:
+                db.rollback()
+                results[f"{model_type}:{sku}"] = {"status": "error", "error": str(e)}
+
+    return results
+
+def _retrain_pending():
+    with _pending_lock:
+        skus = list(_pending_skus)
+        _pending_skus.clear()
+    if not skus:
+        return
+
+    db = SessionLocal()
+    try:
+        run_incremental_retraining(db, skus)
+    finally:
+        db.close()
+
+@event.listens_for(SalesHistory, "after_insert")
+def _track_new_sale(mapper, connection, target):
+    """Remember which SKUs received new sales in the current transaction"""
+    if RETRAIN_ON_INGEST:
+        Session.object_session(target).info.setdefault("retrain_skus", set()).add(target.sku)
+
+@event.listens_for(Session, "after_commit")
+def _schedule_retraining(session):
+    """Queue retraining for SKUs with newly committed sales"""
+    skus = session.info.pop("retrain_skus", None)
+    if not skus:
+        return
+
+    with _pending_lock:
+        already_queued = bool(_pending_skus)
+        _pending_skus.update(skus)
+    if not already_queued:
+        _executor.submit(_retrain_pending)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop("retrain_skus", None)
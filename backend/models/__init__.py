@@ -3,7 +3,7 @@ Database models for Warefy Supply Chain Optimizer.
 Includes models for users, warehouses, inventory, vehicles, routes, and more.
 """
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, JSON
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Boolean, Text, JSON, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 from geoalchemy2 import Geometry
 from datetime import datetime
@@ -47,6 +47,14 @@ class Warehouse(Base):
 class Inventory(Base):
     """Inventory tracking for products across warehouses"""
     __tablename__ = "inventory"
+    __table_args__ = (
+        # Partial index: only rows at or below their reorder point, for anomaly scans
+        Index(
+            "ix_inventory_low_stock",
+            "warehouse_id",
+            postgresql_where=text("quantity <= reorder_point")
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     warehouse_id = Column(Integer, ForeignKey("warehouses.id"), nullable=False)
@@ -56,6 +64,12 @@ class Inventory(Base):
     quantity = Column(Integer, default=0)
     reorder_point = Column(Integer, default=10)
     unit_price = Column(Float)
+    # Replenishment policy inputs and forecast-driven outputs
+    lead_time_days = Column(Integer, default=7)
+    service_level = Column(Float, default=0.95)
+    safety_stock = Column(Integer, default=0)
+    reorder_quantity = Column(Integer)
+    policy_updated_at = Column(DateTime)
     last_restocked = Column(DateTime)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -103,6 +117,19 @@ class Driver(Base):
     vehicles = relationship("Vehicle", back_populates="driver")
     routes = relationship("Route", back_populates="driver")
 
+class LocationPing(Base):
+    """GPS positions reported by drivers, kept for fleet anomaly detection"""
+    __tablename__ = "location_pings"
+    __table_args__ = (
+        Index("ix_location_pings_driver_recorded_at", "driver_id", "recorded_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    driver_id = Column(Integer, ForeignKey("drivers.id"), nullable=False)
+    vehicle_id = Column(Integer, ForeignKey("vehicles.id"))  # driver's vehicle at the time
+    location = Column(Geometry('POINT', srid=4326), nullable=False)
+    recorded_at = Column(DateTime, default=datetime.utcnow, index=True)
+
 class Route(Base):
     """Optimized delivery routes"""
     __tablename__ = "routes"
@@ -138,25 +165,105 @@ class SalesHistory(Base):
     revenue = Column(Float)
     customer_segment = Column(String)
     promotion_applied = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     
     # Relationships
     warehouse = relationship("Warehouse")
 
+class DailySalesRollup(Base):
+    """Daily sales totals per SKU and warehouse, maintained incrementally from SalesHistory"""
+    __tablename__ = "daily_sales_rollup"
+    __table_args__ = (
+        UniqueConstraint("sku", "warehouse_id", "sale_day", name="uq_daily_sales_rollup"),
+        Index("ix_daily_sales_rollup_sku_day", "sku", "sale_day"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sku = Column(String, nullable=False)
+    warehouse_id = Column(Integer, nullable=False, default=0)  # 0 = sales without a warehouse
+    sale_day = Column(Date, nullable=False)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, default=0.0)
+    transactions = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class JobWatermark(Base):
+    """High-water marks for incremental background jobs"""
+    __tablename__ = "job_watermarks"
+    
+    job_name = Column(String, primary_key=True)
+    watermark = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ModelTrainingState(Base):
+    """How far each stored per-SKU forecasting model has been trained"""
+    __tablename__ = "model_training_state"
+    __table_args__ = (
+        UniqueConstraint("sku", "warehouse_id", "model_type", name="uq_model_training_state"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sku = Column(String, nullable=False, index=True)
+    warehouse_id = Column(Integer, nullable=False, default=0)  # 0 = all warehouses
+    model_type = Column(String, nullable=False)  # prophet, lstm, xgboost
+    trained_through = Column(Date)  # last sale day included in training
+    n_updates = Column(Integer, default=0)  # incremental updates since the last full refit
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class Anomaly(Base):
     """Detected anomalies in supply chain operations"""
     __tablename__ = "anomalies"
+    __table_args__ = (
+        # Re-detections of the same finding in the same window update one row
+        UniqueConstraint("fingerprint", "window_start", name="uq_anomaly_fingerprint"),
+        # Recent-feed queries: newest unresolved first, and newest by resolved state
+        Index("ix_anomalies_unresolved_recent", "detected_at", "id", postgresql_where=text("resolved = false")),
+        Index("ix_anomalies_resolved_detected_at", "resolved", "detected_at", "id"),
+        # Per-series lookups, e.g. stored demand anomalies when cleaning forecast history
+        Index("ix_anomalies_entity_window", "entity_type", "entity_id", "window_start"),
+        # Monthly partitions on the immutable window start (see anomaly_retention)
+        {"postgresql_partition_by": "RANGE (window_start)"},
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     anomaly_type = Column(String, nullable=False)  # demand_spike, stockout, delay
     severity = Column(String, default="medium")  # low, medium, high, critical
     entity_type = Column(String)  # warehouse, vehicle, route, inventory
     entity_id = Column(Integer)
     description = Column(Text)
-    detected_at = Column(DateTime, default=datetime.utcnow, index=True)
+    detected_at = Column(DateTime, default=datetime.utcnow, index=True)  # first detection; never updated
+    last_detected_at = Column(DateTime)  # latest re-detection in the window
     resolved = Column(Boolean, default=False)
     resolved_at = Column(DateTime)
     metadata = Column(JSON)  # Additional context data
+    fingerprint = Column(String(40))  # hash of type, entity and subject (see anomaly_store)
+    # Start of the de-duplication window; also the partition key, hence part of the primary key
+    window_start = Column(DateTime, primary_key=True, default=datetime.utcnow)
+    occurrences = Column(Integer, default=1)  # detections folded into this row
+    incident_id = Column(Integer, ForeignKey("incidents.id"), index=True)  # correlated incident, if any
+
+class Incident(Base):
+    """Related anomalies of one warehouse, SKU category and time window"""
+    __tablename__ = "incidents"
+    __table_args__ = (
+        UniqueConstraint("warehouse_id", "category", "window_start", name="uq_incident_key"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    warehouse_id = Column(Integer, ForeignKey("warehouses.id"), nullable=False)
+    category = Column(String, nullable=False)  # SKU category, "uncategorized" when unknown
+    window_start = Column(DateTime, nullable=False)  # start of the correlation window
+    severity = Column(String, default="medium")  # highest member severity
+    anomaly_count = Column(Integer, default=0)
+    sku_count = Column(Integer, default=0)
+    anomaly_types = Column(JSON)  # member counts by anomaly type
+    root_cause = Column(Text)  # rule-based hint (see incidents)
+    first_detected_at = Column(DateTime)
+    last_detected_at = Column(DateTime)
+    resolved = Column(Boolean, default=False)
+    resolved_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class MaintenanceLog(Base):
     """Vehicle maintenance history and predictions"""
@@ -0,0 +1,111 @@
+"""
+Real-time updates over the /ws WebSocket channel.
+Holds the connection manager shared by the app and the routers, plus a
+progress reporter that long-running jobs use to stream their status.
+"""
+
+import asyncio
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from fastapi import WebSocket
+
+class ConnectionManager:
+    def __init__(self):
+        self.active_connections: list[WebSocket] = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """Remember the server's event loop so worker threads can publish"""
+        self.loop = loop
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        self.active_connections.append(websocket)
+
+    def disconnect(self, websocket: WebSocket):
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
+
+    async def broadcast(self, message: dict):
+        for connection in list(self.active_connections):
+            try:
+                await connection.send_json(message)
+            except Exception:
+                self.disconnect(connection)
+
+    def publish(self, message: dict):
+        """
+        Broadcast from any thread without blocking it.
+        Sync endpoints run in a threadpool, so the send is scheduled on the
+        server's event loop; messages are dropped if no loop is bound yet.
+        """
+        if self.loop is None or self.loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is self.loop:
+            self.loop.create_task(self.broadcast(message))
+        else:
+            asyncio.run_coroutine_threadsafe(self.broadcast(message), self.loop)
+
+manager = ConnectionManager()
+
+class JobProgress:
+    """
+    Publishes progress events for a job made of many independent items
+    (SKUs, backtest folds) as `job_progress` messages on /ws.
+
+    Events carry the job id, items done out of total, errors so far and an
+    ETA extrapolated from the average time per finished item, plus the
+    item's partial result so clients can render it as it lands.
+    """
+
+    def __init__(self, job_type: str, total: int, job_id: Optional[str] = None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.job_type = job_type
+        self.total = total
+        self.done = 0
+        self.errors = 0
+        self.started_at = time.monotonic()
+
+    def _publish(self, event: str, **payload: Any):
+        elapsed = time.monotonic() - self.started_at
+        remaining = max(self.total - self.done, 0)
+        eta = round(elapsed / self.done * remaining, 1) if self.done else None
+
+        message: Dict[str, Any] = {
+            "type": "job_progress",
+            "event": event,
+            "job_id": self.job_id,
+            "job_type": self.job_type,
+            "done": self.done,
+            "total": self.total,
+            "errors": self.errors,
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": eta,
+        }
+        message.update(payload)
+        manager.publish(message)
+
+    def start(self):
+        self._publish("started")
+
+    def item_done(self, item: Any, result: Any = None, error: Optional[str] = None):
+        """Record one finished item and publish its result or error"""
+        self.done += 1
+        if error is not None:
+            self.errors += 1
+            self._publish("item_failed", item=item, error=error)
+        else:
+            self._publish("item_done", item=item, result=result)
+
+    def finish(self, error: Optional[str] = None):
+        if error is not None:
+            self._publish("failed", error=error)
+        else:
+            self._publish("completed")
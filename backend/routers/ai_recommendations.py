@@ -48,6 +48,8 @@ def get_ai_recommendations(
                     "product_name": item.product_name,
                     "quantity": item.quantity,
                     "reorder_point": item.reorder_point,
+                    "reorder_quantity": item.reorder_quantity,
+                    "safety_stock": item.safety_stock,
                     "warehouse_id": item.warehouse_id
                 }
                 for item in low_stock_items
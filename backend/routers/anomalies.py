@@ -2,123 +2,302 @@
 Anomaly detection router for identifying supply chain issues.
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Response
+from sqlalchemy import select, func, tuple_
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import base64
 import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../ml-pipelines'))
 
-from database import get_db
-from models import Anomaly, SalesHistory, Inventory, Route, User
-from schemas import AnomalyResponse
-from auth import get_current_active_user
+from database import get_db, SessionLocal
+from models import Anomaly, Incident, Inventory, Route, User
+from schemas import AnomalyResponse, AnomalySummaryResponse, IncidentResponse
+from auth import get_current_active_user, require_role
+from sales_data import get_daily_demand
+from anomaly_store import anomaly_record, upsert_anomalies
 
 router = APIRouter(prefix="/api/anomalies", tags=["Anomaly Detection"])
 
 @router.get("/detect/demand")
 def detect_demand_anomalies_endpoint(
     sku: str = None,
+    warehouse_id: int = None,
     days: int = 90,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Detect anomalies in demand patterns"""
+    """
+    Detect anomalies in demand patterns.
+    For a single SKU, daily demand is scored with rolling statistics read
+    from the feature store. Without a SKU, every SKU x warehouse series is
+    normalized and scored in one pass against the stored detector for the
+    warehouse scope (refit when older than DETECTOR_REFIT_DAYS), and each
+    anomaly carries its SKU and warehouse.
+    """
     from anomaly_detection.isolation_forest import detect_demand_anomalies
+    from demand_forecasting.feature_store import get_feature_store
+    from anomaly_models import score_demand
     
     cutoff_date = datetime.utcnow() - timedelta(days=days)
-    query = db.query(SalesHistory).filter(SalesHistory.sale_date >= cutoff_date)
-    
     if sku:
-        query = query.filter(SalesHistory.sku == sku)
-    
-    sales_data = query.all()
-    
-    if not sales_data:
-        return {"anomalies": [], "message": "No sales data found"}
-    
-    # Prepare data
-    data = [
-        {"date": sale.sale_date, "quantity": sale.quantity_sold}
-        for sale in sales_data
-    ]
-    
-    anomalies = detect_demand_anomalies(data)
-    
-    # Store anomalies in database
-    for anomaly in anomalies:
-        db_anomaly = Anomaly(
-            anomaly_type="demand_anomaly",
-            severity=anomaly['severity'],
-            entity_type="sales",
-            entity_id=0,
-            description=f"{anomaly['type']}: {anomaly['quantity']} units on {anomaly['date']}",
-            metadata=anomaly
-        )
-        db.add(db_anomaly)
+        data = get_daily_demand(db, sku, warehouse_id, start=cutoff_date.date())
+        if data.empty:
+            return {"anomalies": [], "message": "No sales data found"}
+        features = None if warehouse_id else get_feature_store().load([sku], start=cutoff_date.date())
+        anomalies = [
+            dict(anomaly, sku=sku, warehouse_id=warehouse_id)
+            for anomaly in detect_demand_anomalies(data, features=features)
+        ]
+    else:
+        anomalies = score_demand(db, cutoff_date.date(), warehouse_id)
     
+    # Store anomalies in database; re-detected days update their existing row
+    upsert_anomalies(db, [
+        anomaly_record(
+            "demand_anomaly",
+            anomaly['severity'],
+            "sales",
+            anomaly['warehouse_id'],
+            f"{anomaly['type']} for {anomaly['sku']}: {anomaly['quantity']} units on {anomaly['date']}",
+            anomaly,
+            subject=anomaly['sku'],
+            window=datetime.fromisoformat(anomaly['date']).date()
+        )
+        for anomaly in anomalies
+    ])
     db.commit()
     
     return {"anomalies": anomalies, "count": len(anomalies)}
 
+def _refit_detector(warehouse_id: int = None):
+    from anomaly_models import refit_demand_detector
+    
+    db = SessionLocal()
+    try:
+        refit_demand_detector(db, warehouse_id)
+    finally:
+        db.close()
+
+@router.post("/detectors/refit")
+def refit_demand_detector_endpoint(
+    background_tasks: BackgroundTasks,
+    warehouse_id: int = None,
+    current_user: User = Depends(require_role(["admin", "manager"]))
+):
+    """
+    Refit and store the demand anomaly detector for a warehouse scope in
+    the background; call on a schedule to keep detectors current.
+    """
+    background_tasks.add_task(_refit_detector, warehouse_id)
+    return {"message": "Detector refit started", "warehouse_id": warehouse_id}
+
+def _run_retention(retention_days: int = None):
+    from anomaly_retention import ensure_anomaly_partitions, archive_resolved_anomalies, RETENTION_DAYS
+    
+    db = SessionLocal()
+    try:
+        archive_resolved_anomalies(db, retention_days or RETENTION_DAYS)
+        ensure_anomaly_partitions(db)
+    finally:
+        db.close()
+
+@router.post("/retention/run")
+def run_anomaly_retention_endpoint(
+    background_tasks: BackgroundTasks,
+    retention_days: int = None,
+    current_user: User = Depends(require_role(["admin"]))
+):
+    """
+    Archive and delete resolved anomalies past the retention period, drop
+    emptied partitions and create upcoming ones, in the background; call on
+    a schedule (e.g. daily).
+    """
+    background_tasks.add_task(_run_retention, retention_days)
+    return {"message": "Anomaly retention started", "retention_days": retention_days}
+
 @router.get("/detect/inventory")
 def detect_inventory_anomalies_endpoint(
     warehouse_id: int = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Detect inventory anomalies (stockouts, low stock)"""
-    from anomaly_detection.isolation_forest import detect_inventory_anomalies
+    """
+    Detect inventory anomalies (stockouts, low stock).
+    The rule is evaluated in SQL against the partial low-stock index, so
+    only flagged rows are read.
+    """
+    from anomaly_detection.isolation_forest import inventory_anomaly
     
-    query = db.query(Inventory)
+    stmt = select(
+        Inventory.sku,
+        Inventory.product_name,
+        Inventory.warehouse_id,
+        Inventory.quantity,
+        Inventory.reorder_point
+    ).where(Inventory.quantity <= Inventory.reorder_point)
     
     if warehouse_id:
-        query = query.filter(Inventory.warehouse_id == warehouse_id)
-    
-    inventory_items = query.all()
-    
-    data = [
-        {
-            "sku": item.sku,
-            "product_name": item.product_name,
-            "warehouse_id": item.warehouse_id,
-            "quantity": item.quantity,
-            "reorder_point": item.reorder_point
-        }
-        for item in inventory_items
-    ]
-    
-    anomalies = detect_inventory_anomalies(data)
-    
-    # Store in database
-    for anomaly in anomalies:
-        db_anomaly = Anomaly(
-            anomaly_type=anomaly['type'],
-            severity=anomaly['severity'],
-            entity_type="inventory",
-            entity_id=anomaly.get('warehouse_id', 0),
-            description=anomaly['description'],
-            metadata=anomaly
-        )
-        db.add(db_anomaly)
+        stmt = stmt.where(Inventory.warehouse_id == warehouse_id)
     
+    anomalies = [inventory_anomaly(dict(row._mapping)) for row in db.execute(stmt)]
+    
+    # Store in database; repeated polls within the window update one row per item
+    upsert_anomalies(db, [
+        anomaly_record(
+            anomaly['type'],
+            anomaly['severity'],
+            "inventory",
+            anomaly.get('warehouse_id'),
+            anomaly['description'],
+            anomaly,
+            subject=anomaly['sku']
+        )
+        for anomaly in anomalies
+    ])
     db.commit()
     
     return {"anomalies": anomalies, "count": len(anomalies)}
 
+@router.get("/detect/delivery")
+def detect_delivery_delays_endpoint(
+    full: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Detect delivery delays on routes completed since the last run.
+    Each route's overrun is compared with its driver's and vehicle's usual
+    overrun over the last DELIVERY_BASELINE_DAYS; full rescans that window.
+    Also runs automatically whenever a route is completed.
+    """
+    from delivery_monitoring import score_completed_routes
+    
+    anomalies = score_completed_routes(db, full=full)
+    return {"anomalies": anomalies, "count": len(anomalies)}
+
+@router.get("/detect/fleet")
+def detect_fleet_anomalies_endpoint(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Detect vehicle usage outliers, impossible GPS jumps and idle vehicles
+    across the whole fleet. Also runs every FLEET_SCAN_INTERVAL_MINUTES.
+    """
+    from fleet_monitoring import scan_fleet
+    
+    anomalies = scan_fleet(db)
+    return {"anomalies": anomalies, "count": len(anomalies)}
+
+def _encode_cursor(detected_at: datetime, anomaly_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{detected_at.isoformat()}|{anomaly_id}".encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        detected_at, anomaly_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(detected_at), int(anomaly_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _anomaly_filters(
+    resolved: Optional[bool],
+    severity: Optional[List[str]],
+    anomaly_type: Optional[List[str]],
+    entity_type: Optional[str],
+    entity_id: Optional[int],
+    since: Optional[datetime]
+) -> list:
+    """WHERE clauses shared by the feed and the summary"""
+    filters = []
+    if resolved is not None:
+        filters.append(Anomaly.resolved == resolved)
+    if severity:
+        filters.append(Anomaly.severity.in_(severity))
+    if anomaly_type:
+        filters.append(Anomaly.anomaly_type.in_(anomaly_type))
+    if entity_type is not None:
+        filters.append(Anomaly.entity_type == entity_type)
+    if entity_id is not None:
+        filters.append(Anomaly.entity_id == entity_id)
+    if since is not None:
+        filters.append(Anomaly.detected_at >= since)
+    return filters
+
 @router.get("/recent", response_model=list[AnomalyResponse])
 def get_recent_anomalies(
-    limit: int = 50,
+    response: Response,
+    limit: int = Query(50, ge=1),
     resolved: bool = False,
+    severity: Optional[List[str]] = Query(None),
+    anomaly_type: Optional[List[str]] = Query(None),
+    entity_type: Optional[str] = None,
+    entity_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get recent anomalies"""
-    query = db.query(Anomaly).filter(Anomaly.resolved == resolved)
-    anomalies = query.order_by(Anomaly.detected_at.desc()).limit(limit).all()
+    """
+    Get recent anomalies, newest first.
+
+    Pages are keyed on (detected_at, id), the first detection time, which
+    re-detections do not change (they update last_detected_at): pass the
+    X-Next-Cursor response header of one page as `cursor` to get the next;
+    the header is absent on the last page.
+    """
+    query = db.query(Anomaly).filter(*_anomaly_filters(resolved, severity, anomaly_type, entity_type, entity_id, since))
+    if cursor:
+        query = query.filter(tuple_(Anomaly.detected_at, Anomaly.id) < _decode_cursor(cursor))
+    
+    anomalies = query.order_by(Anomaly.detected_at.desc(), Anomaly.id.desc()).limit(limit + 1).all()
+    if len(anomalies) > limit:
+        anomalies = anomalies[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(anomalies[-1].detected_at, anomalies[-1].id)
     return anomalies
 
+@router.get("/summary", response_model=AnomalySummaryResponse)
+def get_anomaly_summary(
+    resolved: Optional[bool] = False,
+    severity: Optional[List[str]] = Query(None),
+    anomaly_type: Optional[List[str]] = Query(None),
+    entity_type: Optional[str] = None,
+    entity_id: Optional[int] = None,
+    days: int = Query(30, ge=1),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Anomaly counts grouped by type and severity over the last `days` days,
+    computed in one GROUP BY; pass resolved=null to count both states.
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = db.execute(
+        select(Anomaly.anomaly_type, Anomaly.severity, func.count().label("count"))
+        .where(*_anomaly_filters(resolved, severity, anomaly_type, entity_type, entity_id, since))
+        .group_by(Anomaly.anomaly_type, Anomaly.severity)
+    ).all()
+    
+    by_severity = {}
+    by_type = {}
+    for row in rows:
+        by_severity[row.severity] = by_severity.get(row.severity, 0) + row.count
+        by_type[row.anomaly_type] = by_type.get(row.anomaly_type, 0) + row.count
+    
+    return {
+        "total": sum(row.count for row in rows),
+        "since": since,
+        "by_severity": by_severity,
+        "by_type": by_type,
+        "groups": [
+            {"anomaly_type": row.anomaly_type, "severity": row.severity, "count": row.count}
+            for row in sorted(rows, key=lambda r: -r.count)
+        ]
+    }
+
 @router.put("/{anomaly_id}/resolve")
 def resolve_anomaly(
     anomaly_id: int,
@@ -135,3 +314,45 @@ def resolve_anomaly(
     db.commit()
     
     return {"message": "Anomaly marked as resolved"}
+
+@router.get("/incidents", response_model=list[IncidentResponse])
+def get_incidents(
+    limit: int = Query(50, ge=1, le=500),
+    resolved: bool = False,
+    warehouse_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get incidents (correlated warehouse anomalies), most recently active first"""
+    query = db.query(Incident).filter(Incident.resolved == resolved)
+    if warehouse_id is not None:
+        query = query.filter(Incident.warehouse_id == warehouse_id)
+    return query.order_by(Incident.last_detected_at.desc(), Incident.id.desc()).limit(limit).all()
+
+@router.get("/incidents/{incident_id}/anomalies", response_model=list[AnomalyResponse])
+def get_incident_anomalies(
+    incident_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get the anomalies grouped into an incident"""
+    return db.query(Anomaly).filter(Anomaly.incident_id == incident_id) \
+        .order_by(Anomaly.detected_at.desc(), Anomaly.id.desc()).all()
+
+@router.put("/incidents/{incident_id}/resolve")
+def resolve_incident_endpoint(
+    incident_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Mark an incident and all of its anomalies as resolved"""
+    from incidents import resolve_incident
+    
+    incident = db.get(Incident, incident_id)
+    if not incident:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    
+    resolved = resolve_incident(db, incident)
+    db.commit()
+    
+    return {"message": "Incident marked as resolved", "anomalies_resolved": resolved}
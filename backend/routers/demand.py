@@ -1,5 +1,6 @@
 """
-Demand forecasting router using ML models (Prophet, LSTM, XGBoost).
+Demand forecasting router using ML models (Prophet, LSTM, XGBoost) and a
+lightweight statistical engine for slow-moving SKUs.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
@@ -7,17 +8,212 @@ from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 import sys
 import os
+import logging
+import pandas as pd
 
 # Add ML pipelines to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../ml-pipelines'))
 
-from database import get_db
-from models import SalesHistory, User
-from schemas import DemandForecastRequest, DemandForecastResponse
-from auth import get_current_active_user
+from database import get_db, SessionLocal
+from models import Anomaly, Inventory, User
+from schemas import (
+    DemandForecastRequest, DemandForecastResponse,
+    BatchForecastRequest, BatchForecastResponse,
+    BacktestRequest, BacktestResponse, RetrainRequest,
+    HierarchicalForecastRequest, HierarchicalForecastResponse
+)
+from auth import get_current_active_user, require_role
+from realtime import JobProgress
+from sales_data import (
+    get_daily_demand, load_sales_frame, load_daily_demand_matrix, load_established_products,
+    refresh_daily_sales_rollup, refresh_feature_store
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/demand", tags=["Demand Forecasting"])
 
+# History days below which a forecast draws on similar products
+# (demand_forecasting.cold_start.BLEND_FULL_DAYS, kept here so long series skip that import)
+COLD_START_DAYS = 60
+
+def _load_historical_data(db: Session, sku: str, warehouse_id: int = None):
+    """Load a SKU's zero-filled daily demand and promotion/segment covariates"""
+    return get_daily_demand(db, sku, warehouse_id, include_covariates=True)
+
+def _model_options(
+    model_type: str,
+    prophet_config=None,
+    historical_data=None,
+    forecast_days: int = None,
+    promotion_dates=None
+) -> dict:
+    """Extra keyword arguments for the selected forecaster"""
+    from demand_forecasting.registry import REGRESSOR_MODELS
+    from demand_forecasting.covariates import build_future_regressors
+    
+    options = {}
+    if model_type == "prophet" and prophet_config is not None:
+        options["config"] = prophet_config.model_dump(exclude_none=True)
+    if model_type in REGRESSOR_MODELS and promotion_dates:
+        options["future_regressors"] = build_future_regressors(
+            historical_data, forecast_days, promotion_dates
+        )
+    return options
+
+def _fresh_stored_model(model_type: str, sku: str, warehouse_id: int, historical_data):
+    """
+    Store key of the SKU's model if it was trained through the latest day
+    of history, so the forecast skips fitting altogether; only metadata is
+    read here, the model itself is loaded where the forecast runs.
+    """
+    from model_training import TRAINABLE_MODELS
+    from demand_forecasting.model_store import model_key, load_metadata
+    
+    if model_type not in TRAINABLE_MODELS or len(historical_data) == 0:
+        return None
+    
+    key = model_key(sku, warehouse_id)
+    metadata = load_metadata(model_type, key)
+    last_day = historical_data["date"].max().date().isoformat()
+    if metadata is None or metadata.get("trained_through") != last_day:
+        return None
+    return key
+
+def _run_forecast(model_type: str, historical_data, forecast_days: int, options: dict, stored_model: str = None):
+    """
+    Forecast on the inference server when INFERENCE_SERVER_ADDRESS is set,
+    so this worker never imports the model libraries; otherwise in-process.
+    """
+    from demand_forecasting.inference_server import get_inference_client
+    
+    client = get_inference_client()
+    if client is not None:
+        return client.forecast(model_type, historical_data, forecast_days, options, stored_model)
+    
+    from demand_forecasting.registry import get_forecaster
+    from demand_forecasting.model_store import load_model
+    
+    options = dict(options)
+    if stored_model is not None:
+        try:
+            model, scaler, _ = load_model(model_type, stored_model)
+        except Exception:
+            model = None
+        if model is not None:
+            options["model"] = model
+            if model_type == "lstm":
+                options["scaler"] = scaler
+    return get_forecaster(model_type)(historical_data, forecast_days, **options)
+
+def _stored_features(model_type: str, skus, warehouse_id: int = None):
+    """
+    Precomputed lag/rolling rows for the SKUs from the feature store, or None.
+    The store holds all-warehouse series, so per-warehouse forecasts compute
+    their own features.
+    """
+    from demand_forecasting.feature_store import get_feature_store
+    
+    if model_type != "xgboost" or warehouse_id:
+        return None
+    features = get_feature_store().load(skus)
+    return features if len(features) else None
+
+def _cold_start_predictions(db: Session, sku: str, warehouse_id: int, historical_data, forecast_days: int):
+    """
+    Forecast a young SKU from the pooled demand of similar established
+    products (category, price band, warehouse). Returns None when the SKU
+    is not in inventory or has no usable neighbours.
+    """
+    from demand_forecasting.cold_start import (
+        MIN_NEIGHBOR_HISTORY_DAYS, get_similarity_index, pooled_profile, cold_start_forecast
+    )
+    
+    query = db.query(Inventory.sku, Inventory.warehouse_id, Inventory.category, Inventory.unit_price)
+    query = query.filter(Inventory.sku == sku)
+    if warehouse_id:
+        query = query.filter(Inventory.warehouse_id == warehouse_id)
+    targets = pd.DataFrame(query.all(), columns=["sku", "warehouse_id", "category", "unit_price"])
+    if targets.empty:
+        return None
+    
+    index = get_similarity_index(lambda: load_established_products(db, MIN_NEIGHBOR_HISTORY_DAYS))
+    if index is None:
+        return None
+    neighbours = index.query(targets)
+    
+    if len(historical_data):
+        last_date = historical_data["date"].max()
+    else:
+        last_date = pd.Timestamp(datetime.utcnow().date() - timedelta(days=1))
+    end = last_date.date()
+    start = end - timedelta(days=MIN_NEIGHBOR_HISTORY_DAYS * 3 - 1)
+    
+    demand = load_daily_demand_matrix(
+        db, start, end, skus=sorted({n_sku for row in neighbours for n_sku, _, _ in row})
+    )
+    rows = {key: i for i, key in enumerate(demand["keys"])}
+    
+    profiles = []
+    for row in neighbours:
+        matched = [(rows[(n_sku, n_wh)], d) for n_sku, n_wh, d in row if (n_sku, n_wh) in rows]
+        if not matched:
+            continue
+        profile = pooled_profile(
+            demand["matrix"][[i for i, _ in matched]],
+            [d for _, d in matched],
+            forecast_days
+        )
+        if profile is not None:
+            profiles.append(profile)
+    
+    if not profiles:
+        return None
+    return cold_start_forecast(profiles, historical_data["quantity"].to_numpy(), forecast_days, last_date)
+
+def _stored_anomaly_dates(db: Session, sku: str, warehouse_id: int, start) -> list:
+    """Days with an open demand anomaly for the SKU's series (0 = all warehouses) since `start`"""
+    start = pd.Timestamp(start)
+    # Indexed columns narrow the rows before the JSON metadata is read;
+    # window_start of a demand anomaly is its sales day
+    rows = db.query(Anomaly.metadata["date"].as_string()).filter(
+        Anomaly.entity_type == "sales",
+        Anomaly.entity_id == (warehouse_id or 0),
+        Anomaly.anomaly_type == "demand_anomaly",
+        Anomaly.resolved.is_(False),
+        Anomaly.window_start >= start.to_pydatetime(),
+        Anomaly.metadata["sku"].as_string() == sku
+    ).all()
+    return [value for (value,) in rows if value and pd.Timestamp(value).normalize() >= start]
+
+def _clean_history(db: Session, sku: str, warehouse_id: int, historical_data, method: str, source: str):
+    """
+    Winsorize or interpolate anomalous days before fitting, flagged by
+    stored demand anomalies, the robust detector, or both. Cached per
+    series until its history changes.
+    """
+    from demand_forecasting.cleaning import clean_demand
+    
+    anomaly_dates = []
+    if source in ("stored", "both") and len(historical_data):
+        anomaly_dates = _stored_anomaly_dates(db, sku, warehouse_id, historical_data["date"].min())
+    return clean_demand(
+        historical_data,
+        anomaly_dates,
+        method=method,
+        detect=source in ("detector", "both"),
+        cache_key=(sku, warehouse_id)
+    )
+
+def _collect_quantiles(predictions) -> dict:
+    """Per-level quantile series (p10/p50/p90) from the per-day predictions"""
+    from demand_forecasting.quantiles import QUANTILE_LEVELS
+    
+    return {
+        name: [p["quantiles"][name] for p in predictions if "quantiles" in p]
+        for name in QUANTILE_LEVELS
+    }
+
 @router.post("/forecast", response_model=DemandForecastResponse)
 def forecast_demand(
     request: DemandForecastRequest,
@@ -26,41 +222,104 @@ def forecast_demand(
 ):
     """
     Generate demand forecast for a specific SKU using ML models.
-    Supports Prophet, LSTM, and XGBoost models.
+    Prophet, LSTM and XGBoost use promotion and customer segment regressors;
+    promotion_dates marks planned promotions within the horizon.
+    Supports Prophet, LSTM, XGBoost and the statistical engine
+    (Holt-Winters, Croston/TSB, seasonal naive with automatic selection).
+    Every model returns p10/p50/p90 quantiles per day.
+    With backtest_folds set, accuracy metrics come from a cached
+    rolling-origin backtest (off by default: each uncached fold is a fit).
+    A stored model that is already trained through the latest sales day is
+    reused instead of fitting a new one.
+    SKUs with less than 30 days of history are forecast from similar
+    products; up to 60 days the two forecasts are blended.
+    With clean_anomalies set, anomalous days are winsorized or interpolated
+    before fitting; stored models and features (fit on raw history) are
+    then bypassed.
     """
     # Get historical sales data
-    query = db.query(SalesHistory).filter(SalesHistory.sku == request.sku)
-    
-    if request.warehouse_id:
-        query = query.filter(SalesHistory.warehouse_id == request.warehouse_id)
+    historical_data = _load_historical_data(db, request.sku, request.warehouse_id)
+    cleaned_dates = None
+    if request.clean_anomalies and len(historical_data) >= 30:
+        historical_data, cleaned_dates = _clean_history(
+            db, request.sku, request.warehouse_id, historical_data,
+            request.clean_anomalies, request.anomaly_source
+        )
     
-    sales_data = query.order_by(SalesHistory.sale_date).all()
+    # Young SKUs are forecast from similar products, blending toward their own model
+    history_days = len(historical_data)
+    cold_start = None
+    if history_days < COLD_START_DAYS:
+        try:
+            cold_start = _cold_start_predictions(
+                db, request.sku, request.warehouse_id, historical_data, request.forecast_days
+            )
+        except Exception as e:
+            # Forecast as if there were no similar products
+            logger.warning("Cold start forecast failed for SKU %s: %s", request.sku, e)
     
-    if len(sales_data) < 30:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Insufficient historical data for SKU {request.sku}. Need at least 30 data points."
+    if history_days < 30:
+        if cold_start is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Insufficient historical data for SKU {request.sku} and no similar products to pool. Need at least 30 days of history."
+            )
+        return DemandForecastResponse(
+            sku=request.sku,
+            warehouse_id=request.warehouse_id,
+            forecast_days=request.forecast_days,
+            model_type=request.model_type,
+            predictions=cold_start,
+            quantiles=_collect_quantiles(cold_start),
+            cold_start={"own_model_weight": 0.0, "history_days": history_days}
         )
     
-    # Prepare data for ML model
-    historical_data = [
-        {"date": sale.sale_date, "quantity": sale.quantity_sold}
-        for sale in sales_data
-    ]
-    
     # Import and use the appropriate model
     try:
-        if request.model_type == "prophet":
-            from demand_forecasting.prophet_model import forecast_with_prophet
-            predictions = forecast_with_prophet(historical_data, request.forecast_days)
-        elif request.model_type == "lstm":
-            from demand_forecasting.lstm_model import forecast_with_lstm
-            predictions = forecast_with_lstm(historical_data, request.forecast_days)
-        elif request.model_type == "xgboost":
-            from demand_forecasting.xgboost_model import forecast_with_xgboost
-            predictions = forecast_with_xgboost(historical_data, request.forecast_days)
-        else:
-            raise HTTPException(status_code=400, detail="Invalid model type")
+        from demand_forecasting.backtesting import backtest_model
+        
+        options = _model_options(
+            request.model_type,
+            request.prophet_config,
+            historical_data,
+            request.forecast_days,
+            request.promotion_dates
+        )
+        stored_model = None
+        if request.prophet_config is None and cleaned_dates is None:
+            stored_model = _fresh_stored_model(
+                request.model_type, request.sku, request.warehouse_id, historical_data
+            )
+        features = None
+        if cleaned_dates is None:
+            features = _stored_features(request.model_type, [request.sku], request.warehouse_id)
+        if features is not None:
+            options["features"] = features
+        predictions = _run_forecast(
+            request.model_type, historical_data, request.forecast_days, options, stored_model
+        )
+        
+        cold_start_info = None
+        if cold_start is not None:
+            from demand_forecasting.cold_start import own_model_weight, blend_predictions
+            
+            weight = own_model_weight(history_days)
+            predictions = blend_predictions(predictions, cold_start, weight)
+            cold_start_info = {"own_model_weight": round(weight, 3), "history_days": history_days}
+        
+        # A failed backtest leaves the forecast without metrics rather than failing it
+        accuracy_metrics = None
+        if request.backtest_folds:
+            try:
+                backtest = backtest_model(
+                    historical_data,
+                    request.model_type,
+                    horizon=request.forecast_days,
+                    n_folds=request.backtest_folds
+                )
+                accuracy_metrics = backtest["metrics"]
+            except Exception as e:
+                logger.warning("Backtest failed for SKU %s: %s", request.sku, e)
         
         return DemandForecastResponse(
             sku=request.sku,
@@ -68,7 +327,10 @@ def forecast_demand(
             forecast_days=request.forecast_days,
             model_type=request.model_type,
             predictions=predictions,
-            accuracy_metrics={"mae": 0.0, "rmse": 0.0}  # Placeholder
+            quantiles=_collect_quantiles(predictions),
+            accuracy_metrics=accuracy_metrics,
+            cold_start=cold_start_info,
+            cleaned_dates=cleaned_dates
         )
     
     except Exception as e:
@@ -77,6 +339,281 @@ def forecast_demand(
             detail=f"Error generating forecast: {str(e)}"
         )
 
+@router.post("/forecast/batch", response_model=BatchForecastResponse)
+def forecast_demand_batch(
+    request: BatchForecastRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Forecast many SKUs with one model.
+    Prophet models are fitted concurrently in a bounded process pool
+    (PROPHET_MAX_WORKERS) and statistical forecasts run as vectorized
+    batches; with INFERENCE_SERVER_ADDRESS set, all SKUs are sent to the
+    inference server at once. SKUs without enough history are reported as
+    errors. clean_anomalies cleans each SKU's history before fitting.
+    Progress (SKUs done, ETA, per-SKU results and errors) is published on
+    /ws as job_progress events tagged with the job_id.
+    """
+    from concurrent.futures import as_completed
+    from demand_forecasting.inference_server import get_inference_client
+    
+    skus = list(dict.fromkeys(request.skus))
+    progress = JobProgress("forecast_batch", len(skus), request.job_id)
+    progress.start()
+    
+    def record(sku, result):
+        results[sku] = result
+        progress.item_done(sku, result=result.get("predictions"), error=result.get("error"))
+    
+    try:
+        results = {}
+        series = {}
+        for sku in skus:
+            historical_data = _load_historical_data(db, sku, request.warehouse_id)
+            if len(historical_data) < 30:
+                record(sku, {"error": "Insufficient historical data. Need at least 30 days of history."})
+            elif request.clean_anomalies:
+                series[sku], _ = _clean_history(
+                    db, sku, request.warehouse_id, historical_data,
+                    request.clean_anomalies, request.anomaly_source
+                )
+            else:
+                series[sku] = historical_data
+    
+        options = _model_options(request.model_type, request.prophet_config)
+        features = None
+        if not request.clean_anomalies:
+            features = _stored_features(request.model_type, list(series), request.warehouse_id)
+    
+        def sku_options(sku):
+            if features is None:
+                return options
+            sku_features = features[features["sku"] == sku]
+            return dict(options, features=sku_features if len(sku_features) else None)
+    
+        client = get_inference_client()
+        if client is not None:
+            # Submit everything at once so the server batches the SKUs together
+            futures = {
+                client.submit(request.model_type, historical_data, request.forecast_days, sku_options(sku)): sku
+                for sku, historical_data in series.items()
+            }
+            for future in as_completed(futures):
+                try:
+                    record(futures[future], future.result())
+                except Exception as e:
+                    record(futures[future], {"error": str(e)})
+        elif request.model_type == "prophet":
+            from demand_forecasting.prophet_model import forecast_many_with_prophet
+            forecast_many_with_prophet(series, request.forecast_days, on_result=record, **options)
+        elif request.model_type == "statistical":
+            from demand_forecasting.statistical_models import forecast_many_with_statistical
+            for sku, result in forecast_many_with_statistical(series, request.forecast_days).items():
+                record(sku, result)
+        else:
+            from demand_forecasting.registry import get_forecaster
+            forecaster = get_forecaster(request.model_type)
+            for sku, historical_data in series.items():
+                try:
+                    record(sku, {"predictions": forecaster(historical_data, request.forecast_days, **sku_options(sku))})
+                except Exception as e:
+                    record(sku, {"error": str(e)})
+    except Exception as e:
+        progress.finish(error=str(e))
+        raise
+    
+    progress.finish()
+    return BatchForecastResponse(
+        job_id=progress.job_id,
+        model_type=request.model_type,
+        forecast_days=request.forecast_days,
+        results=results
+    )
+
+@router.post("/backtest", response_model=BacktestResponse)
+def backtest_demand_models(
+    request: BacktestRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Rolling-origin backtest of one or more models for a SKU.
+    Folds run in parallel worker processes and are cached, so repeated
+    calls only fit folds whose data has changed. Each finished fold is
+    published on /ws as a job_progress event tagged with the job_id.
+    """
+    from demand_forecasting.registry import FORECASTERS
+    from demand_forecasting.backtesting import compare_models, count_folds
+    
+    invalid = [m for m in request.model_types if m not in FORECASTERS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid model type(s): {', '.join(invalid)}")
+    
+    historical_data = _load_historical_data(db, request.sku, request.warehouse_id)
+    
+    if len(historical_data) < 30:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient historical data for SKU {request.sku}. Need at least 30 days of history."
+        )
+    
+    n_folds = count_folds(historical_data, request.horizon, request.n_folds)
+    progress = JobProgress("backtest", len(request.model_types) * n_folds, request.job_id)
+    progress.start()
+    
+    try:
+        comparison = compare_models(
+            historical_data,
+            request.model_types,
+            horizon=request.horizon,
+            n_folds=request.n_folds,
+            on_fold=lambda model_type, fold: progress.item_done(model_type, result=fold)
+        )
+    except Exception as e:
+        progress.finish(error=str(e))
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error running backtest: {str(e)}"
+        )
+    
+    progress.finish()
+    return BacktestResponse(
+        job_id=progress.job_id,
+        sku=request.sku,
+        warehouse_id=request.warehouse_id,
+        horizon=request.horizon,
+        results=comparison["results"],
+        best_model=comparison["best_model"]
+    )
+
+@router.post("/forecast/hierarchy", response_model=HierarchicalForecastResponse)
+def forecast_demand_hierarchy(
+    request: HierarchicalForecastRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Forecast every SKU x warehouse series and reconcile the result so SKU,
+    warehouse, category and total forecasts add up.
+    Uses the statistical engine for all series in one vectorized pass.
+    """
+    from demand_forecasting.reconciliation import LEVELS, forecast_hierarchy
+    
+    invalid = [level for level in request.levels if level not in LEVELS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid level(s): {', '.join(invalid)}")
+    
+    # Today's partial day would bias every series low; history ends yesterday
+    end = datetime.utcnow().date() - timedelta(days=1)
+    start = end - timedelta(days=request.history_days - 1)
+    demand = load_daily_demand_matrix(db, start, end, warehouse_id=request.warehouse_id)
+    
+    if not demand["keys"]:
+        raise HTTPException(status_code=400, detail="No sales history in the requested window")
+    
+    # Category per SKU x warehouse, with a per-SKU fallback for series not stocked in inventory
+    categories = {}
+    category_rows = db.query(Inventory.sku, Inventory.warehouse_id, Inventory.category) \
+        .filter(Inventory.category.isnot(None)).all()
+    for sku, warehouse_id, category in category_rows:
+        categories[(sku, warehouse_id)] = category
+        categories.setdefault(sku, category)
+    
+    try:
+        result = forecast_hierarchy(
+            demand["keys"],
+            categories,
+            demand["matrix"],
+            request.forecast_days,
+            method=request.method
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error reconciling forecasts: {str(e)}"
+        )
+    
+    dates = [(end + timedelta(days=i+1)).isoformat() for i in range(request.forecast_days)]
+    wanted = set(request.levels)
+    
+    series = [
+        {
+            "level": node["level"],
+            "key": list(node["key"]) if isinstance(node["key"], tuple) else node["key"],
+            "forecast": [round(value, 2) for value in forecast]
+        }
+        for node, forecast in zip(result["nodes"], result["forecast"].tolist())
+        if node["level"] in wanted
+    ]
+    
+    return HierarchicalForecastResponse(
+        method=request.method,
+        forecast_days=request.forecast_days,
+        dates=dates,
+        series=series
+    )
+
+def _run_retraining(request: RetrainRequest):
+    from model_training import run_incremental_retraining
+    
+    db = SessionLocal()
+    try:
+        run_incremental_retraining(
+            db,
+            request.skus,
+            request.model_types,
+            warehouse_id=request.warehouse_id,
+            force_full=request.full_refit
+        )
+    finally:
+        db.close()
+
+@router.post("/retrain")
+def retrain_demand_models(
+    request: RetrainRequest,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(require_role(["admin", "manager"]))
+):
+    """
+    Update stored per-SKU models with sales added since they were last trained.
+    Models are warm-started or fine-tuned from their previous state and
+    refit from scratch every MODEL_FULL_REFIT_EVERY updates; full_refit
+    forces a refit now. Runs in the background.
+    """
+    from model_training import TRAINABLE_MODELS
+    
+    invalid = [m for m in request.model_types if m not in TRAINABLE_MODELS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid model type(s): {', '.join(invalid)}")
+    
+    background_tasks.add_task(_run_retraining, request)
+    return {
+        "message": "Model retraining started",
+        "skus": request.skus or "stale",
+        "model_types": request.model_types
+    }
+
+@router.post("/rollup/refresh")
+def refresh_sales_rollup(
+    full: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role(["admin", "manager"]))
+):
+    """Incrementally refresh the daily sales rollup (full=true rebuilds it)"""
+    written = refresh_daily_sales_rollup(db, full=full)
+    return {"message": "Daily sales rollup refreshed", "rows_written": written}
+
+@router.post("/features/refresh")
+def refresh_features(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role(["admin", "manager"]))
+):
+    """Append feature store rows for days closed since the last refresh"""
+    refresh_daily_sales_rollup(db)
+    written = refresh_feature_store(db)
+    return {"message": "Feature store refreshed", "rows_written": written}
+
 @router.get("/historical/{sku}")
 def get_historical_sales(
     sku: str,
@@ -88,26 +625,23 @@ def get_historical_sales(
     """Get historical sales data for a SKU"""
     cutoff_date = datetime.utcnow() - timedelta(days=days)
     
-    query = db.query(SalesHistory).filter(
-        SalesHistory.sku == sku,
-        SalesHistory.sale_date >= cutoff_date
+    sales = load_sales_frame(
+        db, ["date", "quantity", "revenue"],
+        sku=sku, warehouse_id=warehouse_id, since=cutoff_date
     )
     
-    if warehouse_id:
-        query = query.filter(SalesHistory.warehouse_id == warehouse_id)
-    
-    sales = query.order_by(SalesHistory.sale_date).all()
-    
     return {
         "sku": sku,
         "warehouse_id": warehouse_id,
         "data_points": len(sales),
         "sales_history": [
             {
-                "date": sale.sale_date.isoformat(),
-                "quantity": sale.quantity_sold,
-                "revenue": sale.revenue
+                "date": sale_date.isoformat(),
+                "quantity": int(quantity),
+                "revenue": None if pd.isna(revenue) else float(revenue)
             }
-            for sale in sales
+            for sale_date, quantity, revenue in zip(
+                sales["date"], sales["quantity"], sales["revenue"]
+            )
         ]
     }
@@ -1,15 +1,27 @@
 """
-Inventory management router for CRUD operations on warehouse inventory.
+Inventory management router for CRUD operations on warehouse inventory
+and forecast-driven replenishment policies.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from datetime import datetime, timedelta
 from typing import List, Optional
+import numpy as np
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../ml-pipelines'))
 
 from database import get_db
 from models import Inventory, Warehouse, User
-from schemas import InventoryCreate, InventoryUpdate, InventoryResponse
+from schemas import (
+    InventoryCreate, InventoryUpdate, InventoryResponse,
+    ReplenishmentRequest, ReplenishmentResponse
+)
 from auth import get_current_active_user, require_role
+from sales_data import load_daily_demand_matrix
 
 router = APIRouter(prefix="/api/inventory", tags=["Inventory"])
 
@@ -48,7 +60,7 @@ def create_inventory_item(
 def get_inventory(
     warehouse_id: Optional[int] = Query(None),
     sku: Optional[str] = Query(None),
-    low_stock: bool = Query(False, description="Filter items below reorder point"),
+    low_stock: bool = Query(False, description="Filter items at or below their (forecast-driven) reorder point"),
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
@@ -69,6 +81,87 @@ def get_inventory(
     items = query.offset(skip).limit(limit).all()
     return items
 
+@router.post("/replenishment/recompute", response_model=ReplenishmentResponse)
+def recompute_replenishment_policy(
+    request: ReplenishmentRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role(["admin", "manager"]))
+):
+    """
+    Recompute reorder points, safety stock and order quantities for every
+    SKU x warehouse from demand forecasts, lead times and service levels.
+    All items are forecast in one vectorized pass and written back in bulk;
+    items with no sales in the history window are left unchanged.
+    """
+    from inventory_optimization.replenishment import forecast_replenishment_policy
+    
+    stmt = select(
+        Inventory.id, Inventory.sku, Inventory.warehouse_id, Inventory.quantity,
+        Inventory.lead_time_days, Inventory.service_level
+    )
+    if request.warehouse_id:
+        stmt = stmt.where(Inventory.warehouse_id == request.warehouse_id)
+    items = db.execute(stmt).all()
+    
+    if not items:
+        raise HTTPException(status_code=404, detail="No inventory items found")
+    
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=request.history_days - 1)
+    demand = load_daily_demand_matrix(
+        db, start, end,
+        warehouse_id=request.warehouse_id,
+        skus=list({item.sku for item in items})
+    )
+    
+    # Align demand rows with inventory items; items without sales in the window
+    # keep their configured reorder point and safety stock
+    row_of = {key: i for i, key in enumerate(demand["keys"]) if demand["matrix"][i].any()}
+    skipped = len(items)
+    items = [item for item in items if (item.sku, item.warehouse_id) in row_of]
+    skipped -= len(items)
+    if not items:
+        return ReplenishmentResponse(items_updated=0, items_skipped=skipped, below_reorder_point=0, methods={})
+    history = np.stack([demand["matrix"][row_of[(item.sku, item.warehouse_id)]] for item in items])
+    
+    lead_times = np.array([item.lead_time_days or 7 for item in items])
+    service_levels = (
+        request.service_level if request.service_level is not None
+        else np.array([item.service_level or 0.95 for item in items])
+    )
+    
+    policy = forecast_replenishment_policy(
+        history, lead_times,
+        service_level=service_levels,
+        order_cover_days=request.order_cover_days
+    )
+    
+    now = datetime.utcnow()
+    db.execute(
+        update(Inventory),
+        [
+            {
+                "id": item.id,
+                "reorder_point": int(policy["reorder_point"][i]),
+                "safety_stock": int(policy["safety_stock"][i]),
+                "reorder_quantity": int(policy["order_quantity"][i]),
+                "policy_updated_at": now
+            }
+            for i, item in enumerate(items)
+        ]
+    )
+    db.commit()
+    
+    quantities = np.array([item.quantity or 0 for item in items])
+    methods, counts = np.unique(policy["method"].astype(str), return_counts=True)
+    
+    return ReplenishmentResponse(
+        items_updated=len(items),
+        items_skipped=skipped,
+        below_reorder_point=int((quantities <= policy["reorder_point"]).sum()),
+        methods=dict(zip(methods.tolist(), counts.tolist()))
+    )
+
 @router.get("/{item_id}", response_model=InventoryResponse)
 def get_inventory_item(
     item_id: int,
@@ -0,0 +1,536 @@
+"""
+Sales data access for demand forecasting.
+Aggregates SalesHistory to one row per SKU, warehouse and day in SQL,
+maintains the DailySalesRollup table and the forecasting feature store
+incrementally and extracts sales as columnar frames without hydrating ORM
+objects. Days of sales inserted, updated or deleted through a session are
+re-aggregated as soon as it commits; bulk Core inserts are picked up by
+refresh_daily_sales_rollup.
+"""
+
+import asyncio
+import logging
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, delete, func, cast, case, and_, tuple_, event, inspect, Date
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from datetime import datetime, date, timedelta
+from typing import List, Dict, Any, Optional
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../ml-pipelines'))
+
+from database import SessionLocal
+from models import SalesHistory, DailySalesRollup, JobWatermark, Inventory
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_JOB = "daily_sales_rollup"
+
+# Columns available to the columnar extract, keyed by output name
+SALES_COLUMNS = {
+    "date": SalesHistory.sale_date,
+    "sku": SalesHistory.sku,
+    "warehouse_id": SalesHistory.warehouse_id,
+    "quantity": SalesHistory.quantity_sold,
+    "revenue": SalesHistory.revenue,
+    "customer_segment": SalesHistory.customer_segment,
+    "promotion_applied": SalesHistory.promotion_applied,
+}
+
+# Re-scan window behind the watermark to pick up rows whose created_at was
+# assigned before a concurrent transaction committed. Re-aggregation is
+# idempotent, so the overlap only costs a little extra work.
+ROLLUP_OVERLAP = timedelta(minutes=5)
+
+# Rollup keys re-aggregated per statement after a commit
+ROLLUP_KEY_BATCH_SIZE = 5000
+
+# How often closed days are appended to the feature store (and bulk inserts rolled up)
+FEATURE_REFRESH_INTERVAL_MINUTES = int(os.getenv("FEATURE_REFRESH_INTERVAL_MINUTES", "60"))
+
+def load_sales_frame(
+    db: Session,
+    columns: List[str],
+    sku: Optional[str] = None,
+    warehouse_id: Optional[int] = None,
+    since: Optional[datetime] = None
+) -> pd.DataFrame:
+    """
+    Extract raw sales as a DataFrame, selecting only the requested columns.
+
+    Rows come straight from a Core select into column arrays, skipping ORM
+    instance hydration entirely.
+
+    Args:
+        db: Database session
+        columns: Output column names (keys of SALES_COLUMNS)
+        sku: Restrict to one SKU
+        warehouse_id: Restrict to one warehouse
+        since: Only sales on or after this timestamp
+
+    Returns:
+        DataFrame with the requested columns, ordered by sale date
+    """
+    stmt = select(*(SALES_COLUMNS[name].label(name) for name in columns))
+
+    if sku:
+        stmt = stmt.where(SalesHistory.sku == sku)
+    if warehouse_id:
+        stmt = stmt.where(SalesHistory.warehouse_id == warehouse_id)
+    if since:
+        stmt = stmt.where(SalesHistory.sale_date >= since)
+    stmt = stmt.order_by(SalesHistory.sale_date)
+
+    result = db.execute(stmt)
+    return pd.DataFrame.from_records(result.all(), columns=columns)
+
+def load_sales_arrays(db: Session, columns: List[str], **filters) -> Dict[str, np.ndarray]:
+    """Same as load_sales_frame, returned as a dict of NumPy arrays"""
+    frame = load_sales_frame(db, columns, **filters)
+    return {name: frame[name].to_numpy() for name in columns}
+
+def daily_sales_select(
+    sku: Optional[str] = None,
+    warehouse_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+):
+    """
+    Build a GROUP BY (sku, warehouse, day) query over raw SalesHistory.
+
+    Returns:
+        Select yielding sku, warehouse_id, sale_day, quantity, revenue, transactions
+    """
+    sale_day = cast(SalesHistory.sale_date, Date)
+    warehouse = func.coalesce(SalesHistory.warehouse_id, 0)
+
+    stmt = select(
+        SalesHistory.sku,
+        warehouse.label("warehouse_id"),
+        sale_day.label("sale_day"),
+        func.sum(SalesHistory.quantity_sold).label("quantity"),
+        func.coalesce(func.sum(SalesHistory.revenue), 0.0).label("revenue"),
+        func.count(SalesHistory.id).label("transactions")
+    ).group_by(SalesHistory.sku, warehouse, sale_day)
+
+    if sku:
+        stmt = stmt.where(SalesHistory.sku == sku)
+    if warehouse_id:
+        stmt = stmt.where(SalesHistory.warehouse_id == warehouse_id)
+    if start:
+        stmt = stmt.where(SalesHistory.sale_date >= start)
+    if end:
+        stmt = stmt.where(SalesHistory.sale_date < end + timedelta(days=1))
+
+    return stmt
+
+def refresh_daily_sales_rollup(db: Session, full: bool = False) -> int:
+    """
+    Bring DailySalesRollup up to date with SalesHistory.
+
+    Only (sku, warehouse, day) keys touched by rows created since the last
+    watermark are re-aggregated, and they are upserted in one statement.
+
+    Args:
+        db: Database session
+        full: Ignore the watermark and rebuild every key
+
+    Returns:
+        Number of rollup rows written
+    """
+    state = db.get(JobWatermark, ROLLUP_JOB)
+    since = None if full or state is None or state.watermark is None else state.watermark - ROLLUP_OVERLAP
+
+    new_rows = select(func.max(SalesHistory.created_at))
+    if since is not None:
+        new_rows = new_rows.where(SalesHistory.created_at > since)
+    high_water = db.execute(new_rows).scalar()
+
+    if high_water is None:
+        return 0
+
+    sale_day = cast(SalesHistory.sale_date, Date)
+    warehouse = func.coalesce(SalesHistory.warehouse_id, 0)
+
+    touched = select(
+        SalesHistory.sku.label("sku"),
+        warehouse.label("warehouse_id"),
+        sale_day.label("sale_day")
+    ).where(SalesHistory.created_at <= high_water)
+    if since is not None:
+        touched = touched.where(SalesHistory.created_at > since)
+    touched = touched.distinct().subquery()
+
+    aggregated = daily_sales_select().join(
+        touched,
+        and_(
+            SalesHistory.sku == touched.c.sku,
+            warehouse == touched.c.warehouse_id,
+            sale_day == touched.c.sale_day
+        )
+    ).add_columns(func.now().label("updated_at"))
+
+    stmt = pg_insert(DailySalesRollup).from_select(
+        ["sku", "warehouse_id", "sale_day", "quantity", "revenue", "transactions", "updated_at"],
+        aggregated
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_daily_sales_rollup",
+        set_={
+            "quantity": stmt.excluded.quantity,
+            "revenue": stmt.excluded.revenue,
+            "transactions": stmt.excluded.transactions,
+            "updated_at": stmt.excluded.updated_at
+        }
+    )
+    written = db.execute(stmt).rowcount
+
+    if state is None:
+        db.add(JobWatermark(job_name=ROLLUP_JOB, watermark=high_water))
+    else:
+        state.watermark = high_water
+    db.commit()
+
+    return written
+
+def refresh_rollup_keys(db: Session, keys) -> int:
+    """
+    Re-aggregate the given (sku, warehouse_id, day) keys of DailySalesRollup
+    from SalesHistory, ROLLUP_KEY_BATCH_SIZE keys per statement, removing
+    keys left without sales. The caller commits.
+
+    Returns:
+        Number of rollup rows written
+    """
+    keys = list(set(keys))
+    sale_day = cast(SalesHistory.sale_date, Date)
+    warehouse = func.coalesce(SalesHistory.warehouse_id, 0)
+
+    written = 0
+    for i in range(0, len(keys), ROLLUP_KEY_BATCH_SIZE):
+        batch = keys[i:i + ROLLUP_KEY_BATCH_SIZE]
+        rows = db.execute(
+            daily_sales_select().where(tuple_(SalesHistory.sku, warehouse, sale_day).in_(batch))
+        ).all()
+
+        if rows:
+            stmt = pg_insert(DailySalesRollup).values([
+                {**row._mapping, "updated_at": datetime.utcnow()} for row in rows
+            ])
+            stmt = stmt.on_conflict_do_update(
+                constraint="uq_daily_sales_rollup",
+                set_={
+                    "quantity": stmt.excluded.quantity,
+                    "revenue": stmt.excluded.revenue,
+                    "transactions": stmt.excluded.transactions,
+                    "updated_at": stmt.excluded.updated_at
+                }
+            )
+            db.execute(stmt)
+            written += len(rows)
+
+        emptied = set(batch) - {(row.sku, row.warehouse_id, row.sale_day) for row in rows}
+        if emptied:
+            db.execute(delete(DailySalesRollup).where(
+                tuple_(DailySalesRollup.sku, DailySalesRollup.warehouse_id, DailySalesRollup.sale_day).in_(emptied)
+            ))
+
+    return written
+
+def _rollup_key(sku, warehouse_id, sale_date):
+    day = sale_date.date() if isinstance(sale_date, datetime) else sale_date
+    return (sku, warehouse_id or 0, day)
+
+@event.listens_for(SalesHistory, "after_insert")
+@event.listens_for(SalesHistory, "after_delete")
+def _track_sale(mapper, connection, target):
+    """Remember which rollup days the current transaction changed"""
+    Session.object_session(target).info.setdefault("rollup_keys", set()).add(
+        _rollup_key(target.sku, target.warehouse_id, target.sale_date)
+    )
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+# Load the previous value on assignment, even if expired, so after_update
+# can tell which day a sale moved away from
+for _attribute in (SalesHistory.sku, SalesHistory.warehouse_id, SalesHistory.sale_date):
+    event.listen(_attribute, "set", _load_old_value, active_history=True)
+
+@event.listens_for(SalesHistory, "after_update")
+def _track_updated_sale(mapper, connection, target):
+    """Remember both the old and the new rollup day of an updated sale"""
+    keys = Session.object_session(target).info.setdefault("rollup_keys", set())
+    keys.add(_rollup_key(target.sku, target.warehouse_id, target.sale_date))
+
+    state = inspect(target)
+    old = [state.attrs[name].history for name in ("sku", "warehouse_id", "sale_date")]
+    if any(history.deleted for history in old):
+        keys.add(_rollup_key(*(
+            history.deleted[0] if history.deleted else value
+            for history, value in zip(old, (target.sku, target.warehouse_id, target.sale_date))
+        )))
+
+@event.listens_for(Session, "after_commit")
+def _refresh_committed_days(session):
+    """Re-aggregate rollup days changed by the committed transaction"""
+    keys = session.info.pop("rollup_keys", None)
+    if not keys:
+        return
+
+    db = SessionLocal()
+    try:
+        refresh_rollup_keys(db, keys)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning("Daily sales rollup update failed for %d days: %s", len(keys), e)
+    finally:
+        db.close()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rollup_keys(session):
+    session.info.pop("rollup_keys", None)
+
+def refresh_feature_store(db: Session) -> int:
+    """
+    Append feature store rows for every day closed since its last update.
+
+    Known SKUs only need rollup days after the store's last day; SKUs not in
+    the store yet are loaded from their first sale. Today's partial day is
+    never stored.
+
+    Returns:
+        Number of feature rows appended
+    """
+    from demand_forecasting.feature_store import get_feature_store
+
+    store = get_feature_store()
+    through = datetime.utcnow().date() - timedelta(days=1)
+    last = store.last_dates()
+
+    daily_quantity = select(
+        DailySalesRollup.sku,
+        DailySalesRollup.sale_day,
+        func.sum(DailySalesRollup.quantity)
+    ).where(DailySalesRollup.sale_day <= through).group_by(DailySalesRollup.sku, DailySalesRollup.sale_day)
+
+    all_skus = db.execute(select(DailySalesRollup.sku).distinct()).scalars().all()
+    new_skus = [sku for sku in all_skus if sku not in last.index]
+
+    rows = []
+    if len(last):
+        since = last.min().date()
+        rows += db.execute(daily_quantity.where(DailySalesRollup.sale_day > since)).all()
+    if new_skus:
+        rows += db.execute(daily_quantity.where(DailySalesRollup.sku.in_(new_skus))).all()
+
+    daily = pd.DataFrame(rows, columns=["sku", "date", "quantity"])
+    return store.update(daily, through)
+
+def _refresh_in_background():
+    db = SessionLocal()
+    try:
+        refresh_daily_sales_rollup(db)
+        refresh_feature_store(db)
+    except Exception as e:
+        logger.warning("Scheduled sales rollup and feature store refresh failed: %s", e)
+    finally:
+        db.close()
+
+async def run_periodically():
+    """Refresh the rollup and feature store every FEATURE_REFRESH_INTERVAL_MINUTES until cancelled"""
+    while True:
+        await asyncio.sleep(FEATURE_REFRESH_INTERVAL_MINUTES * 60)
+        await asyncio.to_thread(_refresh_in_background)
+
+def load_established_products(db: Session, min_history_days: int) -> pd.DataFrame:
+    """
+    Inventory products (SKU x warehouse) that have sold for at least
+    `min_history_days`, with their category and unit price.
+
+    Returns:
+        DataFrame with sku, warehouse_id, category and unit_price
+    """
+    cutoff = datetime.utcnow().date() - timedelta(days=min_history_days)
+
+    established = select(
+        DailySalesRollup.sku,
+        DailySalesRollup.warehouse_id
+    ).group_by(
+        DailySalesRollup.sku, DailySalesRollup.warehouse_id
+    ).having(func.min(DailySalesRollup.sale_day) <= cutoff).subquery()
+
+    stmt = select(
+        Inventory.sku,
+        Inventory.warehouse_id,
+        Inventory.category,
+        Inventory.unit_price
+    ).join(
+        established,
+        and_(Inventory.sku == established.c.sku, Inventory.warehouse_id == established.c.warehouse_id)
+    )
+
+    return pd.DataFrame(db.execute(stmt).all(), columns=["sku", "warehouse_id", "category", "unit_price"])
+
+def load_daily_covariates(
+    db: Session,
+    sku: str,
+    warehouse_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+) -> pd.DataFrame:
+    """
+    Daily promotion intensity and customer segment mix for a SKU.
+
+    Returns:
+        DataFrame indexed by day with 'promotion' (share of units sold on
+        promotion) and one 'segment_<name>' share column per segment
+    """
+    sale_day = cast(SalesHistory.sale_date, Date)
+    segment = func.coalesce(SalesHistory.customer_segment, "unknown")
+
+    stmt = select(
+        sale_day,
+        segment,
+        func.sum(SalesHistory.quantity_sold),
+        func.sum(case((SalesHistory.promotion_applied.is_(True), SalesHistory.quantity_sold), else_=0))
+    ).where(SalesHistory.sku == sku).group_by(sale_day, segment)
+
+    if warehouse_id:
+        stmt = stmt.where(SalesHistory.warehouse_id == warehouse_id)
+    if start:
+        stmt = stmt.where(SalesHistory.sale_date >= start)
+    if end:
+        stmt = stmt.where(SalesHistory.sale_date < end + timedelta(days=1))
+
+    frame = pd.DataFrame.from_records(
+        db.execute(stmt).all(),
+        columns=["date", "segment", "quantity", "promo_quantity"]
+    )
+    if frame.empty:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name="date"))
+
+    frame["date"] = pd.to_datetime(frame["date"])
+    units = frame.pivot_table(index="date", columns="segment", values="quantity", aggfunc="sum", fill_value=0)
+    day_totals = units.sum(axis=1).replace(0, np.nan)
+
+    covariates = units.div(day_totals, axis=0).fillna(0).add_prefix("segment_")
+    covariates.columns.name = None
+    promo_units = frame.groupby("date")["promo_quantity"].sum()
+    covariates.insert(0, "promotion", (promo_units / day_totals).fillna(0))
+
+    return covariates
+
+def get_daily_demand(
+    db: Session,
+    sku: str,
+    warehouse_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    use_rollup: bool = True,
+    include_covariates: bool = False
+) -> pd.DataFrame:
+    """
+    Daily demand for a SKU, summed across warehouses unless one is given,
+    with missing days between the first sale and `end` filled with zero.
+
+    Args:
+        db: Database session
+        sku: Product SKU
+        warehouse_id: Restrict to one warehouse
+        start: First day to include (defaults to the first sale)
+        end: Last day to include (defaults to the last sale)
+        use_rollup: Read DailySalesRollup instead of aggregating SalesHistory
+        include_covariates: Add promotion and segment mix columns
+
+    Returns:
+        DataFrame with 'date' and 'quantity' columns, one row per consecutive day
+    """
+    if use_rollup:
+        stmt = select(
+            DailySalesRollup.sale_day,
+            func.sum(DailySalesRollup.quantity)
+        ).where(DailySalesRollup.sku == sku)
+        if warehouse_id:
+            stmt = stmt.where(DailySalesRollup.warehouse_id == warehouse_id)
+        if start:
+            stmt = stmt.where(DailySalesRollup.sale_day >= start)
+        if end:
+            stmt = stmt.where(DailySalesRollup.sale_day <= end)
+        stmt = stmt.group_by(DailySalesRollup.sale_day)
+    else:
+        daily = daily_sales_select(sku, warehouse_id, start, end).subquery()
+        stmt = select(daily.c.sale_day, func.sum(daily.c.quantity)).group_by(daily.c.sale_day)
+
+    rows = db.execute(stmt).all()
+    if not rows:
+        return pd.DataFrame({"date": pd.Series(dtype="datetime64[ns]"), "quantity": pd.Series(dtype=int)})
+
+    days, quantities = zip(*rows)
+    totals = pd.Series(np.asarray(quantities, dtype=int), index=pd.to_datetime(days))
+
+    calendar = pd.date_range(start or totals.index.min(), end or totals.index.max(), freq="D")
+    totals = totals.reindex(calendar, fill_value=0)
+
+    demand = pd.DataFrame({"date": totals.index, "quantity": totals.to_numpy()})
+
+    if include_covariates:
+        covariates = load_daily_covariates(db, sku, warehouse_id, start, end)
+        covariates = covariates.reindex(calendar, fill_value=0).reset_index(drop=True)
+        demand = pd.concat([demand, covariates], axis=1)
+
+    return demand
+
+def load_daily_demand_matrix(
+    db: Session,
+    start: date,
+    end: date,
+    warehouse_id: Optional[int] = None,
+    skus: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Zero-filled daily demand for every SKU x warehouse as one matrix.
+
+    Args:
+        db: Database session
+        start: First day of the window
+        end: Last day of the window
+        warehouse_id: Restrict to one warehouse
+        skus: Restrict to these SKUs
+
+    Returns:
+        Dict with 'keys' [(sku, warehouse_id)], 'dates' (DatetimeIndex) and
+        'matrix' of shape (len(keys), len(dates))
+    """
+    stmt = select(
+        DailySalesRollup.sku,
+        DailySalesRollup.warehouse_id,
+        DailySalesRollup.sale_day,
+        DailySalesRollup.quantity
+    ).where(DailySalesRollup.sale_day >= start, DailySalesRollup.sale_day <= end)
+
+    if warehouse_id:
+        stmt = stmt.where(DailySalesRollup.warehouse_id == warehouse_id)
+    if skus:
+        stmt = stmt.where(DailySalesRollup.sku.in_(skus))
+
+    frame = pd.DataFrame.from_records(
+        db.execute(stmt).all(),
+        columns=["sku", "warehouse_id", "sale_day", "quantity"]
+    )
+    dates = pd.date_range(start, end, freq="D")
+
+    if frame.empty:
+        return {"keys": [], "dates": dates, "matrix": np.zeros((0, len(dates)))}
+
+    codes, uniques = pd.MultiIndex.from_frame(frame[["sku", "warehouse_id"]]).factorize()
+    day_offsets = (pd.to_datetime(frame["sale_day"]) - dates[0]).dt.days.to_numpy()
+
+    matrix = np.zeros((len(uniques), len(dates)))
+    np.add.at(matrix, (codes, day_offsets), frame["quantity"].to_numpy(dtype=float))
+
+    return {"keys": list(uniques), "dates": dates, "matrix": matrix}
@@ -4,7 +4,7 @@ Pydantic schemas for request/response validation in Warefy API.
 
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, date
 
 # ============= User Schemas =============
 class UserBase(BaseModel):
@@ -71,6 +71,8 @@ class InventoryBase(BaseModel):
     quantity: int = 0
     reorder_point: int = 10
     unit_price: Optional[float] = None
+    lead_time_days: int = Field(default=7, ge=1, le=365)
+    service_level: float = Field(default=0.95, ge=0.5, lt=1)
 
 class InventoryCreate(InventoryBase):
     warehouse_id: int
@@ -79,16 +81,33 @@ class InventoryUpdate(BaseModel):
     quantity: Optional[int] = None
     reorder_point: Optional[int] = None
     unit_price: Optional[float] = None
+    lead_time_days: Optional[int] = Field(default=None, ge=1, le=365)
+    service_level: Optional[float] = Field(default=None, ge=0.5, lt=1)
 
 class InventoryResponse(InventoryBase):
     id: int
     warehouse_id: int
+    safety_stock: Optional[int] = None
+    reorder_quantity: Optional[int] = None
+    policy_updated_at: Optional[datetime] = None
     last_restocked: Optional[datetime] = None
     updated_at: datetime
     
     class Config:
         from_attributes = True
 
+class ReplenishmentRequest(BaseModel):
+    warehouse_id: Optional[int] = None
+    history_days: int = Field(default=180, ge=30, le=1095)
+    order_cover_days: int = Field(default=14, ge=1, le=180)
+    service_level: Optional[float] = Field(default=None, ge=0.5, lt=1)  # overrides per-item targets
+
+class ReplenishmentResponse(BaseModel):
+    items_updated: int
+    items_skipped: int = 0  # no sales in the history window; policy left unchanged
+    below_reorder_point: int
+    methods: Dict[str, int]  # forecast method -> item count
+
 # ============= Vehicle Schemas =============
 class VehicleBase(BaseModel):
     vehicle_number: str
@@ -145,19 +164,89 @@ class RouteResponse(BaseModel):
         from_attributes = True
 
 # ============= Demand Forecasting Schemas =============
+class ProphetConfig(BaseModel):
+    """Per-request Prophet overrides; unset fields use the global defaults"""
+    daily_seasonality: Optional[bool] = None
+    weekly_seasonality: Optional[bool] = None
+    yearly_seasonality: Optional[bool] = None
+    seasonality_mode: Optional[str] = Field(default=None, pattern="^(additive|multiplicative)$")
+    changepoint_prior_scale: Optional[float] = Field(default=None, gt=0)
+    mcmc_samples: Optional[int] = Field(default=None, ge=0, le=2000)  # 0 = MAP fit
+    uncertainty_samples: Optional[int] = Field(default=None, ge=0, le=2000)
+    interval_width: Optional[float] = Field(default=None, gt=0, lt=1)
+
 class DemandForecastRequest(BaseModel):
     sku: str
     warehouse_id: Optional[int] = None
     forecast_days: int = Field(default=30, ge=1, le=365)
-    model_type: str = Field(default="prophet", pattern="^(prophet|lstm|xgboost)$")
+    model_type: str = Field(default="prophet", pattern="^(prophet|lstm|xgboost|statistical)$")
+    backtest_folds: int = Field(default=0, ge=0, le=12)  # > 0 adds accuracy metrics from a cached backtest
+    prophet_config: Optional[ProphetConfig] = None
+    promotion_dates: Optional[List[date]] = None  # planned promotions within the horizon
+    clean_anomalies: Optional[str] = Field(default=None, pattern="^(winsorize|interpolate)$")  # None keeps raw history
+    anomaly_source: str = Field(default="both", pattern="^(stored|detector|both)$")
 
 class DemandForecastResponse(BaseModel):
     sku: str
     warehouse_id: Optional[int] = None
     forecast_days: int
     model_type: str
-    predictions: List[Dict[str, Any]]  # [{date, predicted_quantity, confidence_interval}]
+    predictions: List[Dict[str, Any]]  # [{date, predicted_quantity, quantiles: {p10, p50, p90}}]
+    quantiles: Dict[str, List[float]] = {}  # p10/p50/p90 -> one value per forecast day
     accuracy_metrics: Optional[Dict[str, float]] = None
+    cold_start: Optional[Dict[str, Any]] = None  # {own_model_weight, history_days} for young SKUs
+    cleaned_dates: Optional[List[str]] = None  # history days replaced by anomaly cleaning
+
+class BatchForecastRequest(BaseModel):
+    skus: List[str] = Field(min_length=1, max_length=1000)
+    warehouse_id: Optional[int] = None
+    forecast_days: int = Field(default=30, ge=1, le=365)
+    model_type: str = Field(default="prophet", pattern="^(prophet|lstm|xgboost|statistical)$")
+    prophet_config: Optional[ProphetConfig] = None
+    clean_anomalies: Optional[str] = Field(default=None, pattern="^(winsorize|interpolate)$")
+    anomaly_source: str = Field(default="both", pattern="^(stored|detector|both)$")
+    job_id: Optional[str] = Field(default=None, max_length=64)  # progress events on /ws carry this id
+
+class BatchForecastResponse(BaseModel):
+    job_id: str
+    model_type: str
+    forecast_days: int
+    results: Dict[str, Dict[str, Any]]  # sku -> {predictions} or {error}
+
+class BacktestRequest(BaseModel):
+    sku: str
+    warehouse_id: Optional[int] = None
+    model_types: List[str] = Field(default=["statistical", "xgboost", "prophet"], min_length=1)
+    horizon: int = Field(default=14, ge=1, le=90)
+    n_folds: int = Field(default=3, ge=1, le=12)
+    job_id: Optional[str] = Field(default=None, max_length=64)  # progress events on /ws carry this id
+
+class BacktestResponse(BaseModel):
+    job_id: str
+    sku: str
+    warehouse_id: Optional[int] = None
+    horizon: int
+    results: Dict[str, Dict[str, Any]]  # model_type -> {folds, metrics}
+    best_model: Optional[str] = None
+
+class RetrainRequest(BaseModel):
+    skus: Optional[List[str]] = None  # None = every SKU with new sales since its last training
+    warehouse_id: Optional[int] = None
+    model_types: List[str] = Field(default=["xgboost"], min_length=1)
+    full_refit: bool = False
+
+class HierarchicalForecastRequest(BaseModel):
+    forecast_days: int = Field(default=30, ge=1, le=365)
+    history_days: int = Field(default=365, ge=30, le=1095)
+    warehouse_id: Optional[int] = None
+    method: str = Field(default="mint_diag", pattern="^(bottom_up|top_down|ols|wls_struct|mint_diag)$")
+    levels: List[str] = ["total", "category", "sku"]  # any of total, category, warehouse, sku, bottom
+
+class HierarchicalForecastResponse(BaseModel):
+    method: str
+    forecast_days: int
+    dates: List[str]
+    series: List[Dict[str, Any]]  # [{level, key, forecast: [...]}]
 
 # ============= Route Optimization Schemas =============
 class RouteOptimizationRequest(BaseModel):
@@ -182,12 +271,42 @@ class AnomalyResponse(BaseModel):
     entity_id: int
     description: str
     detected_at: datetime
+    last_detected_at: Optional[datetime] = None
     resolved: bool
     metadata: Optional[Dict[str, Any]] = None
     
     class Config:
         from_attributes = True
 
+class AnomalyCount(BaseModel):
+    anomaly_type: str
+    severity: Optional[str] = None
+    count: int
+
+class AnomalySummaryResponse(BaseModel):
+    total: int
+    since: datetime
+    by_severity: Dict[str, int]
+    by_type: Dict[str, int]
+    groups: List[AnomalyCount]
+
+class IncidentResponse(BaseModel):
+    id: int
+    warehouse_id: int
+    category: str
+    window_start: datetime
+    severity: Optional[str] = None
+    anomaly_count: int
+    sku_count: int
+    anomaly_types: Optional[Dict[str, int]] = None
+    root_cause: Optional[str] = None
+    first_detected_at: Optional[datetime] = None
+    last_detected_at: Optional[datetime] = None
+    resolved: bool
+    
+    class Config:
+        from_attributes = True
+
 # ============= Maintenance Schemas =============
 class MaintenancePredictionRequest(BaseModel):
     vehicle_id: int
@@ -17,6 +17,7 @@ from models import (
     SalesHistory, Route, Anomaly
 )
 from auth import get_password_hash
+from sales_data import refresh_daily_sales_rollup
 
 def seed_database():
     """Seed the database with sample data"""
@@ -241,6 +242,10 @@ def seed_database():
         
         db.commit()
         
+        # Build the daily rollup the forecasters read from
+        print("Building daily sales rollup...")
+        refresh_daily_sales_rollup(db, full=True)
+        
         print("✅ Database seeded successfully!")
         print("\n📊 Sample Data Summary:")
         print(f"   - Users: {len(users)}")
@@ -0,0 +1,50 @@
+"""
+On-disk store for fitted anomaly detectors.
+Detectors are saved with joblib and kept in memory after the first load,
+so scoring new data skips both the fit and the disk read.
+"""
+
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import joblib
+
+DETECTOR_STORE_DIR = os.getenv(
+    "DETECTOR_STORE_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "detectors")
+)
+
+_cache_lock = threading.Lock()
+_cache: Dict[str, Tuple[float, Any]] = {}
+
+def _path(name: str) -> str:
+    return os.path.join(DETECTOR_STORE_DIR, f"{name}.joblib")
+
+def save_detector(name: str, detector: Any):
+    """Persist a fitted detector, replacing any stored one atomically"""
+    os.makedirs(DETECTOR_STORE_DIR, exist_ok=True)
+    path = _path(name)
+    tmp_path = f"{path}.tmp"
+    joblib.dump(detector, tmp_path, compress=3)
+    os.replace(tmp_path, path)
+
+    with _cache_lock:
+        _cache[name] = (os.path.getmtime(path), detector)
+
+def load_detector(name: str) -> Optional[Any]:
+    """Stored detector, or None; re-read only when the file changes"""
+    path = _path(name)
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+
+    with _cache_lock:
+        cached = _cache.get(name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+    detector = joblib.load(path)
+    with _cache_lock:
+        _cache[name] = (mtime, detector)
+    return detector
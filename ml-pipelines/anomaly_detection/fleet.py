@@ -0,0 +1,193 @@
+"""
+Fleet anomaly detection from vehicle usage, maintenance history and GPS.
+Every check is vectorized over the whole fleet: usage outliers are robust
+z-scores against each vehicle type's peers, GPS jumps are consecutive pings
+implying an impossible speed, and idle vehicles have had no route or GPS
+activity for too long.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Any, Optional
+from datetime import datetime
+
+# Combined robust z-score (over all usage features) that marks a vehicle as an outlier
+USAGE_Z_THRESHOLD = 3.5
+
+# Vehicles of one type needed to compare against the type instead of the whole fleet
+MIN_PEERS = 5
+
+USAGE_FEATURES = ["km_per_hour", "maintenance_cost_per_1000km", "repairs_per_10000km"]
+
+# Implied speed between consecutive pings no road vehicle reaches
+MAX_SPEED_KMH = 200.0
+
+# Shorter moves are GPS noise whatever their implied speed
+MIN_JUMP_KM = 1.0
+
+# Days without route or GPS activity before a vehicle counts as idle
+IDLE_DAYS = 7
+
+EARTH_RADIUS_KM = 6371.0
+
+def _robust_z(values: pd.Series, groups: pd.Series) -> pd.Series:
+    """Deviation from the group median in robust standard deviations"""
+    peers = values.groupby(groups).transform("count")
+    median = values.groupby(groups).transform("median").where(peers >= MIN_PEERS, values.median())
+    deviation = (values - median).abs()
+    mad = deviation.groupby(groups).transform("median").where(peers >= MIN_PEERS, deviation.median())
+    # Floor the scale so a fleet of near-identical vehicles does not flag tiny differences
+    scale = np.maximum(1.4826 * mad, 0.1 * median.abs()).replace(0, np.nan)
+    return (values - median) / scale
+
+def _z_severity(z: float, threshold: float) -> str:
+    if z > 2 * threshold:
+        return "critical"
+    elif z > 1.5 * threshold:
+        return "high"
+    return "medium"
+
+def detect_usage_outliers(vehicles: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Flag vehicles whose usage and maintenance profile is far from their peers.
+
+    Args:
+        vehicles: Columns id, vehicle_type, total_distance, total_hours,
+            maintenance_cost and repair_count
+
+    Returns:
+        List of vehicle_usage anomalies, with the per-feature z-scores
+    """
+    vehicles = vehicles[(vehicles['total_distance'] > 0) & (vehicles['total_hours'] > 0)]
+    if vehicles.empty:
+        return []
+
+    distance = vehicles['total_distance'].astype(float)
+    features = pd.DataFrame({
+        "km_per_hour": distance / vehicles['total_hours'].astype(float),
+        "maintenance_cost_per_1000km": vehicles['maintenance_cost'].fillna(0).astype(float) / distance * 1000,
+        "repairs_per_10000km": vehicles['repair_count'].fillna(0).astype(float) / distance * 10000,
+    }, index=vehicles.index)
+
+    groups = vehicles['vehicle_type'].fillna("unknown")
+    z = pd.DataFrame({name: _robust_z(features[name], groups) for name in USAGE_FEATURES})
+    # Root mean square over features: one extreme or several moderate deviations
+    combined = np.sqrt((z.fillna(0) ** 2).sum(axis=1))
+
+    anomalies = []
+    for index in combined.index[combined > USAGE_Z_THRESHOLD]:
+        vehicle = vehicles.loc[index]
+        row_z = z.loc[index]
+        drivers = [name for name in USAGE_FEATURES if abs(row_z[name]) > USAGE_Z_THRESHOLD / 2]
+        anomalies.append({
+            "vehicle_id": int(vehicle['id']),
+            "vehicle_type": vehicle['vehicle_type'],
+            **{name: round(float(features.at[index, name]), 2) for name in USAGE_FEATURES},
+            "z_scores": {name: round(float(row_z[name]), 2) for name in USAGE_FEATURES if pd.notna(row_z[name])},
+            "outlying_features": drivers,
+            "score": round(float(combined[index]), 2),
+            "severity": _z_severity(float(combined[index]), USAGE_Z_THRESHOLD),
+            "type": "vehicle_usage"
+        })
+
+    return anomalies
+
+def _haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=float)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+def detect_gps_jumps(pings: pd.DataFrame, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Flag consecutive GPS pings of one driver that imply an impossible speed.
+
+    Args:
+        pings: Columns id, driver_id, vehicle_id, latitude, longitude and
+            recorded_at
+        since: Only report jumps ending after this time; earlier pings
+            serve as each driver's previous position
+
+    Returns:
+        List of gps_jump anomalies
+    """
+    if len(pings) < 2:
+        return []
+
+    pings = pings.sort_values(['driver_id', 'recorded_at'])
+    previous = pings.groupby('driver_id')[['latitude', 'longitude', 'recorded_at']].shift()
+    distance = _haversine_km(previous['latitude'], previous['longitude'], pings['latitude'], pings['longitude'])
+    hours = (pings['recorded_at'] - previous['recorded_at']).dt.total_seconds().to_numpy() / 3600
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speed = np.where(hours > 0, distance / hours, np.inf)
+    jump = (distance >= MIN_JUMP_KM) & (speed > MAX_SPEED_KMH)
+    if since is not None:
+        jump &= (pings['recorded_at'] > since).to_numpy()
+
+    anomalies = []
+    for i in np.flatnonzero(jump):
+        ping = pings.iloc[i]
+        if speed[i] > 4 * MAX_SPEED_KMH:
+            severity = "critical"
+        elif speed[i] > 2 * MAX_SPEED_KMH:
+            severity = "high"
+        else:
+            severity = "medium"
+
+        anomalies.append({
+            "ping_id": int(ping['id']),
+            "driver_id": int(ping['driver_id']),
+            "vehicle_id": None if pd.isna(ping['vehicle_id']) else int(ping['vehicle_id']),
+            "from": {"lat": float(previous['latitude'].iloc[i]), "lon": float(previous['longitude'].iloc[i])},
+            "to": {"lat": float(ping['latitude']), "lon": float(ping['longitude'])},
+            "distance_km": round(float(distance[i]), 2),
+            "elapsed_seconds": round(float(hours[i] * 3600), 1),
+            "implied_speed_kmh": None if np.isinf(speed[i]) else round(float(speed[i]), 1),
+            "recorded_at": ping['recorded_at'].isoformat(),
+            "severity": severity,
+            "type": "gps_jump"
+        })
+
+    return anomalies
+
+def detect_idle_vehicles(vehicles: pd.DataFrame, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Flag vehicles in service with no route or GPS activity for IDLE_DAYS.
+
+    A vehicle marked in transit without activity is likely stuck or not
+    reporting, and is rated higher than an available vehicle left unused.
+
+    Args:
+        vehicles: Columns id, status and last_activity (latest route start
+            or completion, GPS ping or, failing those, creation time)
+
+    Returns:
+        List of idle_vehicle anomalies
+    """
+    now = now or datetime.utcnow()
+    active = vehicles[vehicles['status'].isin(["available", "in_transit"]) & vehicles['last_activity'].notna()]
+    if active.empty:
+        return []
+
+    idle_days = (now - active['last_activity']).dt.total_seconds().to_numpy() / 86400
+
+    anomalies = []
+    for i in np.flatnonzero(idle_days >= IDLE_DAYS):
+        vehicle = active.iloc[i]
+        if vehicle['status'] == "in_transit":
+            severity = "high"
+        elif idle_days[i] >= 4 * IDLE_DAYS:
+            severity = "medium"
+        else:
+            severity = "low"
+
+        anomalies.append({
+            "vehicle_id": int(vehicle['id']),
+            "status": vehicle['status'],
+            "last_activity": vehicle['last_activity'].isoformat(),
+            "idle_days": round(float(idle_days[i]), 1),
+            "severity": severity,
+            "type": "idle_vehicle"
+        })
+
+    return anomalies
@@ -6,16 +6,33 @@ import numpy as np
 import pandas as pd
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 
-def detect_demand_anomalies(sales_data: List[Dict[str, Any]], contamination: float = 0.1) -> List[Dict[str, Any]]:
+def _severity(score: float) -> str:
+    """Severity bucket for an Isolation Forest score (lower is more anomalous)"""
+    if score < -0.5:
+        return "critical"
+    elif score < -0.3:
+        return "high"
+    elif score < -0.1:
+        return "medium"
+    return "low"
+
+def detect_demand_anomalies(
+    sales_data: List[Dict[str, Any]],
+    contamination: float = 0.1,
+    features: Optional[pd.DataFrame] = None
+) -> List[Dict[str, Any]]:
     """
     Detect anomalies in demand patterns using Isolation Forest.
     
     Args:
         sales_data: Historical sales data with date and quantity
         contamination: Expected proportion of anomalies (0.1 = 10%)
+        features: Stored daily rows from the feature store; when given,
+            sales_data must be daily and its rolling statistics are read
+            from here instead of recomputed
     
     Returns:
         List of detected anomalies with details
@@ -34,8 +51,20 @@ def detect_demand_anomalies(sales_data: List[Dict[str, Any]], contamination: flo
     df['month'] = df['date'].dt.month
     
     # Rolling statistics
-    df['rolling_mean_7'] = df['quantity'].rolling(window=7, min_periods=1).mean()
-    df['rolling_std_7'] = df['quantity'].rolling(window=7, min_periods=1).std()
+    df = df.reset_index(drop=True)
+    rolling_mean = df['quantity'].rolling(window=7, min_periods=1).mean()
+    rolling_std = df['quantity'].rolling(window=7, min_periods=1).std()
+    if features is not None:
+        stored = features[['date', 'rolling_mean_7', 'rolling_std_7']].copy()
+        stored['date'] = pd.to_datetime(stored['date'])
+        df = df.merge(stored, on='date', how='left')
+        # Days before a full window or not yet in the store (always today) are computed here
+        df['rolling_mean_7'] = df['rolling_mean_7'].fillna(rolling_mean)
+        df['rolling_std_7'] = df['rolling_std_7'].fillna(rolling_std)
+    else:
+        df['rolling_mean_7'] = rolling_mean
+        df['rolling_std_7'] = rolling_std
+    df['rolling_std_7'] = df['rolling_std_7'].fillna(0)
     
     # Prepare features for anomaly detection
     feature_cols = ['quantity', 'day_of_week', 'rolling_mean_7', 'rolling_std_7']
@@ -60,16 +89,7 @@ def detect_demand_anomalies(sales_data: List[Dict[str, Any]], contamination: flo
     for idx, (pred, score) in enumerate(zip(predictions, anomaly_scores)):
         if pred == -1:  # Anomaly detected
             row = df.iloc[idx]
-            
-            # Determine severity based on score
-            if score < -0.5:
-                severity = "critical"
-            elif score < -0.3:
-                severity = "high"
-            elif score < -0.1:
-                severity = "medium"
-            else:
-                severity = "low"
+            severity = _severity(score)
             
             anomalies.append({
                 "date": row['date'].isoformat(),
@@ -82,16 +102,285 @@ def detect_demand_anomalies(sales_data: List[Dict[str, Any]], contamination: flo
     
     return anomalies
 
-def detect_delivery_delays(routes_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def _grouped_features(
+    matrix: np.ndarray,
+    dates: pd.DatetimeIndex,
+    series_stats: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    started: Optional[np.ndarray] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Per-series normalized demand features for every active (series, day).
+    
+    Args:
+        matrix: Zero-filled daily demand (n_series, n_days); days before a
+            series' first sale in the window are skipped
+        dates: Day of each column
+        series_stats: (mean, scale) per series; computed from the window
+            where NaN or not given
+        started: Per series, whether it had sold before the window, so
+            every day is scored including leading zeros
+    
+    Returns:
+        Dict with feature matrix 'X', the 'day' and 'series' index of each
+        row, the raw 'quantity', 'rolling_mean', 'rolling_std' (days x
+        series) and the 'mean' and 'scale' used
+    """
+    active = np.cumsum(matrix > 0, axis=1) > 0
+    if started is not None:
+        active |= np.asarray(started, dtype=bool)[:, None]
+    wide = pd.DataFrame(np.where(active, matrix, np.nan).T, index=dates)
+    
+    rolling_mean = wide.rolling(window=7, min_periods=1).mean().to_numpy()
+    rolling_std = np.nan_to_num(wide.rolling(window=7, min_periods=1).std().to_numpy())
+    quantity = wide.to_numpy()
+    
+    valid = ~np.isnan(quantity)
+    counts = valid.sum(axis=0)
+    totals = np.nansum(quantity, axis=0)
+    window_mean = totals / np.maximum(counts, 1)
+    window_var = np.nansum((quantity - window_mean) ** 2, axis=0) / np.maximum(counts, 1)
+    window_scale = np.maximum(np.sqrt(window_var), 1.0)
+    
+    if series_stats is None:
+        mean, scale = window_mean, window_scale
+    else:
+        mean = np.where(np.isnan(series_stats[0]), window_mean, series_stats[0])
+        scale = np.where(np.isnan(series_stats[1]), window_scale, series_stats[1])
+    
+    day_idx, series_idx = np.nonzero(valid)
+    X = np.column_stack([
+        (quantity[valid] - mean[series_idx]) / scale[series_idx],
+        dates.dayofweek.to_numpy()[day_idx],
+        (rolling_mean[valid] - mean[series_idx]) / scale[series_idx],
+        rolling_std[valid] / scale[series_idx],
+    ])
+    
+    return {
+        "X": X, "day": day_idx, "series": series_idx, "quantity": quantity,
+        "rolling_mean": rolling_mean, "rolling_std": rolling_std,
+        "mean": mean, "scale": scale
+    }
+
+class GroupedDemandDetector:
+    """
+    Isolation Forest over per-series normalized demand features.
+    
+    Each series' quantities and rolling statistics are normalized by its
+    own mean and spread, so one forest scores a whole catalog without
+    high-volume SKUs dominating. A fitted detector keeps those per-series
+    statistics and its score threshold, so it can be persisted and used to
+    score new days without refitting.
+    """
+    
+    def __init__(self, contamination: float = 0.1):
+        self.contamination = contamination
+        self.scaler = None
+        self.forest = None
+        self.threshold = None
+        self.series_stats: Dict[Tuple[str, int], Tuple[float, float]] = {}
+        self.fitted_through = None
+        self.fitted_at = None
+    
+    def fit(
+        self,
+        matrix: np.ndarray,
+        dates: pd.DatetimeIndex,
+        keys: List[Tuple[str, int]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Fit on a demand window and return the anomalies found in it.
+        
+        Args:
+            matrix: Zero-filled daily demand (n_series, n_days)
+            dates: Day of each column
+            keys: (sku, warehouse_id) of each row
+        
+        Returns:
+            List of detected anomalies with sku and warehouse_id
+        """
+        matrix, keys = self._active(matrix, keys)
+        if not keys:
+            return []
+        
+        features = _grouped_features(matrix, dates)
+        if len(features["X"]) < 30:
+            return []
+        
+        self.scaler = StandardScaler().fit(features["X"])
+        X_scaled = self.scaler.transform(features["X"])
+        
+        self.forest = IsolationForest(
+            contamination="auto",
+            random_state=42,
+            n_estimators=100,
+            n_jobs=-1
+        ).fit(X_scaled)
+        
+        # Score once and apply the contamination quantile here; fitting with a
+        # numeric contamination would score every row a second time
+        scores = self.forest.score_samples(X_scaled)
+        self.threshold = float(np.percentile(scores, 100.0 * self.contamination))
+        
+        self.series_stats = {
+            tuple(key): (float(m), float(sc))
+            for key, m, sc in zip(keys, features["mean"], features["scale"])
+        }
+        self.fitted_through = dates[-1].date()
+        self.fitted_at = datetime.utcnow()
+        
+        return self._anomalies(features, scores, dates, keys)
+    
+    def score(
+        self,
+        matrix: np.ndarray,
+        dates: pd.DatetimeIndex,
+        keys: List[Tuple[str, int]],
+        start: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Score days against the fitted detector without refitting.
+        
+        Args:
+            matrix: Zero-filled daily demand (n_series, n_days), including
+                the 6 days before `start` for the rolling statistics
+            dates: Day of each column
+            keys: (sku, warehouse_id) of each row; series unseen at fit time
+                are normalized by their own window statistics, while series
+                seen at fit time are scored even if they sold nothing since
+            start: Only report days on or after this one
+        
+        Returns:
+            List of detected anomalies with sku and warehouse_id
+        """
+        if self.forest is None:
+            raise ValueError("Detector has not been fitted")
+        
+        matrix, keys = self._active(matrix, keys, known=self.series_stats)
+        if not keys:
+            return []
+        
+        stats = np.array([self.series_stats.get(tuple(key), (np.nan, np.nan)) for key in keys])
+        known = np.array([tuple(key) in self.series_stats for key in keys])
+        features = _grouped_features(matrix, dates, (stats[:, 0], stats[:, 1]), started=known)
+        
+        rows = np.ones(len(features["X"]), dtype=bool)
+        if start is not None:
+            rows = dates[features["day"]] >= pd.Timestamp(start)
+        if not rows.any():
+            return []
+        
+        scores = np.full(len(rows), np.inf)
+        scores[rows] = self.forest.score_samples(self.scaler.transform(features["X"][rows]))
+        return self._anomalies(features, scores, dates, keys)
+    
+    @staticmethod
+    def _active(matrix: np.ndarray, keys: List[Tuple[str, int]], known=()):
+        """Series with a sale in the window or, when scoring, seen at fit time"""
+        matrix = np.asarray(matrix, dtype=float)
+        active = (matrix > 0).any(axis=1) if matrix.size else np.zeros(len(keys), dtype=bool)
+        active = active | np.array([tuple(key) in known for key in keys], dtype=bool)
+        return matrix[active], [key for key, keep in zip(keys, active) if keep]
+    
+    def _anomalies(self, features, scores, dates, keys) -> List[Dict[str, Any]]:
+        anomalies = []
+        for i in np.flatnonzero(scores < self.threshold):
+            day, series = features["day"][i], features["series"][i]
+            sku, warehouse_id = keys[series]
+            value = features["quantity"][day, series]
+            mean_7 = features["rolling_mean"][day, series]
+            std_7 = features["rolling_std"][day, series]
+            score = float(scores[i])
+            
+            anomalies.append({
+                "sku": sku,
+                "warehouse_id": int(warehouse_id),
+                "date": dates[day].isoformat(),
+                "quantity": int(value),
+                "expected_range": f"{int(mean_7 - 2*std_7)} - {int(mean_7 + 2*std_7)}",
+                "anomaly_score": score,
+                "severity": _severity(score),
+                "type": "demand_spike" if value > mean_7 else "demand_drop"
+            })
+        return anomalies
+
+def detect_grouped_demand_anomalies(
+    matrix: np.ndarray,
+    dates: pd.DatetimeIndex,
+    keys: List[Tuple[str, int]],
+    contamination: float = 0.1
+) -> List[Dict[str, Any]]:
+    """
+    Detect demand anomalies across many SKU x warehouse series at once
+    with a freshly fitted GroupedDemandDetector.
+    
+    Args:
+        matrix: Zero-filled daily demand (n_series, n_days)
+        dates: Day of each column
+        keys: (sku, warehouse_id) of each row
+        contamination: Expected proportion of anomalies (0.1 = 10%)
+    
+    Returns:
+        List of detected anomalies with sku and warehouse_id
+    """
+    return GroupedDemandDetector(contamination).fit(matrix, dates, keys)
+
+# Delay threshold in robust deviations of the log duration ratio
+DELAY_Z_THRESHOLD = 3.0
+
+# Routes of history a driver or vehicle needs to weigh as much as the fleet baseline
+BASELINE_PRIOR_ROUTES = 5
+
+def delivery_delay_baselines(history: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Typical overrun per driver and per vehicle from completed routes.
+    
+    Overrun is the log of actual over estimated duration; each driver's and
+    vehicle's median is shrunk toward the fleet median by their route count.
+    
+    Args:
+        history: Columns driver_id, vehicle_id, estimated_duration and
+            actual_duration
+    
+    Returns:
+        Dict with fleet 'median' and robust 'scale', plus 'driver' and
+        'vehicle' Series of shrunk medians
+    """
+    history = history[(history['estimated_duration'] > 0) & (history['actual_duration'] > 0)]
+    if history.empty:
+        return {"median": 0.0, "scale": 0.1, "driver": pd.Series(dtype=float), "vehicle": pd.Series(dtype=float)}
+    
+    log_ratio = np.log(history['actual_duration'] / history['estimated_duration'])
+    median = float(log_ratio.median())
+    scale = max(float(1.4826 * (log_ratio - median).abs().median()), 0.05)
+    
+    def shrunk(column):
+        grouped = log_ratio.groupby(history[column])
+        n = grouped.size()
+        return (n * grouped.median() + BASELINE_PRIOR_ROUTES * median) / (n + BASELINE_PRIOR_ROUTES)
+    
+    return {"median": median, "scale": scale, "driver": shrunk('driver_id'), "vehicle": shrunk('vehicle_id')}
+
+def detect_delivery_delays(
+    routes_data: List[Dict[str, Any]],
+    baselines: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
     """
     Detect anomalies in delivery times.
     
     Args:
         routes_data: Route completion data with estimated and actual durations
+            (and driver_id/vehicle_id when baselines are given)
+        baselines: delivery_delay_baselines result; when given a route is
+            delayed if its overrun exceeds its driver's and vehicle's usual
+            overrun by DELAY_Z_THRESHOLD robust deviations, instead of the
+            flat 1.5x rule
     
     Returns:
         List of delivery delay anomalies
     """
+    if baselines is not None:
+        return _detect_delays_against_baselines(pd.DataFrame(routes_data), baselines)
+    
     anomalies = []
     
     for route in routes_data:
@@ -119,6 +408,85 @@ def detect_delivery_delays(routes_data: List[Dict[str, Any]]) -> List[Dict[str,
     
     return anomalies
 
+def _detect_delays_against_baselines(routes: pd.DataFrame, baselines: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if routes.empty:
+        return []
+    routes = routes[(routes['estimated_duration'] > 0) & (routes['actual_duration'] > 0)]
+    if routes.empty:
+        return []
+    
+    median = baselines["median"]
+    driver = routes['driver_id'].map(baselines["driver"]).fillna(median).to_numpy()
+    vehicle = routes['vehicle_id'].map(baselines["vehicle"]).fillna(median).to_numpy()
+    expected = (driver + vehicle) / 2
+    
+    estimated = routes['estimated_duration'].to_numpy(dtype=float)
+    actual = routes['actual_duration'].to_numpy(dtype=float)
+    z = (np.log(actual / estimated) - expected) / baselines["scale"]
+    
+    anomalies = []
+    for i in np.flatnonzero((z > DELAY_Z_THRESHOLD) & (actual > estimated)):
+        route = routes.iloc[i]
+        expected_duration = estimated[i] * np.exp(expected[i])
+        
+        if z[i] > 2 * DELAY_Z_THRESHOLD:
+            severity = "critical"
+        elif z[i] > 1.5 * DELAY_Z_THRESHOLD:
+            severity = "high"
+        else:
+            severity = "medium"
+        
+        anomalies.append({
+            "route_id": int(route['id']),
+            "driver_id": None if pd.isna(route['driver_id']) else int(route['driver_id']),
+            "vehicle_id": None if pd.isna(route['vehicle_id']) else int(route['vehicle_id']),
+            "estimated_duration": round(float(estimated[i]), 1),
+            "expected_duration": round(float(expected_duration), 1),
+            "actual_duration": round(float(actual[i]), 1),
+            "delay_percentage": round(float((actual[i] - estimated[i]) / estimated[i] * 100), 2),
+            "excess_over_baseline_percentage": round(float((actual[i] - expected_duration) / expected_duration * 100), 2),
+            "z_score": round(float(z[i]), 2),
+            "severity": severity,
+            "type": "delivery_delay"
+        })
+    
+    return anomalies
+
+def inventory_anomaly(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Stockout or low-stock finding for one inventory item, or None.
+    The same rule the inventory endpoint evaluates in SQL.
+    """
+    quantity = item.get('quantity', 0)
+    reorder_point = item.get('reorder_point', 10)
+    
+    # Stockout detection
+    if quantity == 0:
+        return {
+            "sku": item.get('sku'),
+            "product_name": item.get('product_name'),
+            "warehouse_id": item.get('warehouse_id'),
+            "quantity": quantity,
+            "severity": "critical",
+            "type": "stockout",
+            "description": "Product is completely out of stock"
+        }
+    
+    # Low stock warning
+    if quantity <= reorder_point:
+        return {
+            "sku": item.get('sku'),
+            "product_name": item.get('product_name'),
+            "warehouse_id": item.get('warehouse_id'),
+            "quantity": quantity,
+            "reorder_point": reorder_point,
+            "severity": "high",
+            "type": "low_stock",
+            "description": f"Stock level ({quantity}) below reorder point ({reorder_point})"
+        }
+    
+    return None
+
 def detect_inventory_anomalies(inventory_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Detect anomalies in inventory levels (stockouts, overstocking).
@@ -130,34 +498,8 @@ def detect_inventory_anomalies(inventory_data: List[Dict[str, Any]]) -> List[Dic
         List of inventory anomalies
     """
     anomalies = []
-    
     for item in inventory_data:
-        quantity = item.get('quantity', 0)
-        reorder_point = item.get('reorder_point', 10)
-        
-        # Stockout detection
-        if quantity == 0:
-            anomalies.append({
-                "sku": item.get('sku'),
-                "product_name": item.get('product_name'),
-                "warehouse_id": item.get('warehouse_id'),
-                "quantity": quantity,
-                "severity": "critical",
-                "type": "stockout",
-                "description": "Product is completely out of stock"
-            })
-        
-        # Low stock warning
-        elif quantity <= reorder_point:
-            anomalies.append({
-                "sku": item.get('sku'),
-                "product_name": item.get('product_name'),
-                "warehouse_id": item.get('warehouse_id'),
-                "quantity": quantity,
-                "reorder_point": reorder_point,
-                "severity": "high",
-                "type": "low_stock",
-                "description": f"Stock level ({quantity}) below reorder point ({reorder_point})"
-            })
-    
+        anomaly = inventory_anomaly(item)
+        if anomaly is not None:
+            anomalies.append(anomaly)
     return anomalies
@@ -0,0 +1,239 @@
+"""
+Streaming anomaly detection on sale and inventory events.
+Each series keeps O(1) state (an exponentially weighted mean and variance),
+so events are scored as they arrive instead of re-reading history:
+intraday demand is checked against the EWMA forecast on every sale, closed
+days (including days without any sale) are checked for drops, and inventory changes are checked for stockout
+and low-stock transitions and for unusually large adjustments.
+"""
+
+import os
+import math
+import threading
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+import numpy as np
+
+EWMA_ALPHA = float(os.getenv("STREAM_EWMA_ALPHA", "0.1"))
+
+# Alert when an observation is this many standard deviations from the EWMA
+Z_THRESHOLD = float(os.getenv("STREAM_Z_THRESHOLD", "4.0"))
+
+# Observations folded into a series before it may alert
+MIN_OBSERVATIONS = 14
+
+# Longest run of zero-demand days folded in one step after a quiet period
+MAX_GAP_DAYS = 365
+
+def _severity(z: float) -> str:
+    z = abs(z)
+    if z > 2 * Z_THRESHOLD:
+        return "critical"
+    elif z > 1.5 * Z_THRESHOLD:
+        return "high"
+    return "medium"
+
+class EWMAState:
+    """Exponentially weighted mean and variance of one series"""
+
+    __slots__ = ("mean", "var", "n")
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.n = 0
+
+    def update(self, x: float, alpha: float = EWMA_ALPHA):
+        x = float(x)
+        if self.n == 0:
+            self.mean = x
+        else:
+            diff = x - self.mean
+            increment = alpha * diff
+            self.mean += increment
+            self.var = (1 - alpha) * (self.var + diff * increment)
+        self.n += 1
+
+    def z_score(self, x: float) -> float:
+        """Deviation in standard deviations, floored at the Poisson spread of the mean"""
+        std = max(math.sqrt(self.var), math.sqrt(max(self.mean, 0.0)), 1.0)
+        return (x - self.mean) / std
+
+class _DemandSeries:
+    __slots__ = ("ewma", "day", "day_total", "alerted")
+
+    def __init__(self, day: date):
+        self.ewma = EWMAState()
+        self.day = day
+        self.day_total = 0.0
+        self.alerted = False
+
+class DemandStream:
+    """
+    Streaming demand anomaly detector over (sku, warehouse_id) series.
+
+    Sales for the current day are accumulated; a spike alert fires, at most
+    once per series and day, as soon as the running total exceeds the EWMA
+    forecast by Z_THRESHOLD deviations. When a day closes its total and
+    any zero days that follow are each scored and folded into the EWMA, and
+    a drop alert fires for a day that fell as far below. Days close on the
+    next sale of the series or on close_idle, whichever comes first.
+    """
+
+    def __init__(self, seed: Optional[Callable[[Tuple[str, int], date], Optional[np.ndarray]]] = None):
+        """
+        Args:
+            seed: Called with (key, day) the first time a series is seen;
+                returns its daily demand for the days before `day` (oldest
+                first) to warm up the state, or None
+        """
+        self.seed = seed
+        self.series: Dict[Tuple[str, int], _DemandSeries] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, key: Tuple[str, int], day: date) -> _DemandSeries:
+        state = _DemandSeries(day)
+        history = self.seed(key, day) if self.seed is not None else None
+        if history is not None:
+            for value in np.asarray(history, dtype=float):
+                state.ewma.update(value)
+        self.series[key] = state
+        return state
+
+    def _close_day(self, key: Tuple[str, int], state: _DemandSeries, day: date, total: float) -> List[Dict[str, Any]]:
+        """Score one finished day for a drop and fold it into the EWMA"""
+        anomalies = []
+        if state.ewma.n >= MIN_OBSERVATIONS:
+            z = state.ewma.z_score(total)
+            if z < -Z_THRESHOLD:
+                anomalies.append(self._anomaly(key, day, total, state.ewma.mean, z, "demand_drop"))
+        state.ewma.update(total)
+        return anomalies
+
+    def _close_days(self, key: Tuple[str, int], state: _DemandSeries, day: date) -> List[Dict[str, Any]]:
+        """Close the open day and the zero days up to `day`, and move the series to `day`"""
+        anomalies = self._close_day(key, state, state.day, state.day_total)
+
+        gap = (day - state.day).days - 1
+        # Only the most recent MAX_GAP_DAYS of a long quiet period are scored
+        for offset in range(max(gap - MAX_GAP_DAYS, 0) + 1, gap + 1):
+            anomalies.extend(self._close_day(key, state, state.day + timedelta(days=offset), 0.0))
+
+        state.day, state.day_total, state.alerted = day, 0.0, False
+        return anomalies
+
+    def close_idle(self, day: date) -> List[Dict[str, Any]]:
+        """
+        Close the days before `day` of every series that has not sold since,
+        so a SKU that stops selling raises its drop without waiting for a sale.
+
+        Returns:
+            Anomalies raised by the closed days
+        """
+        anomalies = []
+        with self._lock:
+            for key, state in self.series.items():
+                if state.day < day:
+                    anomalies.extend(self._close_days(key, state, day))
+        return anomalies
+
+    @staticmethod
+    def _anomaly(key, day, quantity, expected, z, anomaly_type) -> Dict[str, Any]:
+        sku, warehouse_id = key
+        return {
+            "sku": sku,
+            "warehouse_id": warehouse_id,
+            "date": day.isoformat(),
+            "quantity": int(quantity),
+            "expected": round(float(expected), 2),
+            "z_score": round(float(z), 2),
+            "severity": _severity(z),
+            "type": anomaly_type
+        }
+
+    def observe(self, sku: str, warehouse_id: int, sale_date: datetime, quantity: float) -> List[Dict[str, Any]]:
+        """
+        Score one sale.
+
+        Returns:
+            Anomalies raised by this event (usually none)
+        """
+        key = (sku, warehouse_id)
+        day = sale_date.date() if isinstance(sale_date, datetime) else sale_date
+
+        with self._lock:
+            state = self.series.get(key) or self._start(key, day)
+            anomalies = []
+            if day > state.day:
+                anomalies.extend(self._close_days(key, state, day))
+            elif day < state.day:
+                # Late events for closed days are already folded in as part of the EWMA
+                return anomalies
+
+            state.day_total += quantity
+            if not state.alerted and state.ewma.n >= MIN_OBSERVATIONS:
+                z = state.ewma.z_score(state.day_total)
+                if z > Z_THRESHOLD:
+                    state.alerted = True
+                    anomalies.append(self._anomaly(key, day, state.day_total, state.ewma.mean, z, "demand_spike"))
+            return anomalies
+
+class InventoryStream:
+    """
+    Streaming inventory anomaly detector over inventory rows.
+
+    Flags transitions into stockout and below the reorder point, and stock
+    adjustments whose size is far outside the row's usual changes.
+    """
+
+    def __init__(self):
+        self.changes: Dict[int, EWMAState] = {}
+        self._lock = threading.Lock()
+
+    def observe(
+        self,
+        item_id: int,
+        sku: str,
+        warehouse_id: int,
+        old_quantity: Optional[int],
+        new_quantity: int,
+        reorder_point: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Score one inventory quantity change.
+
+        Returns:
+            Anomalies raised by this event (usually none)
+        """
+        base = {"sku": sku, "warehouse_id": warehouse_id, "inventory_id": item_id, "quantity": new_quantity}
+        anomalies = []
+
+        if new_quantity == 0 and old_quantity != 0:
+            anomalies.append(dict(
+                base, severity="critical", type="stockout",
+                description="Product is completely out of stock"
+            ))
+        elif new_quantity <= reorder_point and (old_quantity is None or old_quantity > reorder_point):
+            anomalies.append(dict(
+                base, reorder_point=reorder_point, severity="high", type="low_stock",
+                description=f"Stock level ({new_quantity}) below reorder point ({reorder_point})"
+            ))
+
+        if old_quantity is None:
+            return anomalies
+
+        delta = float(new_quantity - old_quantity)
+        with self._lock:
+            state = self.changes.setdefault(item_id, EWMAState())
+            if state.n >= MIN_OBSERVATIONS:
+                z = state.z_score(abs(delta))
+                if z > Z_THRESHOLD:
+                    anomalies.append(dict(
+                        base, previous_quantity=old_quantity, z_score=round(z, 2),
+                        severity=_severity(z), type="inventory_adjustment",
+                        description=f"Unusual stock change of {int(delta):+d} units ({old_quantity} -> {new_quantity})"
+                    ))
+            state.update(abs(delta))
+
+        return anomalies
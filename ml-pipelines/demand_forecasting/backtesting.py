@@ -0,0 +1,263 @@
+"""
+Rolling-origin backtesting for demand forecasting models.
+Evaluates each model on successive historical cut-offs, computes
+MAE/RMSE/MAPE/WAPE, runs folds in worker processes and caches fold results.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Callable
+
+from demand_forecasting.registry import REGRESSOR_MODELS, get_forecaster
+from demand_forecasting.covariates import regressor_columns
+
+BACKTEST_CACHE_DIR = os.getenv(
+    "BACKTEST_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "warefy_backtests")
+)
+
+# Minimum number of training days before the first fold origin
+MIN_TRAIN_DAYS = 30
+
+# A Monday; fold origins fall on whole multiples of the fold step from it
+ORIGIN_ANCHOR = pd.Timestamp("2024-01-01")
+
+def compute_accuracy_metrics(actual: np.ndarray, predicted: np.ndarray) -> Dict[str, float]:
+    """
+    Compute point forecast accuracy metrics.
+
+    Args:
+        actual: Observed quantities
+        predicted: Forecast quantities aligned with actual
+
+    Returns:
+        Dict with mae, rmse, mape (%, over non-zero actuals) and wape (%)
+    """
+    actual = np.asarray(actual, dtype=float)
+    predicted = np.asarray(predicted, dtype=float)
+    errors = actual - predicted
+    abs_errors = np.abs(errors)
+
+    nonzero = actual != 0
+    mape = float(np.mean(abs_errors[nonzero] / np.abs(actual[nonzero])) * 100) if nonzero.any() else 0.0
+    total_actual = np.abs(actual).sum()
+    wape = float(abs_errors.sum() / total_actual * 100) if total_actual > 0 else 0.0
+
+    return {
+        "mae": float(abs_errors.mean()) if len(errors) else 0.0,
+        "rmse": float(np.sqrt(np.mean(errors ** 2))) if len(errors) else 0.0,
+        "mape": round(mape, 4),
+        "wape": round(wape, 4)
+    }
+
+def rolling_origin_cutoffs(dates: pd.DatetimeIndex, horizon: int, n_folds: int, step: Optional[int] = None) -> List[int]:
+    """
+    Compute training cut-off indices for rolling-origin evaluation.
+    Fold origins sit on a fixed calendar grid: Mondays every `step` days
+    (defaults to the horizon so test windows do not overlap) rounded up to
+    whole weeks, counted from ORIGIN_ANCHOR. The last fold starts on the
+    latest grid date whose test window fits in the history. New days
+    therefore only add a fold once a grid date is passed, and folds already
+    evaluated keep their cache keys.
+
+    Args:
+        dates: Consecutive daily dates of the series
+
+    Returns:
+        Ascending list of cut-offs; fold i trains on [0, cutoff) and tests on
+        [cutoff, cutoff + horizon)
+    """
+    n_obs = len(dates)
+    last = n_obs - horizon
+    if last < 0:
+        return []
+    step_days = -(-(step or horizon) // 7) * 7
+
+    # Latest grid date with a full test window after it
+    last -= (dates[last] - ORIGIN_ANCHOR).days % step_days
+
+    cutoffs = [last - i * step_days for i in range(n_folds)]
+    return sorted(c for c in cutoffs if c >= MIN_TRAIN_DAYS)
+
+def count_folds(historical_data: pd.DataFrame, horizon: int, n_folds: int) -> int:
+    """Folds backtest_model will evaluate; fewer than n_folds on short histories"""
+    if len(historical_data) == 0:
+        return 0
+    return len(rolling_origin_cutoffs(pd.DatetimeIndex(_daily_frame(historical_data)['date']), horizon, n_folds))
+
+def _fold_cache_key(model_type: str, data: pd.DataFrame, cutoff: int, horizon: int) -> str:
+    """Cache key covering the model, the fold origin date and exactly the data the fold sees"""
+    digest = hashlib.sha256()
+    digest.update(f"{model_type}:{data['date'].iloc[cutoff]}:{horizon}:".encode())
+    digest.update(pd.util.hash_pandas_object(data.iloc[:cutoff + horizon], index=False).values.tobytes())
+    return digest.hexdigest()
+
+def _load_cached_fold(key: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(BACKTEST_CACHE_DIR, f"{key}.json")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _store_cached_fold(key: str, fold: Dict[str, Any]):
+    os.makedirs(BACKTEST_CACHE_DIR, exist_ok=True)
+    path = os.path.join(BACKTEST_CACHE_DIR, f"{key}.json")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(fold, f)
+    os.replace(tmp_path, path)
+
+def _daily_frame(historical_data: pd.DataFrame) -> pd.DataFrame:
+    """Zero-filled daily quantities with the day's mean promotion/segment regressors"""
+    df = pd.DataFrame(historical_data)
+    df['date'] = pd.to_datetime(df['date']).dt.normalize()
+    columns = regressor_columns(df)
+
+    daily = df.groupby('date').agg({'quantity': 'sum', **{col: 'mean' for col in columns}})
+    daily = daily.sort_index().asfreq('D').fillna(0.0)
+    daily['quantity'] = daily['quantity'].astype(float)
+    daily.index = daily.index.map(lambda d: d.isoformat())
+    return daily.rename_axis('date').reset_index()
+
+def run_fold(model_type: str, records: List[Dict[str, Any]], cutoff: int, horizon: int) -> Dict[str, Any]:
+    """
+    Fit a model on the first `cutoff` days and score the next `horizon` days.
+    Regressor models get the same promotion and segment regressors as when
+    serving, with the test window's observed values as future regressors.
+    Top-level so it can be shipped to worker processes.
+    """
+    forecaster = get_forecaster(model_type)
+    train = records[:cutoff]
+    test = pd.DataFrame(records[cutoff:cutoff + horizon])
+    actual = test['quantity'].to_numpy(dtype=float)
+
+    options = {}
+    columns = regressor_columns(test)
+    if model_type in REGRESSOR_MODELS and columns:
+        options["future_regressors"] = test[['date'] + columns]
+
+    predictions = forecaster(train, horizon, **options)
+    predicted = np.array([p["predicted_quantity"] for p in predictions[:horizon]], dtype=float)
+
+    return {
+        "cutoff_date": records[cutoff]["date"],
+        "actual": actual.tolist(),
+        "predicted": predicted.tolist(),
+        "metrics": compute_accuracy_metrics(actual, predicted)
+    }
+
+def _fold_summary(fold: Dict[str, Any]) -> Dict[str, Any]:
+    return {"cutoff_date": fold["cutoff_date"], "metrics": fold["metrics"]}
+
+def backtest_model(
+    historical_data: pd.DataFrame,
+    model_type: str,
+    horizon: int = 14,
+    n_folds: int = 3,
+    max_workers: Optional[int] = None,
+    use_cache: bool = True,
+    on_fold: Optional[Callable[[str, Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Rolling-origin backtest of one model over a sales history.
+
+    Args:
+        historical_data: Daily demand with 'date' and 'quantity' columns and
+            any promotion/segment regressor columns (see
+            sales_data.get_daily_demand)
+        model_type: Model to evaluate (see registry.FORECASTERS)
+        horizon: Days forecast at each origin
+        n_folds: Number of origins
+        max_workers: Worker processes for uncached folds (1 runs inline)
+        use_cache: Reuse and store fold results in BACKTEST_CACHE_DIR
+        on_fold: Called with (model_type, fold summary) as each fold finishes,
+            cached folds first
+
+    Returns:
+        Dict with per-fold results and metrics pooled over all folds
+    """
+    data = _daily_frame(historical_data)
+    cutoffs = rolling_origin_cutoffs(pd.DatetimeIndex(data['date']), horizon, n_folds)
+    records = data.to_dict("records")
+
+    folds: Dict[int, Dict[str, Any]] = {}
+    pending = []
+    for cutoff in cutoffs:
+        key = _fold_cache_key(model_type, data, cutoff, horizon)
+        cached = _load_cached_fold(key) if use_cache else None
+        if cached is not None:
+            folds[cutoff] = cached
+            if on_fold is not None:
+                on_fold(model_type, _fold_summary(cached))
+        else:
+            pending.append((cutoff, key))
+
+    def finished(cutoff: int, result: Dict[str, Any]):
+        folds[cutoff] = result
+        if use_cache:
+            _store_cached_fold(keys[cutoff], result)
+        if on_fold is not None:
+            on_fold(model_type, _fold_summary(result))
+
+    keys = dict(pending)
+    if len(pending) > 1 and max_workers != 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(run_fold, model_type, records, cutoff, horizon): cutoff
+                for cutoff, _ in pending
+            }
+            for future in as_completed(futures):
+                finished(futures[future], future.result())
+    else:
+        for cutoff, _ in pending:
+            finished(cutoff, run_fold(model_type, records, cutoff, horizon))
+
+    ordered = [folds[c] for c in cutoffs]
+    if ordered:
+        metrics = compute_accuracy_metrics(
+            np.concatenate([f["actual"] for f in ordered]),
+            np.concatenate([f["predicted"] for f in ordered])
+        )
+    else:
+        metrics = None
+
+    return {
+        "model_type": model_type,
+        "horizon": horizon,
+        "folds": [_fold_summary(f) for f in ordered],
+        "metrics": metrics
+    }
+
+def compare_models(
+    historical_data: pd.DataFrame,
+    model_types: List[str],
+    horizon: int = 14,
+    n_folds: int = 3,
+    max_workers: Optional[int] = None,
+    on_fold: Optional[Callable[[str, Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Backtest several models on the same history and pick the best by WAPE.
+    historical_data is a daily demand frame as for backtest_model; on_fold
+    is passed through to it.
+
+    Returns:
+        Dict with per-model backtest results and the best model_type
+    """
+    results = {
+        model_type: backtest_model(historical_data, model_type, horizon, n_folds, max_workers, on_fold=on_fold)
+        for model_type in model_types
+    }
+
+    scored = {m: r["metrics"]["wape"] for m, r in results.items() if r["metrics"] is not None}
+    best_model = min(scored, key=scored.get) if scored else None
+
+    return {"results": results, "best_model": best_model}
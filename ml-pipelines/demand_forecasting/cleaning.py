@@ -0,0 +1,162 @@
+"""
+Anomaly-aware cleaning of demand history before forecasting.
+Days flagged as anomalous, by stored Anomaly records or by a rolling
+median/MAD (Hampel) detector, are winsorized to the local robust range or
+interpolated from their neighbours, so one-off spikes and stockout gaps do
+not leak into every later forecast. Results are cached per series and data
+version.
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+CLEANING_METHODS = ("winsorize", "interpolate")
+
+# Centered window and threshold (in robust standard deviations) of the detector
+HAMPEL_WINDOW = 15
+HAMPEL_THRESHOLD = 3.5
+
+# Scales a MAD to a standard deviation under normality
+MAD_TO_STD = 1.4826
+
+CLEANING_CACHE_SIZE = int(os.getenv("CLEANING_CACHE_SIZE", "1024"))
+
+def robust_bands(Y: np.ndarray, window: int = HAMPEL_WINDOW) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Centered rolling median and robust scale of every day of many series.
+
+    The scale is floored at the series' global MAD and at the Poisson
+    standard deviation of its mean demand, so intermittent series whose
+    local MAD is zero do not flag every sale.
+
+    Args:
+        Y: Daily demand matrix (n_series, n_days)
+        window: Odd window length in days
+
+    Returns:
+        (median, scale), each (n_series, n_days)
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=float))
+    half = window // 2
+    padded = np.pad(Y, ((0, 0), (half, half)), mode="reflect" if Y.shape[1] > half else "edge")
+    windows = sliding_window_view(padded, window, axis=1)
+
+    median = np.median(windows, axis=2)
+    local_mad = MAD_TO_STD * np.median(np.abs(windows - median[..., np.newaxis]), axis=2)
+
+    global_median = np.median(Y, axis=1, keepdims=True)
+    global_mad = MAD_TO_STD * np.median(np.abs(Y - global_median), axis=1, keepdims=True)
+    poisson = np.sqrt(Y.mean(axis=1, keepdims=True))
+
+    scale = np.maximum(local_mad, np.maximum(np.maximum(global_mad, poisson), 1.0))
+    return median, scale
+
+def clean_demand_matrix(
+    Y: np.ndarray,
+    flagged: Optional[np.ndarray] = None,
+    method: str = "winsorize",
+    detect: bool = True
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Clean many daily demand series in one pass.
+
+    Args:
+        Y: Daily demand matrix (n_series, n_days)
+        flagged: Boolean matrix of days already known to be anomalous
+        method: "winsorize" clips flagged days to the local robust range,
+            "interpolate" replaces them linearly from unflagged neighbours
+        detect: Also flag days outside HAMPEL_THRESHOLD robust deviations
+
+    Returns:
+        (cleaned matrix, boolean mask of the days that were flagged)
+    """
+    if method not in CLEANING_METHODS:
+        raise ValueError(f"Unknown cleaning method: {method}")
+
+    Y = np.atleast_2d(np.asarray(Y, dtype=float))
+    mask = np.zeros(Y.shape, dtype=bool) if flagged is None else np.atleast_2d(flagged).astype(bool)
+    median, scale = robust_bands(Y)
+    if detect:
+        mask |= np.abs(Y - median) > HAMPEL_THRESHOLD * scale
+
+    if not mask.any():
+        return Y.copy(), mask
+
+    if method == "winsorize":
+        clipped = np.clip(Y, median - HAMPEL_THRESHOLD * scale, median + HAMPEL_THRESHOLD * scale)
+        cleaned = np.where(mask, clipped, Y)
+    else:
+        gaps = pd.DataFrame(np.where(mask, np.nan, Y))
+        cleaned = gaps.interpolate(axis=1, limit_direction="both").to_numpy()
+        # Series flagged on every day have nothing to interpolate from
+        cleaned = np.where(np.isnan(cleaned), median, cleaned)
+
+    return np.maximum(cleaned, 0), mask
+
+_cache_lock = threading.Lock()
+_cache: "OrderedDict[Any, Tuple[str, Tuple[pd.DataFrame, list]]]" = OrderedDict()
+
+def _data_version(historical_data: pd.DataFrame, anomaly_dates: Iterable, method: str, detect: bool) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(pd.to_datetime(historical_data["date"]).to_numpy().astype("datetime64[D]").tobytes())
+    digest.update(historical_data["quantity"].to_numpy(dtype=float).tobytes())
+    digest.update(repr((sorted(str(d) for d in anomaly_dates), method, detect)).encode())
+    return digest.hexdigest()
+
+def clean_demand(
+    historical_data: pd.DataFrame,
+    anomaly_dates: Optional[Iterable] = None,
+    method: str = "winsorize",
+    detect: bool = True,
+    cache_key: Any = None
+) -> Tuple[pd.DataFrame, list]:
+    """
+    Clean one SKU's zero-filled daily demand before it is forecast.
+
+    Args:
+        historical_data: Daily rows with date and quantity (covariate
+            columns are passed through unchanged)
+        anomaly_dates: Days flagged by stored anomaly records
+        method: "winsorize" or "interpolate"
+        detect: Also flag days with the rolling median/MAD detector
+        cache_key: Series identity (e.g. (sku, warehouse_id)); results are
+            reused while the data and flags are unchanged
+
+    Returns:
+        (cleaned copy of historical_data, ISO dates that were replaced)
+    """
+    anomaly_dates = list(anomaly_dates or [])
+    version = None
+    if cache_key is not None:
+        version = _data_version(historical_data, anomaly_dates, method, detect)
+        with _cache_lock:
+            cached = _cache.get(cache_key)
+            if cached is not None and cached[0] == version:
+                _cache.move_to_end(cache_key)
+                return cached[1][0].copy(), list(cached[1][1])
+
+    dates = pd.to_datetime(historical_data["date"]).dt.normalize()
+    flagged = dates.isin(pd.to_datetime(pd.Series(anomaly_dates, dtype=object)).dt.normalize()).to_numpy()
+    cleaned, mask = clean_demand_matrix(
+        historical_data["quantity"].to_numpy(dtype=float), flagged, method, detect
+    )
+
+    result = historical_data.copy()
+    result["quantity"] = cleaned[0]
+    replaced = [d.date().isoformat() for d in dates[mask[0]]]
+
+    if cache_key is not None:
+        with _cache_lock:
+            _cache[cache_key] = (version, (result.copy(), replaced))
+            _cache.move_to_end(cache_key)
+            while len(_cache) > CLEANING_CACHE_SIZE:
+                _cache.popitem(last=False)
+
+    return result, replaced
@@ -0,0 +1,223 @@
+"""
+Cold-start forecasting for SKUs with little or no sales history.
+Similar established products are found by category, price band and
+warehouse with a nearest-neighbour index; their demand, normalized to a
+common scale, is forecast with the statistical engine and pooled into a
+profile that is rescaled to the new SKU's level. As the SKU's own history
+grows its own level, and then its own model, take over.
+"""
+
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from sklearn.neighbors import NearestNeighbors
+
+from demand_forecasting.quantiles import normal_quantiles, attach_quantiles
+
+N_NEIGHBORS = int(os.getenv("COLD_START_NEIGHBORS", "10"))
+
+# Feature weights in the similarity space; category dominates, then price band
+CATEGORY_WEIGHT = 3.0
+PRICE_WEIGHT = 1.0
+WAREHOUSE_WEIGHT = 0.5
+
+# Own-history days at which the SKU's own level weighs as much as its neighbours'
+LEVEL_SHRINKAGE_DAYS = 14
+
+# Own model forecasts are blended in linearly between these history lengths
+BLEND_START_DAYS = 30
+BLEND_FULL_DAYS = 60
+
+# Products need this many days of history to act as neighbours
+MIN_NEIGHBOR_HISTORY_DAYS = BLEND_FULL_DAYS
+
+INDEX_TTL_SECONDS = int(os.getenv("COLD_START_INDEX_TTL", "3600"))
+
+class SimilarityIndex:
+    """Nearest-neighbour index over (sku, warehouse) products"""
+
+    def __init__(self, products: pd.DataFrame):
+        """
+        Args:
+            products: Columns sku, warehouse_id, category and unit_price,
+                one row per established product
+        """
+        self.products = products.reset_index(drop=True)
+        self.categories = sorted(self.products["category"].fillna("uncategorized").unique())
+        self.warehouses = sorted(self.products["warehouse_id"].unique())
+
+        log_price = np.log1p(self.products["unit_price"].fillna(0).to_numpy(dtype=float))
+        self.price_mean = log_price.mean()
+        self.price_std = log_price.std() or 1.0
+
+        self.model = NearestNeighbors().fit(self.encode(self.products))
+
+    def encode(self, products: pd.DataFrame) -> np.ndarray:
+        """Weighted one-hot category and warehouse plus standardized log price"""
+        category = products["category"].fillna("uncategorized").to_numpy()
+        category_hot = (category[:, np.newaxis] == np.array(self.categories)[np.newaxis, :]).astype(float)
+        warehouse_hot = (
+            products["warehouse_id"].to_numpy()[:, np.newaxis] == np.array(self.warehouses)[np.newaxis, :]
+        ).astype(float)
+        log_price = np.log1p(products["unit_price"].fillna(0).to_numpy(dtype=float))
+        price = ((log_price - self.price_mean) / self.price_std)[:, np.newaxis]
+
+        return np.hstack([
+            CATEGORY_WEIGHT * category_hot,
+            PRICE_WEIGHT * price,
+            WAREHOUSE_WEIGHT * warehouse_hot
+        ])
+
+    def query(self, products: pd.DataFrame, k: int = N_NEIGHBORS) -> List[List[Tuple[str, int, float]]]:
+        """
+        Nearest established products for each row of `products`, excluding
+        the product's own SKU.
+
+        Returns:
+            Per row, a list of (sku, warehouse_id, distance)
+        """
+        n_candidates = min(k + 1, len(self.products))
+        distances, indices = self.model.kneighbors(self.encode(products), n_neighbors=n_candidates)
+
+        neighbours = []
+        for sku, row_distances, row_indices in zip(products["sku"], distances, indices):
+            matches = [
+                (self.products.at[i, "sku"], int(self.products.at[i, "warehouse_id"]), float(d))
+                for d, i in zip(row_distances, row_indices)
+                if self.products.at[i, "sku"] != sku
+            ]
+            neighbours.append(matches[:k])
+        return neighbours
+
+_index_lock = threading.Lock()
+_index_cache: Dict[str, Any] = {"index": None, "built_at": 0.0}
+
+def get_similarity_index(load_products: Callable[[], pd.DataFrame]) -> Optional[SimilarityIndex]:
+    """
+    Shared similarity index, rebuilt from `load_products` at most every
+    INDEX_TTL_SECONDS. Returns None when there are no established products.
+    """
+    with _index_lock:
+        if _index_cache["index"] is None or time.time() - _index_cache["built_at"] > INDEX_TTL_SECONDS:
+            products = load_products()
+            _index_cache["index"] = SimilarityIndex(products) if len(products) else None
+            _index_cache["built_at"] = time.time()
+        return _index_cache["index"]
+
+def pooled_profile(history: np.ndarray, distances: np.ndarray, horizon: int) -> Optional[Dict[str, Any]]:
+    """
+    Pool neighbours' demand into one normalized forecast profile.
+
+    Each neighbour's series is divided by its mean so products of different
+    volume share one scale; the normalized series are forecast together and
+    averaged with inverse-distance weights.
+
+    Args:
+        history: Neighbour daily demand (n_neighbours, n_days)
+        distances: Neighbour distances (n_neighbours,)
+        horizon: Number of days to forecast
+
+    Returns:
+        Dict with 'profile' and normalized 'std' (horizon,) and the pooled
+        daily 'level', or None if no neighbour has any demand
+    """
+    from demand_forecasting.statistical_models import auto_forecast
+
+    history = np.asarray(history, dtype=float)
+    levels = history.mean(axis=1)
+    active = levels > 0
+    if not active.any():
+        return None
+
+    history, levels = history[active], levels[active]
+    weights = 1.0 / (np.asarray(distances, dtype=float)[active] + 1e-3)
+    weights /= weights.sum()
+
+    result = auto_forecast(history / levels[:, np.newaxis], horizon)
+    profile = weights @ result["forecast"]
+
+    # Within-neighbour forecast error plus disagreement between neighbours
+    within = weights @ result["residual_std"] ** 2
+    between = weights @ (result["forecast"] - profile) ** 2
+
+    return {
+        "profile": profile,
+        "std": np.sqrt(within + between),
+        "level": float(weights @ levels)
+    }
+
+def own_level_weight(n_days: int) -> float:
+    """Weight of the SKU's own mean demand against its neighbours' level"""
+    return n_days / (n_days + LEVEL_SHRINKAGE_DAYS)
+
+def own_model_weight(n_days: int) -> float:
+    """Weight of the SKU's own model forecast in the cold-start blend"""
+    return float(np.clip((n_days - BLEND_START_DAYS) / (BLEND_FULL_DAYS - BLEND_START_DAYS), 0, 1))
+
+def cold_start_forecast(
+    profiles: List[Dict[str, Any]],
+    own_history: np.ndarray,
+    forecast_days: int,
+    last_date
+) -> List[Dict[str, Any]]:
+    """
+    Forecast a SKU from pooled neighbour profiles.
+
+    Profiles of the SKU's warehouses are summed, then the total is rescaled
+    to a level that shrinks the SKU's own mean demand toward the pooled
+    neighbour level.
+
+    Args:
+        profiles: pooled_profile results, one per warehouse of the SKU
+        own_history: The SKU's own daily demand so far (may be empty)
+        forecast_days: Number of days to forecast
+        last_date: Day before the first forecast day
+
+    Returns:
+        List of predictions with date, predicted_quantity and p10/p50/p90 quantiles
+    """
+    forecast = sum(p["level"] * p["profile"] for p in profiles)
+    std = np.sqrt(sum((p["level"] * p["std"]) ** 2 for p in profiles))
+    pooled_level = sum(p["level"] for p in profiles)
+
+    own_history = np.asarray(own_history, dtype=float)
+    weight = own_level_weight(len(own_history))
+    level = weight * own_history.mean() + (1 - weight) * pooled_level if len(own_history) else pooled_level
+    scale = level / pooled_level if pooled_level > 0 else 0.0
+
+    forecast, std = forecast * scale, std * scale
+    last_date = pd.Timestamp(last_date)
+
+    predictions = [
+        {
+            "date": (last_date + timedelta(days=i+1)).isoformat(),
+            "predicted_quantity": max(0, round(float(value))),
+            "method": "cold_start"
+        }
+        for i, value in enumerate(forecast)
+    ]
+    return attach_quantiles(predictions, normal_quantiles(forecast, std))
+
+def blend_predictions(
+    own: List[Dict[str, Any]],
+    pooled: List[Dict[str, Any]],
+    own_weight: float
+) -> List[Dict[str, Any]]:
+    """Linear blend of the SKU's own forecast with its cold-start forecast"""
+    blended = []
+    for own_pred, pooled_pred in zip(own, pooled):
+        pred = dict(own_pred)
+        pred["predicted_quantity"] = max(0, round(
+            own_weight * own_pred["predicted_quantity"] + (1 - own_weight) * pooled_pred["predicted_quantity"]
+        ))
+        if "quantiles" in own_pred:
+            pred["quantiles"] = {
+                name: round(own_weight * own_pred["quantiles"][name] + (1 - own_weight) * value, 2)
+                for name, value in pooled_pred["quantiles"].items()
+            }
+        blended.append(pred)
+    return blended
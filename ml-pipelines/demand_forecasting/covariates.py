@@ -0,0 +1,84 @@
+"""
+Exogenous regressors for demand forecasting.
+Promotion intensity and customer segment mix derived from SalesHistory,
+plus their future values from a planned promotion calendar.
+"""
+
+import pandas as pd
+from datetime import date
+from typing import List, Dict, Any, Optional, Union
+
+PROMOTION_COLUMN = "promotion"
+SEGMENT_PREFIX = "segment_"
+
+# Days of recent history averaged to project the segment mix forward
+SEGMENT_LOOKBACK_DAYS = 28
+
+def regressor_columns(df: pd.DataFrame) -> List[str]:
+    """Names of the regressor columns present in a history frame"""
+    return [
+        col for col in df.columns
+        if col == PROMOTION_COLUMN or col.startswith(SEGMENT_PREFIX)
+    ]
+
+def build_future_regressors(
+    historical_data: Union[pd.DataFrame, List[Dict[str, Any]]],
+    forecast_days: int,
+    promotion_dates: Optional[List[date]] = None
+) -> pd.DataFrame:
+    """
+    Regressor values for the forecast horizon.
+
+    Promotion is 1.0 on planned promotion dates and 0.0 otherwise; segment
+    shares are held at their recent average.
+
+    Args:
+        historical_data: History with 'date' and regressor columns
+        forecast_days: Number of days to forecast
+        promotion_dates: Planned promotion days within the horizon
+
+    Returns:
+        DataFrame with 'date' and one column per regressor, forecast_days rows
+    """
+    df = pd.DataFrame(historical_data)
+    df['date'] = pd.to_datetime(df['date'])
+    df = df.sort_values('date')
+
+    last_date = df['date'].max()
+    dates = pd.date_range(last_date + pd.Timedelta(days=1), periods=forecast_days, freq='D')
+    future = pd.DataFrame({'date': dates})
+
+    columns = regressor_columns(df)
+    if promotion_dates and PROMOTION_COLUMN not in columns:
+        columns.append(PROMOTION_COLUMN)
+
+    planned = set(pd.to_datetime(list(promotion_dates or [])).normalize())
+    recent = df.tail(SEGMENT_LOOKBACK_DAYS)
+
+    for col in columns:
+        if col == PROMOTION_COLUMN:
+            future[col] = [1.0 if d in planned else 0.0 for d in dates]
+        else:
+            future[col] = float(recent[col].mean())
+
+    return future
+
+def resolve_future_regressors(
+    df: pd.DataFrame,
+    forecast_days: int,
+    future_regressors: Optional[pd.DataFrame] = None
+) -> pd.DataFrame:
+    """
+    Future regressor frame aligned with the history's regressor columns.
+    Missing columns are filled with 0 and extra ones dropped.
+    """
+    columns = regressor_columns(df)
+    if future_regressors is None:
+        future_regressors = build_future_regressors(df, forecast_days)
+
+    future = pd.DataFrame(future_regressors).head(forecast_days).reset_index(drop=True)
+    for col in columns:
+        if col not in future:
+            future[col] = 0.0
+
+    return future[['date'] + columns] if 'date' in future else future[columns]
@@ -0,0 +1,269 @@
+"""
+Per-SKU daily feature store shared by demand forecasting and anomaly detection.
+Lag and rolling features are computed once, when a day's sales close, and
+appended to a columnar store (parquet, or pickle when no parquet engine is
+installed) so callers read precomputed rows instead of re-running pandas
+rolling passes on every request.
+"""
+
+import os
+import glob
+import threading
+from datetime import datetime
+from typing import List, Optional, Iterable
+
+import numpy as np
+import pandas as pd
+
+LAGS = (1, 7, 14, 30)
+WINDOWS = (7, 14, 30)
+
+# Trailing days of quantities needed to compute a new day's features
+STATE_DAYS = max(max(LAGS), max(WINDOWS))
+
+FEATURE_STORE_DIR = os.getenv(
+    "FEATURE_STORE_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "feature_store")
+)
+
+FEATURE_COLUMNS = (
+    [f"lag_{lag}" for lag in LAGS]
+    + [f"rolling_{stat}_{window}" for window in WINDOWS for stat in ("mean", "std")]
+)
+
+def _parquet_engine() -> Optional[str]:
+    for engine in ("pyarrow", "fastparquet"):
+        try:
+            __import__(engine)
+            return engine
+        except ImportError:
+            continue
+    return None
+
+def _rolling_mean_std(values: np.ndarray, window: int):
+    """
+    Trailing mean and sample std over axis 0 of a (n_days, n_series) matrix
+    from cumulative sums; windows reaching before a series starts are NaN.
+    """
+    n_days = values.shape[0]
+    missing = np.isnan(values)
+    filled = np.where(missing, 0.0, values)
+    pad = np.zeros((1,) + values.shape[1:])
+
+    def window_sum(x):
+        c = np.concatenate([pad, np.cumsum(x, axis=0)])
+        return c[window:] - c[:-window]
+
+    mean = np.full(values.shape, np.nan)
+    std = np.full(values.shape, np.nan)
+    if n_days < window:
+        return mean, std
+
+    total = window_sum(filled)
+    squares = window_sum(filled ** 2)
+    complete = window_sum(missing.astype(float)) == 0
+
+    window_mean = total / window
+    window_var = np.maximum(squares - total * window_mean, 0) / (window - 1)
+    mean[window - 1:] = np.where(complete, window_mean, np.nan)
+    std[window - 1:] = np.where(complete, np.sqrt(window_var), np.nan)
+    return mean, std
+
+def lag_rolling_features(quantity: pd.DataFrame) -> pd.DataFrame:
+    """
+    Lag and rolling features for one or many aligned daily series, computed
+    as whole-matrix NumPy operations.
+
+    Args:
+        quantity: Daily quantities, one column per series (or a Series);
+            NaN before a series starts
+
+    Returns:
+        Long DataFrame indexed by (date, series) with FEATURE_COLUMNS, or a
+        flat DataFrame when a Series is passed
+    """
+    single = isinstance(quantity, pd.Series)
+    wide = quantity.to_frame() if single else quantity
+    values = wide.to_numpy(dtype=float)
+
+    features = {}
+    for lag in LAGS:
+        lagged = np.full(values.shape, np.nan)
+        lagged[lag:] = values[:-lag]
+        features[f"lag_{lag}"] = lagged
+    for window in WINDOWS:
+        features[f"rolling_mean_{window}"], features[f"rolling_std_{window}"] = _rolling_mean_std(values, window)
+
+    if single:
+        return pd.DataFrame({name: array[:, 0] for name, array in features.items()}, index=quantity.index)
+    index = pd.MultiIndex.from_product([wide.index, wide.columns])
+    return pd.DataFrame({name: array.ravel() for name, array in features.items()}, index=index)
+
+def compute_features(daily: pd.DataFrame, through: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """
+    Compute features for many SKUs at once.
+
+    Each SKU's calendar is zero-filled from its first day to `through`, and
+    all SKUs are processed as columns of one wide matrix, so shifts and
+    rolling windows are single vectorized passes.
+
+    Args:
+        daily: Columns sku, date and quantity (days without sales may be missing)
+        through: Last day to produce rows for (default: last date in daily)
+
+    Returns:
+        DataFrame with sku, date, quantity and FEATURE_COLUMNS
+    """
+    daily = daily.assign(date=pd.to_datetime(daily["date"]).dt.normalize())
+    through = pd.Timestamp(through).normalize() if through is not None else daily["date"].max()
+
+    wide = daily.pivot_table(index="date", columns="sku", values="quantity", aggfunc="sum")
+    calendar = pd.date_range(wide.index.min(), through, freq="D")
+    wide = wide.reindex(calendar)
+
+    # Zero demand on days without sales, but nothing before a SKU's first day
+    first_day = daily.groupby("sku")["date"].min().reindex(wide.columns)
+    started = calendar.values[:, np.newaxis] >= first_day.values[np.newaxis, :]
+    wide = wide.fillna(0).where(started)
+
+    features = lag_rolling_features(wide)
+    features.insert(0, "quantity", wide.to_numpy().ravel())
+    features.index.names = ["date", "sku"]
+
+    features = features[features["quantity"].notna()].reset_index()
+    return features[["sku", "date", "quantity"] + FEATURE_COLUMNS]
+
+class FeatureStore:
+    """Append-only columnar store of daily per-SKU feature rows"""
+
+    def __init__(self, path: str = FEATURE_STORE_DIR):
+        self.path = path
+        self.engine = _parquet_engine()
+        self._lock = threading.Lock()
+        self._cache_key = None
+        self._cache = None
+
+    def _parts(self) -> List[str]:
+        return sorted(
+            glob.glob(os.path.join(self.path, "part-*.parquet"))
+            + glob.glob(os.path.join(self.path, "part-*.pkl"))
+        )
+
+    def _read_part(self, part: str) -> pd.DataFrame:
+        if part.endswith(".parquet"):
+            return pd.read_parquet(part, engine=self.engine)
+        return pd.read_pickle(part)
+
+    def _write_part(self, frame: pd.DataFrame, name: Optional[str] = None):
+        os.makedirs(self.path, exist_ok=True)
+        name = name or f"part-{datetime.utcnow():%Y%m%d%H%M%S%f}"
+        if self.engine:
+            frame.to_parquet(os.path.join(self.path, f"{name}.parquet"), engine=self.engine, index=False)
+        else:
+            frame.to_pickle(os.path.join(self.path, f"{name}.pkl"))
+
+    def _all(self) -> pd.DataFrame:
+        """Every stored row, re-read only when the set of parts changes"""
+        parts = self._parts()
+        key = tuple((part, os.path.getmtime(part)) for part in parts)
+        if key != self._cache_key:
+            if parts:
+                frame = pd.concat([self._read_part(part) for part in parts], ignore_index=True)
+            else:
+                frame = pd.DataFrame({
+                    "sku": pd.Series(dtype=str),
+                    "date": pd.Series(dtype="datetime64[ns]"),
+                    **{col: pd.Series(dtype="float32") for col in ["quantity"] + FEATURE_COLUMNS}
+                })
+            self._cache, self._cache_key = frame, key
+        return self._cache
+
+    def load(
+        self,
+        skus: Optional[Iterable[str]] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> pd.DataFrame:
+        """
+        Stored feature rows, optionally filtered by SKU and date range.
+
+        Returns:
+            DataFrame with sku, date, quantity and FEATURE_COLUMNS
+        """
+        frame = self._all()
+        mask = np.ones(len(frame), dtype=bool)
+        if skus is not None:
+            mask &= frame["sku"].isin(list(skus)).to_numpy()
+        if start is not None:
+            mask &= (frame["date"] >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            mask &= (frame["date"] <= pd.Timestamp(end)).to_numpy()
+        return frame[mask].sort_values(["sku", "date"]).reset_index(drop=True)
+
+    def last_dates(self) -> pd.Series:
+        """Last stored day per SKU"""
+        frame = self._all()
+        return frame.groupby("sku")["date"].max()
+
+    def update(self, daily: pd.DataFrame, through: datetime) -> int:
+        """
+        Append feature rows for days closed since the last update.
+
+        Only the trailing STATE_DAYS of stored quantities are re-read to seed
+        the lags and rolling windows, so an update costs O(new days), not
+        O(history).
+
+        Args:
+            daily: Columns sku, date, quantity for new days (known SKUs) and
+                full history (new SKUs); days without sales may be missing
+            through: Last closed day; known SKUs are extended to it with zeros
+
+        Returns:
+            Number of rows appended
+        """
+        through = pd.Timestamp(through).normalize()
+
+        with self._lock:
+            frame = self._all()
+            last = frame.groupby("sku")["date"].max()
+
+            state = frame[["sku", "date", "quantity"]]
+            state = state[state["date"] > last.reindex(state["sku"]).to_numpy() - pd.Timedelta(days=STATE_DAYS)]
+
+            new = daily[["sku", "date", "quantity"]].assign(date=pd.to_datetime(daily["date"]).dt.normalize())
+            new = new[new["date"] <= through]
+            new = new[~(new["date"] <= last.reindex(new["sku"]).to_numpy())]
+
+            if new.empty and (last.empty or last.min() >= through):
+                return 0
+
+            features = compute_features(pd.concat([state, new], ignore_index=True), through)
+            features = features[~(features["date"] <= last.reindex(features["sku"]).to_numpy())]
+            if features.empty:
+                return 0
+
+            float_cols = ["quantity"] + FEATURE_COLUMNS
+            features[float_cols] = features[float_cols].astype("float32")
+            self._write_part(features)
+
+            return len(features)
+
+    def compact(self):
+        """Merge all parts into one file to keep reads fast"""
+        with self._lock:
+            parts = self._parts()
+            if len(parts) <= 1:
+                return
+            frame = self._all()
+            self._write_part(frame, name=f"part-{datetime.utcnow():%Y%m%d%H%M%S%f}-compact")
+            for part in parts:
+                os.remove(part)
+
+_default_store = None
+
+def get_feature_store() -> FeatureStore:
+    """Process-wide feature store at FEATURE_STORE_DIR"""
+    global _default_store
+    if _default_store is None:
+        _default_store = FeatureStore()
+    return _default_store
@@ -0,0 +1,343 @@
+"""
+Standalone inference server for demand forecasts.
+Runs as its own process that imports TensorFlow, Prophet and XGBoost once
+and keeps stored models in memory, so API workers only send requests over a
+local socket and never load the heavy libraries themselves.
+
+Requests arriving within a short window are micro-batched: statistical
+forecasts are run as vectorized auto_forecast calls, Prophet fits are fanned
+out to a process pool and the rest run on a thread pool.
+
+Requests are pickled, so the server only accepts connections that know
+INFERENCE_SERVER_AUTHKEY, which must be set on both sides, and should listen
+on a Unix socket or loopback address only.
+
+Run with:
+    INFERENCE_SERVER_AUTHKEY=... INFERENCE_SERVER_ADDRESS=/run/inference/inference.sock \
+        python -m demand_forecasting.inference_server
+"""
+
+import os
+import sys
+import queue
+import logging
+import threading
+import itertools
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+from demand_forecasting.registry import FORECASTERS, get_forecaster
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+
+# Requests arriving within this window are dispatched together
+BATCH_WINDOW_SECONDS = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "10")) / 1000
+MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "64"))
+
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", str(os.cpu_count() or 1)))
+MODEL_CACHE_SIZE = int(os.getenv("INFERENCE_MODEL_CACHE_SIZE", "256"))
+CLIENT_TIMEOUT_SECONDS = float(os.getenv("INFERENCE_CLIENT_TIMEOUT", "300"))
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """'host:port' for TCP, anything else is a Unix socket path"""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return address
+
+def _authkey() -> bytes:
+    authkey = os.getenv("INFERENCE_SERVER_AUTHKEY")
+    if not authkey:
+        raise RuntimeError("INFERENCE_SERVER_AUTHKEY must be set to use the inference server")
+    return authkey.encode()
+
+class ModelCache:
+    """LRU cache of stored models, keyed by the time they were saved"""
+
+    def __init__(self, size: int = MODEL_CACHE_SIZE):
+        self.size = size
+        self._models: "OrderedDict[Tuple[str, str, str], Tuple[Any, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model_type: str, key: str) -> Optional[Tuple[Any, Any]]:
+        """(model, scaler) for a stored model, loading it on first use"""
+        from demand_forecasting.model_store import load_metadata, load_model
+
+        metadata = load_metadata(model_type, key)
+        if metadata is None:
+            return None
+        cache_key = (model_type, key, metadata.get("saved_at", ""))
+
+        with self._lock:
+            if cache_key in self._models:
+                self._models.move_to_end(cache_key)
+                return self._models[cache_key]
+
+        model, scaler, _ = load_model(model_type, key)
+        with self._lock:
+            self._models[cache_key] = (model, scaler)
+            while len(self._models) > self.size:
+                self._models.popitem(last=False)
+        return model, scaler
+
+class InferenceServer:
+    """
+    Accepts forecast requests on a multiprocessing.connection Listener.
+
+    Each request is a dict with id, model_type, historical_data,
+    forecast_days, options and an optional stored_model key; the reply is
+    {id, predictions} or {id, error}.
+    """
+
+    def __init__(self, address: str = DEFAULT_ADDRESS):
+        self.address = parse_address(address)
+        self.requests: "queue.Queue[Tuple[Any, threading.Lock, Dict[str, Any]]]" = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS)
+        self.models = ModelCache()
+
+    def preload(self):
+        """Import every forecaster's libraries up front"""
+        for model_type in FORECASTERS:
+            try:
+                get_forecaster(model_type)
+            except ImportError as e:
+                logger.warning("Model %s unavailable: %s", model_type, e)
+
+    def serve_forever(self):
+        self.preload()
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+
+        # Socket left behind by a server that did not shut down cleanly
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+        with Listener(self.address, authkey=_authkey()) as listener:
+            logger.info("Inference server listening on %s", listener.address)
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    logger.warning("Rejected inference connection: %s", e)
+                    continue
+                threading.Thread(target=self._read_loop, args=(conn,), daemon=True).start()
+
+    def _read_loop(self, conn):
+        """Queue every request from one client connection"""
+        send_lock = threading.Lock()
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                self.requests.put((conn, send_lock, request))
+
+    def _batch_loop(self):
+        """Collect requests for up to BATCH_WINDOW_SECONDS and dispatch them together"""
+        while True:
+            batch = [self.requests.get()]
+            while len(batch) < MAX_BATCH_SIZE:
+                try:
+                    batch.append(self.requests.get(timeout=BATCH_WINDOW_SECONDS))
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        statistical = []
+        # Plain Prophet fits with the same horizon and config share one process pool
+        prophet: Dict[Tuple[int, str], list] = {}
+        for item in batch:
+            request = item[2]
+            model_type = request.get("model_type")
+            options = request.get("options") or {}
+            if model_type == "statistical" and not options:
+                statistical.append(item)
+            elif model_type == "prophet" and not request.get("stored_model") and set(options) <= {"config"}:
+                config = repr(sorted((options.get("config") or {}).items()))
+                prophet.setdefault((request["forecast_days"], config), []).append(item)
+            else:
+                self.executor.submit(self._run_one, item)
+
+        if statistical:
+            self.executor.submit(self._run_statistical, statistical)
+        for items in prophet.values():
+            self.executor.submit(self._run_prophet, items)
+
+    def _reply(self, item, result: Dict[str, Any]):
+        conn, send_lock, request = item
+        try:
+            with send_lock:
+                conn.send(dict(result, id=request.get("id")))
+        except (OSError, ValueError) as e:
+            logger.warning("Could not deliver inference result: %s", e)
+
+    def _run_one(self, item):
+        request = item[2]
+        try:
+            model_type = request["model_type"]
+            options = dict(request.get("options") or {})
+            if request.get("stored_model"):
+                stored = self.models.get(model_type, request["stored_model"])
+                if stored is not None:
+                    options["model"] = stored[0]
+                    if model_type == "lstm":
+                        options["scaler"] = stored[1]
+            forecaster = get_forecaster(model_type)
+            predictions = forecaster(request["historical_data"], request["forecast_days"], **options)
+            self._reply(item, {"predictions": predictions})
+        except Exception as e:
+            self._reply(item, {"error": str(e)})
+
+    def _run_statistical(self, items):
+        from demand_forecasting.statistical_models import forecast_many_with_statistical
+
+        by_horizon: Dict[int, list] = {}
+        for item in items:
+            by_horizon.setdefault(item[2]["forecast_days"], []).append(item)
+
+        for forecast_days, members in by_horizon.items():
+            try:
+                results = forecast_many_with_statistical(
+                    {i: item[2]["historical_data"] for i, item in enumerate(members)},
+                    forecast_days
+                )
+            except Exception as e:
+                results = {i: {"error": str(e)} for i in range(len(members))}
+            for i, item in enumerate(members):
+                self._reply(item, results[i])
+
+    def _run_prophet(self, items):
+        from demand_forecasting.prophet_model import forecast_many_with_prophet
+
+        first = items[0][2]
+        try:
+            forecast_many_with_prophet(
+                {i: item[2]["historical_data"] for i, item in enumerate(items)},
+                first["forecast_days"],
+                config=first.get("options", {}).get("config"),
+                on_result=lambda i, result: self._reply(items[i], result)
+            )
+        except Exception as e:
+            for item in items:
+                self._reply(item, {"error": str(e)})
+
+class InferenceClient:
+    """
+    Thread-safe client for the inference server.
+    One connection is shared by all threads; requests are pipelined and a
+    reader thread resolves each caller's Future when its reply arrives, so
+    concurrent API requests land in the same server micro-batch.
+    """
+
+    def __init__(self, address: str):
+        self.address = parse_address(address)
+        self._conn = None
+        self._pending: Dict[int, Future] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = Client(self.address, authkey=_authkey())
+            threading.Thread(target=self._read_loop, args=(self._conn,), daemon=True).start()
+        return self._conn
+
+    def _read_loop(self, conn):
+        while True:
+            try:
+                reply = conn.recv()
+            except (EOFError, OSError) as e:
+                self._fail_pending(conn, ConnectionError(f"Inference server connection lost: {e}"))
+                return
+            with self._lock:
+                future = self._pending.pop(reply.get("id"), None)
+            if future is not None:
+                future.set_result(reply)
+
+    def _fail_pending(self, conn, error: Exception):
+        with self._lock:
+            if self._conn is conn:
+                self._conn = None
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(error)
+
+    def submit(
+        self,
+        model_type: str,
+        historical_data,
+        forecast_days: int,
+        options: Optional[Dict[str, Any]] = None,
+        stored_model: Optional[str] = None
+    ) -> Future:
+        """
+        Send a forecast request without waiting for it.
+
+        Returns:
+            Future resolving to {"predictions": [...]} or {"error": message}
+        """
+        future: Future = Future()
+        with self._lock:
+            request_id = next(self._ids)
+            request = {
+                "id": request_id,
+                "model_type": model_type,
+                "historical_data": historical_data,
+                "forecast_days": forecast_days,
+                "options": options or {},
+                "stored_model": stored_model,
+            }
+            try:
+                conn = self._connection()
+                self._pending[request_id] = future
+                conn.send(request)
+            except (OSError, ValueError) as e:
+                self._pending.pop(request_id, None)
+                if self._conn is not None:
+                    self._conn.close()
+                self._conn = None
+                future.set_exception(ConnectionError(f"Inference server unavailable: {e}"))
+        return future
+
+    def forecast(
+        self,
+        model_type: str,
+        historical_data,
+        forecast_days: int,
+        options: Optional[Dict[str, Any]] = None,
+        stored_model: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Forecast on the server and wait for the predictions"""
+        reply = self.submit(model_type, historical_data, forecast_days, options, stored_model).result(
+            timeout=CLIENT_TIMEOUT_SECONDS
+        )
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply["predictions"]
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_inference_client() -> Optional[InferenceClient]:
+    """Shared client when INFERENCE_SERVER_ADDRESS is set, else None (forecast in-process)"""
+    global _client
+    address = os.getenv("INFERENCE_SERVER_ADDRESS")
+    if not address:
+        return None
+    with _client_lock:
+        if _client is None:
+            _client = InferenceClient(address)
+        return _client
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    address = sys.argv[1] if len(sys.argv) > 1 else os.getenv("INFERENCE_SERVER_ADDRESS", DEFAULT_ADDRESS)
+    InferenceServer(address).serve_forever()
+
+if __name__ == "__main__":
+    main()
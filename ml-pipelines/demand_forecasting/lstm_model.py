@@ -2,25 +2,41 @@
 LSTM-based demand forecasting model using TensorFlow.
 """
 
+import os
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from sklearn.preprocessing import MinMaxScaler
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
 
-def prepare_lstm_data(data: List[Dict[str, Any]], lookback: int = 30):
+from demand_forecasting.covariates import regressor_columns, resolve_future_regressors
+from demand_forecasting.quantiles import normal_quantiles, sample_quantiles, attach_quantiles
+
+# Fine-tuning an existing model only revisits the most recent windows
+FINE_TUNE_EPOCHS = 5
+FINE_TUNE_WINDOWS = 90
+
+# Forecast paths sampled with dropout left on (MC dropout) for quantiles
+MC_DROPOUT_SAMPLES = int(os.getenv("LSTM_MC_DROPOUT_SAMPLES", "50"))
+
+def prepare_lstm_data(data: List[Dict[str, Any]], lookback: int = 30, scaler: Optional[MinMaxScaler] = None):
     """
     Prepare time series data for LSTM model.
     
+    Each time step holds the scaled quantity plus the promotion/segment
+    covariates of the following day, so the last step of a window carries
+    the covariates of the day being predicted.
+    
     Args:
         data: Historical sales data
         lookback: Number of past days to use for prediction
+        scaler: Previously fitted scaler to reuse (keeps a stored model's scale)
     
     Returns:
-        X, y arrays for training
+        X (samples, lookback, features), y, scaler, and the feature matrix
     """
     df = pd.DataFrame(data)
     df['date'] = pd.to_datetime(df['date'])
@@ -30,29 +46,38 @@ def prepare_lstm_data(data: List[Dict[str, Any]], lookback: int = 30):
     quantities = df['quantity'].values.reshape(-1, 1)
     
     # Normalize data
-    scaler = MinMaxScaler()
-    scaled_data = scaler.fit_transform(quantities)
+    if scaler is None:
+        scaler = MinMaxScaler()
+        scaled_data = scaler.fit_transform(quantities)
+    else:
+        scaled_data = scaler.transform(quantities)
+    
+    # Next-day covariates; the final row is filled in at forecast time
+    covariates = df[regressor_columns(df)].shift(-1).fillna(0).values
+    features = np.hstack([scaled_data, covariates])
     
     # Create sequences
     X, y = [], []
-    for i in range(lookback, len(scaled_data)):
-        X.append(scaled_data[i-lookback:i, 0])
+    for i in range(lookback, len(features)):
+        X.append(features[i-lookback:i])
         y.append(scaled_data[i, 0])
     
-    return np.array(X), np.array(y), scaler
+    X = np.array(X).reshape(-1, lookback, features.shape[1])
+    return X, np.array(y), scaler, features
 
-def build_lstm_model(lookback: int = 30):
+def build_lstm_model(lookback: int = 30, n_features: int = 1):
     """
     Build LSTM neural network for time series forecasting.
     
     Args:
         lookback: Number of time steps to look back
+        n_features: Values per time step (quantity plus covariates)
     
     Returns:
         Compiled Keras model
     """
     model = keras.Sequential([
-        layers.LSTM(50, return_sequences=True, input_shape=(lookback, 1)),
+        layers.LSTM(50, return_sequences=True, input_shape=(lookback, n_features)),
         layers.Dropout(0.2),
         layers.LSTM(50, return_sequences=False),
         layers.Dropout(0.2),
@@ -63,57 +88,122 @@ def build_lstm_model(lookback: int = 30):
     model.compile(optimizer='adam', loss='mean_squared_error', metrics=['mae'])
     return model
 
-def forecast_with_lstm(historical_data: List[Dict[str, Any]], forecast_days: int) -> List[Dict[str, Any]]:
+def train_lstm_model(
+    historical_data: List[Dict[str, Any]],
+    previous_model: Optional[keras.Model] = None,
+    scaler: Optional[MinMaxScaler] = None,
+    lookback: int = 30
+):
+    """
+    Train an LSTM demand model, or fine-tune a previously saved one.
+    
+    With previous_model (and its scaler), training continues from the saved
+    weights for FINE_TUNE_EPOCHS over the latest FINE_TUNE_WINDOWS windows.
+    A model whose input width no longer matches the covariates is refit.
+    
+    Returns:
+        (model, scaler), or (None, None) if there is not enough history
+    """
+    if previous_model is not None and scaler is not None:
+        X, y, scaler, features = prepare_lstm_data(historical_data, lookback, scaler)
+        if len(X) >= 10 and previous_model.input_shape[-1] == features.shape[1]:
+            previous_model.fit(
+                X[-FINE_TUNE_WINDOWS:], y[-FINE_TUNE_WINDOWS:],
+                epochs=FINE_TUNE_EPOCHS, batch_size=32, verbose=0
+            )
+            return previous_model, scaler
+    
+    X, y, scaler, features = prepare_lstm_data(historical_data, lookback)
+    if len(X) < 10:
+        return None, None
+    
+    model = build_lstm_model(lookback, features.shape[1])
+    model.fit(X, y, epochs=50, batch_size=32, verbose=0)
+    
+    return model, scaler
+
+def forecast_with_lstm(
+    historical_data: List[Dict[str, Any]],
+    forecast_days: int,
+    future_regressors: Optional[pd.DataFrame] = None,
+    model: Optional[keras.Model] = None,
+    scaler: Optional[MinMaxScaler] = None
+) -> List[Dict[str, Any]]:
     """
     Generate demand forecast using LSTM neural network.
     
     Args:
         historical_data: List of dicts with 'date' and 'quantity' keys
         forecast_days: Number of days to forecast
+        future_regressors: Regressor values over the horizon (see covariates)
+        model: Already trained model (with its scaler); skips fitting when given
+        scaler: Scaler the stored model was trained with
     
     Returns:
-        List of predictions with date and predicted_quantity
+        List of predictions with date, predicted_quantity (the median) and
+        p10/p50/p90 quantiles from MC dropout
     """
     lookback = 30
     
-    # Prepare data
-    X, y, scaler = prepare_lstm_data(historical_data, lookback)
+    # Prepare data [samples, time steps, features]
+    if model is not None and scaler is not None:
+        X, y, scaler, features = prepare_lstm_data(historical_data, lookback, scaler)
+        if model.input_shape[-1] != features.shape[1]:
+            model = None
+    
+    if model is None:
+        X, y, scaler, features = prepare_lstm_data(historical_data, lookback)
     
     if len(X) < 10:
         # Fallback to simple moving average if insufficient data
         return simple_moving_average_forecast(historical_data, forecast_days)
     
-    # Reshape for LSTM [samples, time steps, features]
-    X = X.reshape((X.shape[0], X.shape[1], 1))
+    n_features = features.shape[1]
     
-    # Build and train model
-    model = build_lstm_model(lookback)
-    model.fit(X, y, epochs=50, batch_size=32, verbose=0)
-    
-    # Generate predictions
-    predictions = []
-    last_sequence = X[-1]
+    # Build and train model unless a stored one was supplied
+    if model is None:
+        model = build_lstm_model(lookback, n_features)
+        model.fit(X, y, epochs=50, batch_size=32, verbose=0)
     
     df = pd.DataFrame(historical_data)
     last_date = pd.to_datetime(df['date'].max())
     
+    # Future covariates, plus an all-zero row for the step after the horizon
+    regressors = regressor_columns(df)
+    if regressors:
+        future_values = resolve_future_regressors(df, forecast_days, future_regressors)[regressors].values
+    else:
+        future_values = np.zeros((forecast_days, 0))
+    future_values = np.vstack([future_values, np.zeros((1, future_values.shape[1]))])
+    
+    # Generate predictions, starting from the most recent window
+    last_sequence = features[-lookback:].copy()
+    last_sequence[-1, 1:] = future_values[0]
+    
+    # MC dropout: roll all sample paths forward together with dropout active,
+    # so each step is one batched call and the spread of paths gives quantiles
+    paths = np.repeat(last_sequence[np.newaxis], MC_DROPOUT_SAMPLES, axis=0)
+    samples = np.zeros((MC_DROPOUT_SAMPLES, forecast_days))
+    
     for i in range(forecast_days):
-        # Predict next value
-        pred = model.predict(last_sequence.reshape(1, lookback, 1), verbose=0)
-        pred_value = scaler.inverse_transform(pred)[0][0]
+        # Predict next value for every path
+        pred = np.asarray(model(paths, training=True))
+        samples[:, i] = scaler.inverse_transform(pred)[:, 0]
         
-        # Store prediction
-        next_date = last_date + timedelta(days=i+1)
-        predictions.append({
-            "date": next_date.isoformat(),
-            "predicted_quantity": max(0, round(pred_value)),
-            "confidence": 0.85
-        })
-        
-        # Update sequence for next prediction
-        last_sequence = np.append(last_sequence[1:], pred)
-    
-    return predictions
+        # Update sequences for next prediction
+        next_step = np.hstack([pred, np.repeat(future_values[i + 1][np.newaxis], MC_DROPOUT_SAMPLES, axis=0)])
+        paths = np.concatenate([paths[:, 1:], next_step[:, np.newaxis]], axis=1)
+    
+    quantiles = sample_quantiles(samples, axis=0)
+    predictions = [
+        {
+            "date": (last_date + timedelta(days=i+1)).isoformat(),
+            "predicted_quantity": max(0, round(float(quantiles["p50"][i])))
+        }
+        for i in range(forecast_days)
+    ]
+    
+    return attach_quantiles(predictions, quantiles)
 
 def simple_moving_average_forecast(historical_data: List[Dict[str, Any]], forecast_days: int) -> List[Dict[str, Any]]:
     """Fallback method using simple moving average"""
@@ -127,8 +217,8 @@ def simple_moving_average_forecast(historical_data: List[Dict[str, Any]], foreca
         next_date = last_date + timedelta(days=i+1)
         predictions.append({
             "date": next_date.isoformat(),
-            "predicted_quantity": max(0, round(avg_quantity)),
-            "confidence": 0.70
+            "predicted_quantity": max(0, round(avg_quantity))
         })
     
-    return predictions
+    quantiles = normal_quantiles(np.full(forecast_days, avg_quantity), df['quantity'].tail(30).std(ddof=0))
+    return attach_quantiles(predictions, quantiles)
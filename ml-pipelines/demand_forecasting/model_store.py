@@ -0,0 +1,98 @@
+"""
+On-disk store for trained per-SKU forecasting models.
+Each model is saved in its library's native format next to a small JSON
+metadata file recording what data it was trained through.
+"""
+
+import json
+import os
+import pickle
+import re
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+MODEL_STORE_DIR = os.getenv(
+    "MODEL_STORE_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "models")
+)
+
+def model_key(sku: str, warehouse_id: Optional[int] = None) -> str:
+    """Filesystem-safe key for a SKU, optionally scoped to one warehouse"""
+    safe_sku = re.sub(r"[^A-Za-z0-9_.-]", "_", sku)
+    return f"{safe_sku}__{warehouse_id or 'all'}"
+
+def _base_path(model_type: str, key: str) -> str:
+    directory = os.path.join(MODEL_STORE_DIR, model_type)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, key)
+
+def load_metadata(model_type: str, key: str) -> Optional[Dict[str, Any]]:
+    """Metadata of a stored model, or None if there is none"""
+    path = f"{_base_path(model_type, key)}.meta.json"
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_model(model_type: str, key: str, model: Any, metadata: Dict[str, Any], scaler: Any = None):
+    """
+    Persist a trained model and its metadata.
+
+    Args:
+        model_type: prophet, lstm or xgboost
+        key: Key from model_key
+        model: Trained model object
+        metadata: JSON-serializable details (e.g. trained_through)
+        scaler: Input scaler (LSTM only)
+    """
+    base = _base_path(model_type, key)
+
+    if model_type == "xgboost":
+        model.save_model(f"{base}.json")
+    elif model_type == "lstm":
+        model.save(f"{base}.keras")
+        with open(f"{base}.scaler.pkl", "wb") as f:
+            pickle.dump(scaler, f)
+    elif model_type == "prophet":
+        from prophet.serialize import model_to_json
+        with open(f"{base}.json", "w") as f:
+            f.write(model_to_json(model))
+    else:
+        raise ValueError(f"Unsupported model type: {model_type}")
+
+    metadata = dict(metadata, saved_at=datetime.utcnow().isoformat())
+    with open(f"{base}.meta.json", "w") as f:
+        json.dump(metadata, f)
+
+def load_model(model_type: str, key: str) -> Tuple[Any, Any, Optional[Dict[str, Any]]]:
+    """
+    Load a stored model.
+
+    Returns:
+        (model, scaler, metadata); all None if nothing is stored. scaler is
+        only set for LSTM models.
+    """
+    metadata = load_metadata(model_type, key)
+    if metadata is None:
+        return None, None, None
+
+    base = _base_path(model_type, key)
+    scaler = None
+
+    if model_type == "xgboost":
+        import xgboost as xgb
+        model = xgb.XGBRegressor()
+        model.load_model(f"{base}.json")
+    elif model_type == "lstm":
+        from tensorflow import keras
+        model = keras.models.load_model(f"{base}.keras")
+        with open(f"{base}.scaler.pkl", "rb") as f:
+            scaler = pickle.load(f)
+    elif model_type == "prophet":
+        from prophet.serialize import model_from_json
+        with open(f"{base}.json") as f:
+            model = model_from_json(f.read())
+    else:
+        raise ValueError(f"Unsupported model type: {model_type}")
+
+    return model, scaler, metadata
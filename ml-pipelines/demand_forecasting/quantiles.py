@@ -0,0 +1,60 @@
+"""
+Probabilistic forecast output shared by all forecasting models.
+Every model reports p10/p50/p90 daily demand, built from a normal
+approximation, from sampled paths or from a prediction interval, as arrays
+so many SKUs can be handled in one pass.
+"""
+
+import numpy as np
+from scipy.stats import norm
+from typing import List, Dict, Any
+
+QUANTILE_LEVELS = {"p10": 0.1, "p50": 0.5, "p90": 0.9}
+
+# Distance of the outer quantiles from the median in standard deviations
+_Z_OUTER = norm.ppf(QUANTILE_LEVELS["p90"])
+
+def normal_quantiles(mean: np.ndarray, std: np.ndarray) -> Dict[str, np.ndarray]:
+    """Quantiles of a normal forecast distribution; mean and std broadcast"""
+    mean = np.asarray(mean, dtype=float)
+    std = np.asarray(std, dtype=float)
+    return {name: mean + norm.ppf(level) * std for name, level in QUANTILE_LEVELS.items()}
+
+def sample_quantiles(samples: np.ndarray, axis: int = 0) -> Dict[str, np.ndarray]:
+    """Empirical quantiles over the sample axis of simulated forecast paths"""
+    values = np.quantile(samples, list(QUANTILE_LEVELS.values()), axis=axis)
+    return dict(zip(QUANTILE_LEVELS, values))
+
+def interval_quantiles(
+    center: np.ndarray,
+    lower: np.ndarray,
+    upper: np.ndarray,
+    interval_width: float
+) -> Dict[str, np.ndarray]:
+    """
+    Rescale a central prediction interval of any width to p10/p90.
+    Each side is scaled separately so skewed intervals stay skewed.
+    """
+    center = np.asarray(center, dtype=float)
+    scale = _Z_OUTER / norm.ppf(0.5 + interval_width / 2)
+    return {
+        "p10": center - (center - np.asarray(lower, dtype=float)) * scale,
+        "p50": center,
+        "p90": center + (np.asarray(upper, dtype=float) - center) * scale,
+    }
+
+def std_from_quantiles(quantiles: Dict[str, np.ndarray]) -> np.ndarray:
+    """Standard deviation implied by the p10-p90 spread, assuming normality"""
+    return np.maximum(quantiles["p90"] - quantiles["p10"], 0) / (2 * _Z_OUTER)
+
+def attach_quantiles(
+    predictions: List[Dict[str, Any]],
+    quantiles: Dict[str, np.ndarray]
+) -> List[Dict[str, Any]]:
+    """Add non-negative, non-crossing quantiles to each prediction dict"""
+    stacked = np.sort(np.maximum(np.vstack([quantiles[name] for name in QUANTILE_LEVELS]), 0), axis=0)
+    for i, prediction in enumerate(predictions):
+        prediction["quantiles"] = {
+            name: round(float(stacked[j, i]), 2) for j, name in enumerate(QUANTILE_LEVELS)
+        }
+    return predictions
@@ -0,0 +1,35 @@
+"""
+Registry of demand forecasting models.
+Maps model_type names to their forecast functions, imported lazily so that
+heavy dependencies (TensorFlow, Prophet, XGBoost) load only when used.
+"""
+
+import importlib
+from typing import Callable, List, Dict, Any
+
+FORECASTERS = {
+    "prophet": ("demand_forecasting.prophet_model", "forecast_with_prophet"),
+    "lstm": ("demand_forecasting.lstm_model", "forecast_with_lstm"),
+    "xgboost": ("demand_forecasting.xgboost_model", "forecast_with_xgboost"),
+    "statistical": ("demand_forecasting.statistical_models", "forecast_with_statistical"),
+}
+
+# Models that use promotion/segment regressors (accept future_regressors=)
+REGRESSOR_MODELS = {"prophet", "lstm", "xgboost"}
+
+def get_forecaster(model_type: str) -> Callable[[List[Dict[str, Any]], int], List[Dict[str, Any]]]:
+    """
+    Look up the forecast function for a model type.
+
+    Args:
+        model_type: One of the keys of FORECASTERS
+
+    Returns:
+        Function taking (historical_data, forecast_days) and returning predictions
+    """
+    if model_type not in FORECASTERS:
+        raise ValueError(f"Unknown model type: {model_type}")
+
+    module_name, function_name = FORECASTERS[model_type]
+    module = importlib.import_module(module_name)
+    return getattr(module, function_name)
@@ -0,0 +1,397 @@
+"""
+Lightweight statistical demand forecasting for the long tail of SKUs.
+NumPy-only implementations of seasonal naive, Holt-Winters and Croston/TSB,
+vectorized across many series at once.
+
+All engine functions take a 2-D array of shape (n_series, n_days) holding
+zero-filled daily demand, one row per SKU, and forecast every row in the
+same array operation.
+"""
+
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+from typing import List, Dict, Any, Optional, Tuple
+
+from demand_forecasting.quantiles import normal_quantiles, attach_quantiles
+
+# Syntetos-Boylan demand classification thresholds
+ADI_THRESHOLD = 1.32
+CV2_THRESHOLD = 0.49
+
+# Smoothing parameter grid searched per series by Holt-Winters
+HW_ALPHAS = (0.1, 0.3, 0.5)
+HW_BETAS = (0.01, 0.1)
+HW_GAMMAS = (0.05, 0.2)
+
+def _as_matrix(series: np.ndarray) -> np.ndarray:
+    """Coerce input to a float (n_series, n_days) matrix"""
+    matrix = np.asarray(series, dtype=float)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    return np.nan_to_num(matrix)
+
+def seasonal_naive_forecast(
+    series: np.ndarray,
+    horizon: int,
+    season_length: int = 7
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Repeat the last observed season forward.
+
+    Args:
+        series: Daily demand matrix (n_series, n_days)
+        horizon: Number of days to forecast
+        season_length: Season length in days (7 = weekly)
+
+    Returns:
+        Forecast matrix (n_series, horizon) and in-sample residual std per series
+    """
+    Y = _as_matrix(series)
+    n_days = Y.shape[1]
+
+    if n_days < season_length:
+        # Not a full season yet - fall back to the series mean
+        forecast = np.repeat(Y.mean(axis=1, keepdims=True), horizon, axis=1)
+        return forecast, Y.std(axis=1)
+
+    last_season = Y[:, -season_length:]
+    forecast = last_season[:, np.arange(horizon) % season_length]
+
+    if n_days > season_length:
+        residuals = Y[:, season_length:] - Y[:, :-season_length]
+        residual_std = np.sqrt(np.mean(residuals ** 2, axis=1))
+    else:
+        residual_std = Y.std(axis=1)
+
+    return forecast, residual_std
+
+def holt_winters_forecast(
+    series: np.ndarray,
+    horizon: int,
+    season_length: int = 7,
+    alpha: Optional[float] = None,
+    beta: Optional[float] = None,
+    gamma: Optional[float] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Additive Holt-Winters (triple exponential smoothing).
+
+    Smoothing parameters left as None are picked per series from a small grid
+    by one-step-ahead squared error. The grid and all series are evaluated in
+    a single pass over time.
+
+    Args:
+        series: Daily demand matrix (n_series, n_days), at least two seasons long
+        horizon: Number of days to forecast
+        season_length: Season length in days
+        alpha: Level smoothing parameter
+        beta: Trend smoothing parameter
+        gamma: Seasonal smoothing parameter
+
+    Returns:
+        Forecast matrix (n_series, horizon) and in-sample residual std per series
+    """
+    Y = _as_matrix(series)
+    n_series, n_days = Y.shape
+    m = season_length
+
+    if n_days < 2 * m:
+        return seasonal_naive_forecast(Y, horizon, m)
+
+    # Parameter grid, shape (n_grid, 1) so it broadcasts against series
+    grid = np.array([
+        (a, b, g)
+        for a in ((alpha,) if alpha is not None else HW_ALPHAS)
+        for b in ((beta,) if beta is not None else HW_BETAS)
+        for g in ((gamma,) if gamma is not None else HW_GAMMAS)
+    ])
+    a, b, g = (grid[:, i:i + 1] for i in range(3))
+    n_grid = len(grid)
+
+    # Initialize from the first two seasons
+    first = Y[:, :m].mean(axis=1)
+    second = Y[:, m:2 * m].mean(axis=1)
+    level = np.broadcast_to(first, (n_grid, n_series)).copy()
+    trend = np.broadcast_to((second - first) / m, (n_grid, n_series)).copy()
+    seasonal = np.broadcast_to(Y[:, :m] - first[:, None], (n_grid, n_series, m)).copy()
+    sse = np.zeros((n_grid, n_series))
+
+    for t in range(n_days):
+        y = Y[:, t]
+        s = seasonal[:, :, t % m]
+        error = y - (level + trend + s)
+        sse += error ** 2
+
+        new_level = a * (y - s) + (1 - a) * (level + trend)
+        trend = b * (new_level - level) + (1 - b) * trend
+        seasonal[:, :, t % m] = g * (y - new_level) + (1 - g) * s
+        level = new_level
+
+    # Keep the best parameter set for each series
+    best = np.argmin(sse, axis=0)
+    cols = np.arange(n_series)
+    level = level[best, cols]
+    trend = trend[best, cols]
+    seasonal = seasonal[best, cols]
+    residual_std = np.sqrt(sse[best, cols] / n_days)
+
+    steps = np.arange(1, horizon + 1)
+    season_idx = (n_days + steps - 1) % m
+    forecast = level[:, None] + trend[:, None] * steps + seasonal[:, season_idx]
+
+    return forecast, residual_std
+
+def croston_forecast(
+    series: np.ndarray,
+    horizon: int,
+    alpha: float = 0.1,
+    beta: float = 0.1,
+    variant: str = "tsb"
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Croston-family forecasts for intermittent demand.
+
+    Args:
+        series: Daily demand matrix (n_series, n_days)
+        horizon: Number of days to forecast
+        alpha: Smoothing parameter for demand size (and interval for Croston)
+        beta: Smoothing parameter for demand probability (TSB only)
+        variant: "tsb" (Teunter-Syntetos-Babai) or "croston"
+
+    Returns:
+        Flat forecast matrix (n_series, horizon) and in-sample residual std per series
+    """
+    Y = _as_matrix(series)
+    n_series, n_days = Y.shape
+    nonzero = Y > 0
+    n_nonzero = nonzero.sum(axis=1)
+    has_demand = n_nonzero > 0
+
+    # Initialize size with the first non-zero demand
+    first_idx = np.argmax(nonzero, axis=1)
+    size = np.where(has_demand, Y[np.arange(n_series), first_idx], 0.0)
+    probability = n_nonzero / max(n_days, 1)
+    interval = np.where(has_demand, n_days / np.maximum(n_nonzero, 1), 1.0)
+    periods_since = np.ones(n_series)
+    sse = np.zeros(n_series)
+
+    for t in range(n_days):
+        y = Y[:, t]
+        demand = nonzero[:, t]
+
+        if variant == "tsb":
+            estimate = probability * size
+            probability = np.where(demand, probability + beta * (1 - probability), probability * (1 - beta))
+        else:
+            estimate = size / interval
+            interval = np.where(demand, interval + alpha * (periods_since - interval), interval)
+            periods_since = np.where(demand, 1.0, periods_since + 1)
+
+        sse += (y - estimate) ** 2
+        size = np.where(demand, size + alpha * (y - size), size)
+
+    if variant == "tsb":
+        level = probability * size
+    else:
+        level = size / interval
+
+    level = np.where(has_demand, level, 0.0)
+    forecast = np.repeat(level[:, None], horizon, axis=1)
+    residual_std = np.sqrt(sse / max(n_days, 1))
+
+    return forecast, residual_std
+
+def classify_demand(series: np.ndarray) -> np.ndarray:
+    """
+    Classify each series as smooth, erratic, intermittent, lumpy or zero
+    using average demand interval (ADI) and squared coefficient of variation.
+
+    Args:
+        series: Daily demand matrix (n_series, n_days)
+
+    Returns:
+        Array of class labels, one per series
+    """
+    Y = _as_matrix(series)
+    nonzero = Y > 0
+    n_nonzero = nonzero.sum(axis=1)
+    safe_count = np.maximum(n_nonzero, 1)
+
+    adi = Y.shape[1] / safe_count
+    size_mean = np.where(nonzero, Y, 0).sum(axis=1) / safe_count
+    size_var = np.where(nonzero, (Y - size_mean[:, None]) ** 2, 0).sum(axis=1) / safe_count
+    cv2 = size_var / np.maximum(size_mean, 1e-9) ** 2
+
+    labels = np.where(
+        adi < ADI_THRESHOLD,
+        np.where(cv2 < CV2_THRESHOLD, "smooth", "erratic"),
+        np.where(cv2 < CV2_THRESHOLD, "intermittent", "lumpy")
+    ).astype(object)
+    labels[n_nonzero == 0] = "zero"
+
+    return labels
+
+def select_methods(series: np.ndarray, season_length: int = 7) -> np.ndarray:
+    """
+    Route each series to the cheapest adequate model.
+
+    - No demand at all: zero forecast
+    - Intermittent or lumpy demand: TSB
+    - Smooth or erratic demand with two full seasons: Holt-Winters
+    - Anything else: seasonal naive
+    """
+    Y = _as_matrix(series)
+    labels = classify_demand(Y)
+    long_enough = Y.shape[1] >= 2 * season_length
+
+    methods = np.full(len(labels), "seasonal_naive", dtype=object)
+    methods[np.isin(labels, ["intermittent", "lumpy"])] = "tsb"
+    if long_enough:
+        methods[np.isin(labels, ["smooth", "erratic"])] = "holt_winters"
+    methods[labels == "zero"] = "zero"
+
+    return methods
+
+def auto_forecast(
+    series: np.ndarray,
+    horizon: int,
+    season_length: int = 7,
+    methods: Optional[np.ndarray] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Forecast many series at once, each with its selected method.
+    Series sharing a method are forecast together in one vectorized call.
+
+    Args:
+        series: Daily demand matrix (n_series, n_days)
+        horizon: Number of days to forecast
+        season_length: Season length in days
+        methods: Optional per-series method override (see select_methods)
+
+    Returns:
+        Dict with 'forecast' (n_series, horizon), 'residual_std' (n_series,),
+        'method' (n_series,) and 'quantiles' (p10/p50/p90, each
+        (n_series, horizon), from a normal error around the forecast)
+    """
+    Y = _as_matrix(series)
+    n_series = Y.shape[0]
+    if methods is None:
+        methods = select_methods(Y, season_length)
+
+    forecast = np.zeros((n_series, horizon))
+    residual_std = np.zeros(n_series)
+
+    runners = {
+        "seasonal_naive": lambda X: seasonal_naive_forecast(X, horizon, season_length),
+        "holt_winters": lambda X: holt_winters_forecast(X, horizon, season_length),
+        "croston": lambda X: croston_forecast(X, horizon, variant="croston"),
+        "tsb": lambda X: croston_forecast(X, horizon, variant="tsb"),
+    }
+
+    for method, runner in runners.items():
+        rows = np.flatnonzero(methods == method)
+        if len(rows):
+            forecast[rows], residual_std[rows] = runner(Y[rows])
+
+    forecast = np.maximum(forecast, 0)
+
+    return {
+        "forecast": forecast,
+        "residual_std": residual_std,
+        "method": methods,
+        "quantiles": normal_quantiles(forecast, residual_std[:, np.newaxis])
+    }
+
+def to_daily_series(historical_data: List[Dict[str, Any]]) -> pd.Series:
+    """Aggregate sales records into a zero-filled daily quantity series"""
+    df = pd.DataFrame(historical_data)
+    df['date'] = pd.to_datetime(df['date']).dt.normalize()
+    daily = df.groupby('date')['quantity'].sum().sort_index()
+    return daily.asfreq('D', fill_value=0)
+
+def _format_predictions(
+    last_date: pd.Timestamp,
+    result: Dict[str, Any],
+    row: int
+) -> List[Dict[str, Any]]:
+    """Prediction dicts for one row of an auto_forecast result"""
+    selected = result['method'][row]
+
+    predictions = []
+    for i, value in enumerate(result['forecast'][row]):
+        next_date = last_date + timedelta(days=i+1)
+        predictions.append({
+            "date": next_date.isoformat(),
+            "predicted_quantity": max(0, round(value)),
+            "method": selected
+        })
+
+    quantiles = {name: values[row] for name, values in result['quantiles'].items()}
+    return attach_quantiles(predictions, quantiles)
+
+def forecast_with_statistical(
+    historical_data: List[Dict[str, Any]],
+    forecast_days: int,
+    method: str = "auto"
+) -> List[Dict[str, Any]]:
+    """
+    Generate demand forecast using the lightweight statistical engine.
+
+    Args:
+        historical_data: List of dicts with 'date' and 'quantity' keys
+        forecast_days: Number of days to forecast
+        method: "auto" or one of seasonal_naive, holt_winters, croston, tsb
+
+    Returns:
+        List of predictions with date, predicted_quantity, p10/p50/p90
+        quantiles and the method used
+    """
+    daily = to_daily_series(historical_data)
+    Y = daily.values[np.newaxis, :]
+
+    methods = None if method == "auto" else np.array([method], dtype=object)
+    result = auto_forecast(Y, forecast_days, methods=methods)
+
+    return _format_predictions(daily.index.max(), result, 0)
+
+def forecast_many_with_statistical(
+    series: Dict[Any, List[Dict[str, Any]]],
+    forecast_days: int,
+    method: str = "auto"
+) -> Dict[Any, Dict[str, Any]]:
+    """
+    Forecast many series with the statistical engine, one vectorized
+    auto_forecast call per group of equally long series.
+
+    Args:
+        series: Key (e.g. SKU) -> historical data
+        forecast_days: Number of days to forecast
+        method: "auto" or one method applied to every series
+
+    Returns:
+        Key -> {"predictions": [...]} or {"error": message}
+    """
+    results = {}
+    groups: Dict[int, List[Tuple[Any, pd.Series]]] = {}
+    for key, data in series.items():
+        try:
+            daily = to_daily_series(data)
+        except Exception as e:
+            results[key] = {"error": str(e)}
+            continue
+        groups.setdefault(len(daily), []).append((key, daily))
+
+    for members in groups.values():
+        Y = np.vstack([daily.values for _, daily in members]).astype(float)
+        methods = None if method == "auto" else np.full(len(members), method, dtype=object)
+        try:
+            result = auto_forecast(Y, forecast_days, methods=methods)
+        except Exception as e:
+            for key, _ in members:
+                results[key] = {"error": str(e)}
+            continue
+        for row, (key, daily) in enumerate(members):
+            results[key] = {"predictions": _format_predictions(daily.index.max(), result, row)}
+
+    return results
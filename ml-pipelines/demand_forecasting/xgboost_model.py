@@ -2,19 +2,28 @@
 XGBoost-based demand forecasting model.
 """
 
+import json
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import xgboost as xgb
 from sklearn.model_selection import train_test_split
 
-def create_features(df: pd.DataFrame) -> pd.DataFrame:
+from demand_forecasting.covariates import regressor_columns, resolve_future_regressors
+from demand_forecasting.feature_store import FEATURE_COLUMNS, lag_rolling_features
+from demand_forecasting.quantiles import QUANTILE_LEVELS, normal_quantiles, attach_quantiles
+
+QUANTILE_OBJECTIVE = "reg:quantileerror"
+
+def create_features(df: pd.DataFrame, features: Optional[pd.DataFrame] = None) -> pd.DataFrame:
     """
     Create time-based features for XGBoost.
+    Promotion and segment regressor columns pass through as features.
     
     Args:
         df: DataFrame with date and quantity columns
+        features: Stored lag/rolling rows for this series (see feature_store)
     
     Returns:
         DataFrame with engineered features
@@ -30,38 +39,112 @@ def create_features(df: pd.DataFrame) -> pd.DataFrame:
     df['year'] = df['date'].dt.year
     df['week_of_year'] = df['date'].dt.isocalendar().week
     
-    # Lag features
-    for lag in [1, 7, 14, 30]:
-        df[f'lag_{lag}'] = df['quantity'].shift(lag)
-    
-    # Rolling statistics
-    for window in [7, 14, 30]:
-        df[f'rolling_mean_{window}'] = df['quantity'].rolling(window=window).mean()
-        df[f'rolling_std_{window}'] = df['quantity'].rolling(window=window).std()
+    # Lag and rolling features, precomputed by the feature store when available
+    if features is not None:
+        stored = features[['date'] + FEATURE_COLUMNS].copy()
+        stored['date'] = pd.to_datetime(stored['date'])
+        df = df.merge(stored, on='date', how='left')
+        # Days the store has not reached yet (e.g. since its last refresh) are computed here
+        missing = ~df['date'].isin(stored['date'])
+        if missing.any():
+            computed = lag_rolling_features(df['quantity'].astype(float))
+            df.loc[missing, FEATURE_COLUMNS] = computed.loc[missing, FEATURE_COLUMNS]
+    else:
+        df = df.join(lag_rolling_features(df['quantity'].astype(float)))
     
     return df
 
-def forecast_with_xgboost(historical_data: List[Dict[str, Any]], forecast_days: int) -> List[Dict[str, Any]]:
+def _is_quantile_model(model: xgb.XGBRegressor) -> bool:
+    """Whether a (possibly reloaded) model was trained with the quantile objective"""
+    config = json.loads(model.get_booster().save_config())
+    return config["learner"]["objective"]["name"] == QUANTILE_OBJECTIVE
+
+def _training_frame(historical_data: List[Dict[str, Any]], features: Optional[pd.DataFrame] = None):
+    """Sorted history plus its feature matrix with incomplete lag rows dropped"""
+    df = pd.DataFrame(historical_data)
+    df['date'] = pd.to_datetime(df['date'])
+    df = df.sort_values('date').reset_index(drop=True)
+    
+    df_features = create_features(df, features).dropna()
+    feature_cols = [col for col in df_features.columns if col not in ['date', 'quantity']]
+    
+    return df, df_features, feature_cols
+
+def train_xgboost_model(
+    historical_data: List[Dict[str, Any]],
+    previous_model: Optional[xgb.XGBRegressor] = None,
+    n_estimators: int = 100,
+    features: Optional[pd.DataFrame] = None
+) -> Optional[xgb.XGBRegressor]:
+    """
+    Train an XGBoost demand model, optionally continuing from a previous one.
+    
+    The model is a single multi-output booster fitted with the quantile
+    (pinball) loss at every level in QUANTILE_LEVELS, so one predict call
+    returns p10/p50/p90.
+    
+    With previous_model, `n_estimators` new trees are boosted on top of the
+    existing booster (xgb_model=) instead of refitting from scratch. Models
+    trained with a different objective are refit.
+    
+    Args:
+        historical_data: Historical sales data
+        previous_model: Previously trained model to continue boosting
+        n_estimators: Number of trees to add
+        features: Stored lag/rolling rows for this series (see feature_store)
+    
+    Returns:
+        Trained model, or None if there is not enough history
+    """
+    _, df_features, feature_cols = _training_frame(historical_data, features)
+    
+    if len(df_features) < 30:
+        return None
+    
+    if previous_model is not None and not _is_quantile_model(previous_model):
+        previous_model = None
+    if previous_model is not None:
+        feature_cols = list(previous_model.feature_names_in_)
+    
+    model = xgb.XGBRegressor(
+        objective=QUANTILE_OBJECTIVE,
+        quantile_alpha=np.array(list(QUANTILE_LEVELS.values())),
+        n_estimators=n_estimators,
+        learning_rate=0.1,
+        max_depth=5,
+        random_state=42
+    )
+    model.fit(
+        df_features[feature_cols],
+        df_features['quantity'],
+        xgb_model=previous_model.get_booster() if previous_model is not None else None
+    )
+    
+    return model
+
+def forecast_with_xgboost(
+    historical_data: List[Dict[str, Any]],
+    forecast_days: int,
+    future_regressors: Optional[pd.DataFrame] = None,
+    model: Optional[xgb.XGBRegressor] = None,
+    features: Optional[pd.DataFrame] = None
+) -> List[Dict[str, Any]]:
     """
     Generate demand forecast using XGBoost regression.
     
     Args:
         historical_data: List of dicts with 'date' and 'quantity' keys
         forecast_days: Number of days to forecast
+        future_regressors: Regressor values over the horizon (see covariates)
+        model: Already trained model; skips fitting when given
+        features: Stored lag/rolling rows for this series (see feature_store)
     
     Returns:
-        List of predictions with date and predicted_quantity
+        List of predictions with date, predicted_quantity (the median) and
+        p10/p50/p90 quantiles
     """
-    # Prepare data
-    df = pd.DataFrame(historical_data)
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values('date')
-    
-    # Create features
-    df_features = create_features(df)
-    
-    # Drop rows with NaN (from lag/rolling features)
-    df_features = df_features.dropna()
+    # Prepare data and features (rows with NaN lag/rolling features dropped)
+    df, df_features, feature_cols = _training_frame(historical_data, features)
     
     if len(df_features) < 30:
         # Fallback to simple average
@@ -73,74 +156,69 @@ def forecast_with_xgboost(historical_data: List[Dict[str, Any]], forecast_days:
             next_date = last_date + timedelta(days=i+1)
             predictions.append({
                 "date": next_date.isoformat(),
-                "predicted_quantity": max(0, round(avg_quantity)),
-                "confidence": 0.70
+                "predicted_quantity": max(0, round(avg_quantity))
             })
-        return predictions
-    
-    # Prepare features and target
-    feature_cols = [col for col in df_features.columns if col not in ['date', 'quantity']]
-    X = df_features[feature_cols]
-    y = df_features['quantity']
-    
-    # Train XGBoost model
-    model = xgb.XGBRegressor(
-        n_estimators=100,
-        learning_rate=0.1,
-        max_depth=5,
-        random_state=42
-    )
+        quantiles = normal_quantiles(np.full(forecast_days, avg_quantity), df['quantity'].std(ddof=0))
+        return attach_quantiles(predictions, quantiles)
     
-    model.fit(X, y)
+    # Train XGBoost model unless a stored quantile model was supplied
+    if model is not None and not _is_quantile_model(model):
+        model = None
+    if model is None:
+        model = train_xgboost_model(historical_data, features=features)
+    else:
+        feature_cols = list(model.feature_names_in_)
     
     # Generate future predictions
-    predictions = []
     last_date = df['date'].max()
+    future_dates = pd.date_range(last_date + timedelta(days=1), periods=forecast_days, freq='D')
     
     # For simplicity, use recent average for future predictions
     # In production, you'd create proper future features
     recent_avg = df['quantity'].tail(30).mean()
     recent_std = df['quantity'].tail(30).std()
     
-    for i in range(forecast_days):
-        next_date = last_date + timedelta(days=i+1)
-        
-        # Create future features (simplified)
-        future_features = {
-            'day_of_week': next_date.dayofweek,
-            'day_of_month': next_date.day,
-            'month': next_date.month,
-            'quarter': (next_date.month - 1) // 3 + 1,
-            'year': next_date.year,
-            'week_of_year': next_date.isocalendar()[1]
-        }
-        
-        # Add lag features (use recent average)
-        for lag in [1, 7, 14, 30]:
-            future_features[f'lag_{lag}'] = recent_avg
-        
-        # Add rolling features
-        for window in [7, 14, 30]:
-            future_features[f'rolling_mean_{window}'] = recent_avg
-            future_features[f'rolling_std_{window}'] = recent_std
-        
-        # Create DataFrame for prediction
-        future_df = pd.DataFrame([future_features])
-        
-        # Ensure columns match training data
-        for col in feature_cols:
-            if col not in future_df.columns:
-                future_df[col] = 0
-        
-        future_df = future_df[feature_cols]
-        
-        # Predict
-        pred = model.predict(future_df)[0]
-        
-        predictions.append({
+    # Build every future feature row at once so the horizon is one predict call
+    future_df = pd.DataFrame({
+        'day_of_week': future_dates.dayofweek,
+        'day_of_month': future_dates.day,
+        'month': future_dates.month,
+        'quarter': future_dates.quarter,
+        'year': future_dates.year,
+        'week_of_year': future_dates.isocalendar().week.to_numpy()
+    })
+    
+    # Add lag features (use recent average)
+    for lag in [1, 7, 14, 30]:
+        future_df[f'lag_{lag}'] = recent_avg
+    
+    # Add rolling features
+    for window in [7, 14, 30]:
+        future_df[f'rolling_mean_{window}'] = recent_avg
+        future_df[f'rolling_std_{window}'] = recent_std
+    
+    # Planned promotions and expected segment mix
+    regressors = regressor_columns(df)
+    if regressors:
+        future_values = resolve_future_regressors(df, forecast_days, future_regressors)
+        for name in regressors:
+            future_df[name] = future_values[name].to_numpy()
+    
+    # Ensure columns match training data
+    for col in feature_cols:
+        if col not in future_df.columns:
+            future_df[col] = 0
+    
+    # One column per quantile level
+    pred = np.asarray(model.predict(future_df[feature_cols])).reshape(forecast_days, -1)
+    quantiles = dict(zip(QUANTILE_LEVELS, pred.T))
+    
+    predictions = [
+        {
             "date": next_date.isoformat(),
-            "predicted_quantity": max(0, round(pred)),
-            "confidence": 0.80
-        })
+            "predicted_quantity": max(0, round(float(quantiles["p50"][i])))
+        }
+        for i, next_date in enumerate(future_dates)
+    ]
     
-    return predictions
+    return attach_quantiles(predictions, quantiles)
@@ -9,7 +9,7 @@ from datetime import datetime
 from geoalchemy2.shape import to_shape
 
 from database import get_db
-from models import Driver, Route, Vehicle, User
+from models import Driver, Route, Vehicle, User, LocationPing
 from auth import get_current_active_user, require_role
 
 router = APIRouter(prefix="/api/mobile/driver", tags=["Mobile Driver API"])
@@ -56,6 +56,24 @@ def update_driver_location(
         raise HTTPException(status_code=404, detail="Driver profile not found")
     
     driver.current_location = f'POINT({longitude} {latitude})'
+    
+    # Attribute the ping to the vehicle of the route in progress, else the assigned one
+    active_route = db.query(Route).filter(
+        Route.driver_id == driver.id,
+        Route.status == "in_progress"
+    ).first()
+    if active_route and active_route.vehicle_id:
+        vehicle_id = active_route.vehicle_id
+    else:
+        vehicle = db.query(Vehicle).filter(Vehicle.driver_id == driver.id).first()
+        vehicle_id = vehicle.id if vehicle else None
+    
+    db.add(LocationPing(
+        driver_id=driver.id,
+        vehicle_id=vehicle_id,
+        location=f'POINT({longitude} {latitude})',
+        recorded_at=datetime.utcnow()
+    ))
     db.commit()
     
     return {"message": "Location updated successfully", "latitude": latitude, "longitude": longitude}